@@ -79,6 +79,11 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default=f'sqlite:///{BASE_DIR / "db.sqlite3"}'),
 }
 
+# Cache (per-process memory by default; set CACHE_URL=redis://... to share between workers)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -130,6 +135,42 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 50,
 }
 
+# Monitor
+MONITOR_CHECK_CONCURRENCY = env.int('MONITOR_CHECK_CONCURRENCY', default=100)
+MONITOR_SCHEDULER_REFRESH = env.float('MONITOR_SCHEDULER_REFRESH', default=30.0)
+MONITOR_BODY_READ_LIMIT = env.int('MONITOR_BODY_READ_LIMIT', default=64 * 1024)
+MONITOR_POOL_LIMIT_PER_HOST = env.int('MONITOR_POOL_LIMIT_PER_HOST', default=0)  # 0 = no per-host limit
+MONITOR_POOL_KEEPALIVE = env.float('MONITOR_POOL_KEEPALIVE', default=30.0)
+MONITOR_DNS_CACHE_TTL = env.int('MONITOR_DNS_CACHE_TTL', default=300)
+MONITOR_HOST_CONCURRENCY = env.int('MONITOR_HOST_CONCURRENCY', default=10)  # 0 = unlimited
+MONITOR_CUSTOMER_CHECK_SHARE = env.float('MONITOR_CUSTOMER_CHECK_SHARE', default=0.5)  # of --concurrency; 0 = unlimited
+MONITOR_BREAKER_THRESHOLD = env.int('MONITOR_BREAKER_THRESHOLD', default=5)
+MONITOR_BREAKER_BACKOFF = env.float('MONITOR_BREAKER_BACKOFF', default=30.0)
+MONITOR_BREAKER_MAX_BACKOFF = env.float('MONITOR_BREAKER_MAX_BACKOFF', default=600.0)
+MONITOR_STORAGE_MODE = env.str('MONITOR_STORAGE_MODE', default='results')  # 'results' or 'intervals'
+MONITOR_SHARD_QUEUE_SIZE = env.int('MONITOR_SHARD_QUEUE_SIZE', default=10000)
+MONITOR_SINK_BATCH_SIZE = env.int('MONITOR_SINK_BATCH_SIZE', default=500)
+MONITOR_SINK_FLUSH_INTERVAL = env.float('MONITOR_SINK_FLUSH_INTERVAL', default=2.0)
+MONITOR_JOURNAL_DIR = env.str('MONITOR_JOURNAL_DIR', default='')  # '' = write results straight to the database
+MONITOR_JOURNAL_SEGMENT_BYTES = env.int('MONITOR_JOURNAL_SEGMENT_BYTES', default=4 * 1024 * 1024)
+MONITOR_LEASE_SECONDS = env.int('MONITOR_LEASE_SECONDS', default=120)
+MONITOR_LEASE_POLL_INTERVAL = env.float('MONITOR_LEASE_POLL_INTERVAL', default=1.0)
+MONITOR_JOB_STALE_SECONDS = env.int('MONITOR_JOB_STALE_SECONDS', default=300)
+MONITOR_ROLLUP_LAG = env.int('MONITOR_ROLLUP_LAG', default=120)
+MONITOR_RETENTION_DAYS = env.int('MONITOR_RETENTION_DAYS', default=90)
+MONITOR_RETENTION_CHUNK_SIZE = env.int('MONITOR_RETENTION_CHUNK_SIZE', default=5000)
+MONITOR_RETENTION_PAUSE = env.float('MONITOR_RETENTION_PAUSE', default=0.1)
+MONITOR_PARTITION_MONTHS_AHEAD = env.int('MONITOR_PARTITION_MONTHS_AHEAD', default=3)
+MONITOR_EXPORT_CHUNK_SIZE = env.int('MONITOR_EXPORT_CHUNK_SIZE', default=2000)
+MONITOR_SYNC_BATCH_SIZE = env.int('MONITOR_SYNC_BATCH_SIZE', default=1000)
+MONITOR_STREAM_POLL_INTERVAL = env.float('MONITOR_STREAM_POLL_INTERVAL', default=0.5)
+MONITOR_STREAM_KEEPALIVE = env.float('MONITOR_STREAM_KEEPALIVE', default=15.0)
+MONITOR_STREAM_QUEUE_SIZE = env.int('MONITOR_STREAM_QUEUE_SIZE', default=1000)
+# Each open stream holds a gunicorn thread: keep this well below --threads (32 in the Dockerfile).
+MONITOR_STREAM_MAX_CLIENTS = env.int('MONITOR_STREAM_MAX_CLIENTS', default=16)
+MONITOR_DASHBOARD_CACHE_TTL = env.int('MONITOR_DASHBOARD_CACHE_TTL', default=300)
+MONITOR_METRICS_TARGET_LIMIT = env.int('MONITOR_METRICS_TARGET_LIMIT', default=1000)  # 0 = no per-target series
+
 # Logging
 LOGGING = {
     'version': 1,
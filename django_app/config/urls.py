@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
-from monitor.views import HealthView, DashboardAPIView, RunChecksView
+from monitor.views import (
+    HealthView, DashboardAPIView, RunChecksView, CheckJobView, RollupView, ResultHistoryView,
+    ResultExportView, StatusIntervalView, StreamView, LatencyView, TargetSyncView,
+)
 from monitor.metrics import metrics_view
 
 urlpatterns = [
@@ -9,9 +12,18 @@ urlpatterns = [
     path('health/', HealthView.as_view()),
     path('api/v1/dashboard/', DashboardAPIView.as_view()),
     path('api/v1/check/', RunChecksView.as_view()),
+    path('api/v1/check/<uuid:job_id>/', CheckJobView.as_view()),
+    path('api/v1/services/bulk/', TargetSyncView.as_view()),
+    path('api/v1/services/<int:service_id>/results/', ResultHistoryView.as_view()),
+    path('api/v1/services/<int:service_id>/rollups/', RollupView.as_view()),
+    path('api/v1/services/<int:service_id>/intervals/', StatusIntervalView.as_view()),
+    path('api/v1/results/export/', ResultExportView.as_view()),
+    path('api/v1/latency/', LatencyView.as_view()),
+    path('api/v1/stream/', StreamView.as_view()),
     path('api/v1/token/', obtain_auth_token, name='api-token'),
     # Backwards compat (unversioned)
     path('api/dashboard/', DashboardAPIView.as_view()),
     path('api/check/', RunChecksView.as_view()),
+    path('api/check/<uuid:job_id>/', CheckJobView.as_view()),
     path('metrics', metrics_view),
 ]
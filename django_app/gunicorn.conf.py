@@ -0,0 +1,28 @@
+"""
+Loaded automatically by gunicorn from the working directory.
+
+Turns on prometheus_client multiprocess mode so /metrics aggregates the
+counters of all workers (see monitor/metrics.py). The metric files are
+cleared on startup and a dead worker's live gauges are discarded.
+
+prometheus_client picks file-backed values only if PROMETHEUS_MULTIPROC_DIR
+is set when it is first imported, and workers inherit the master's modules,
+so the variable is set before anything here imports it.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'netops-prometheus'))
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,14 +1,54 @@
+from django import forms
 from django.contrib import admin
-from .models import ServiceTarget, CheckResult
+from .models import Customer, ServiceTarget, CheckResult, CheckJob, HostCircuit, StatusInterval
+from .topology import check_dependencies
+
+
+class ServiceTargetForm(forms.ModelForm):
+    class Meta:
+        model = ServiceTarget
+        fields = '__all__'
+
+    def clean_depends_on(self):
+        upstreams = self.cleaned_data['depends_on']
+        check_dependencies(self.instance.pk, [t.pk for t in upstreams])
+        return upstreams
+
+
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'check_budget', 'created_at']
+    search_fields = ['name']
+    filter_horizontal = ['users']
 
 
 @admin.register(ServiceTarget)
 class ServiceTargetAdmin(admin.ModelAdmin):
-    list_display = ['name', 'url', 'status', 'is_active', 'updated_at']
-    list_filter = ['status', 'is_active']
+    form = ServiceTargetForm
+    list_display = ['name', 'url', 'customer', 'status', 'is_active', 'updated_at']
+    list_filter = ['status', 'is_active', 'customer']
+    filter_horizontal = ['depends_on']
 
 
 @admin.register(CheckResult)
 class CheckResultAdmin(admin.ModelAdmin):
     list_display = ['service', 'status', 'response_time_ms', 'status_code', 'checked_at']
     list_filter = ['status']
+
+
+@admin.register(StatusInterval)
+class StatusIntervalAdmin(admin.ModelAdmin):
+    list_display = ['service', 'status', 'status_code', 'count', 'started_at', 'ended_at', 'is_open']
+    list_filter = ['status', 'is_open']
+
+
+@admin.register(CheckJob)
+class CheckJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'state', 'completed', 'total', 'up', 'down', 'created_at', 'finished_at']
+    list_filter = ['state']
+
+
+@admin.register(HostCircuit)
+class HostCircuitAdmin(admin.ModelAdmin):
+    list_display = ['host', 'state', 'consecutive_failures', 'opened_at', 'retry_at', 'updated_at']
+    list_filter = ['state']
@@ -0,0 +1,266 @@
+"""
+Load test of the check pipeline and the dashboard API (benchmark command).
+
+StubFarm serves HTTP on several 127.0.0.1 ports, so per-host concurrency
+caps apply as they would across real hosts. It can add latency, error
+responses, responses that hang past the check timeout, and bodies of a
+given size. The benchmark seeds `bench-` targets pointing at the farm and a
+backfill of historical results. Seeded targets get an external_id in the
+`benchmark:` namespace; only those are ever deleted. It then measures:
+
+    seed           bulk insert rate of CheckResult rows (DB writes/sec)
+    check_passes   wall time of full passes over the seeded targets, checks/sec
+                   and result rows written/sec through ResultSink
+    dashboard      /api/v1/dashboard/ latency percentiles, with the response
+                   cache cold (payload built every time) and warm
+
+The seeded rows are deleted afterwards. Run it against a scratch database:
+numbers taken next to production traffic are not comparable between runs.
+"""
+import asyncio
+import dataclasses
+import platform
+import random
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+from aiohttp import web
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .breaker import host_key
+from .models import CheckResult, FleetState, HostCircuit, ServiceTarget
+from .services import ServiceChecker
+from .views import DashboardAPIView
+
+BENCH_PREFIX = 'bench-'
+# external_id namespace of the seeded targets; cleanup deletes nothing else.
+BENCH_NAMESPACE = 'benchmark:'
+
+
+@dataclasses.dataclass
+class FarmProfile:
+    latency_ms: float = 20.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0    # share of requests answered with 500
+    timeout_rate: float = 0.0  # share of requests that stall for hang_seconds
+    body_bytes: int = 0
+    hang_seconds: float = 30.0
+
+
+class StubFarm:
+    """aiohttp servers on `hosts` ports of 127.0.0.1, run by an event loop on a background thread."""
+
+    def __init__(self, profile: FarmProfile, hosts: int = 10, seed: int = 0):
+        self.profile = profile
+        self.hosts = hosts
+        self.urls: list[str] = []
+        self._random = random.Random(seed)
+        self._body = b'.' * profile.body_bytes
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='stub-farm', daemon=True)
+        self._runners = []
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self._handle)
+        for _ in range(self.hosts):
+            runner = web.AppRunner(app, access_log=None, shutdown_timeout=1.0)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            self._runners.append(runner)
+            self.urls.append(f"http://127.0.0.1:{runner.addresses[0][1]}")
+
+    async def _stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+
+    async def _handle(self, request):
+        profile = self.profile
+        roll = self._random.random()
+        if roll < profile.timeout_rate:
+            await asyncio.sleep(profile.hang_seconds)
+        delay = profile.latency_ms + self._random.uniform(-profile.jitter_ms, profile.jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+        status = 500 if roll < profile.timeout_rate + profile.error_rate else 200
+        return web.Response(status=status, body=self._body)
+
+
+def seed_targets(urls, count, timeout=2) -> list[ServiceTarget]:
+    targets = ServiceTarget.objects.bulk_create(
+        [
+            ServiceTarget(
+                name=f'{BENCH_PREFIX}{i:07d}', external_id=f'{BENCH_NAMESPACE}{i:07d}',
+                url=f'{urls[i % len(urls)]}/t/{i}', timeout=timeout,
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+    FleetState.bump()
+    return targets
+
+
+def seed_results(targets, count, span=timedelta(days=30), batch_size=5000, seed=0) -> int:
+    """Backfill `count` results spread over `span`, oldest first. Returns rows written."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    step = span / max(count, 1)
+    written = 0
+    while written < count:
+        batch = []
+        for i in range(written, min(written + batch_size, count)):
+            up = rng.random() >= 0.05
+            batch.append(CheckResult(
+                service=targets[i % len(targets)],
+                status='up' if up else 'down',
+                response_time_ms=round(rng.uniform(5, 500), 2),
+                status_code=200 if up else 500,
+                checked_at=now - span + step * i,
+            ))
+        CheckResult.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def percentiles(samples_ms) -> dict:
+    samples = sorted(samples_ms)
+    if len(samples) > 1:
+        cuts = statistics.quantiles(samples, n=100, method='inclusive')
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = samples[0]
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(p50, 3),
+        'p90_ms': round(p90, 3),
+        'p99_ms': round(p99, 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def run_check_pass(targets, concurrency=None) -> dict:
+    started = time.perf_counter()
+    results = ServiceChecker(concurrency).check_targets(targets)
+    wall = time.perf_counter() - started
+    up = sum(1 for r in results if r.status == 'up')
+    return {
+        'targets': len(targets),
+        'checked': len(results),
+        'skipped': len(targets) - len(results),
+        'up': up,
+        'down': len(results) - up,
+        'wall_seconds': round(wall, 3),
+        'checks_per_second': round(len(targets) / wall, 1),
+        'writes_per_second': round(len(results) / wall, 1),
+    }
+
+
+def measure_dashboard(requests, cached: bool) -> dict:
+    """
+    Latency of DashboardAPIView. The cold variant bumps FleetState before
+    every request (outside the timing), as a sink flush would.
+    """
+    factory = APIRequestFactory()
+    view = DashboardAPIView.as_view()
+    user = get_user_model()(username='benchmark', is_staff=True)
+
+    def get():
+        request = factory.get('/api/v1/dashboard/')
+        force_authenticate(request, user=user)
+        started = time.perf_counter()
+        response = view(request)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise RuntimeError(f"Dashboard answered {response.status_code}")
+        return elapsed
+
+    if cached:
+        get()
+    samples = []
+    for _ in range(requests):
+        if not cached:
+            FleetState.bump()
+        samples.append(get())
+    return percentiles(samples)
+
+
+def cleanup(urls=()):
+    """Delete seeded targets (their results cascade) and the farm's circuits."""
+    ServiceTarget.objects.filter(external_id__startswith=BENCH_NAMESPACE).delete()
+    HostCircuit.objects.filter(host__in=[host_key(url) for url in urls]).delete()
+
+
+def run_benchmark(targets=1000, results=100_000, passes=1, requests=200, hosts=10, concurrency=None,
+                  profile: FarmProfile | None = None, timeout=2, seed=0, keep=False, log=None) -> dict:
+    """Run the whole benchmark and return the report as a JSON-serialisable dict."""
+    profile = profile or FarmProfile()
+    log = log or (lambda message: None)
+    report = {
+        'started_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'check_concurrency': concurrency or settings.MONITOR_CHECK_CONCURRENCY,
+            'host_concurrency': settings.MONITOR_HOST_CONCURRENCY,
+        },
+        'params': {
+            'targets': targets, 'results': results, 'passes': passes, 'requests': requests,
+            'hosts': hosts, 'timeout': timeout, 'seed': seed,
+        },
+        'farm': dataclasses.asdict(profile),
+    }
+    cleanup()  # leftovers of an interrupted run
+
+    with StubFarm(profile, hosts, seed) as farm:
+        try:
+            log(f"Seeding {targets} targets and {results} results")
+            started = time.perf_counter()
+            seeded = seed_targets(farm.urls, targets, timeout)
+            targets_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            written = seed_results(seeded, results, seed=seed) if results else 0
+            results_seconds = time.perf_counter() - started
+            report['seed'] = {
+                'targets': len(seeded),
+                'targets_seconds': round(targets_seconds, 3),
+                'results': written,
+                'results_seconds': round(results_seconds, 3),
+                'results_per_second': round(written / results_seconds, 1) if written else None,
+            }
+
+            report['check_passes'] = []
+            for number in range(1, passes + 1):
+                log(f"Check pass {number}/{passes}")
+                report['check_passes'].append(run_check_pass(seeded, concurrency))
+
+            log(f"Dashboard: {requests} cold and {requests} warm requests")
+            report['dashboard'] = {
+                'uncached': measure_dashboard(requests, cached=False),
+                'cached': measure_dashboard(requests, cached=True),
+            }
+        finally:
+            if not keep:
+                log("Removing seeded data")
+                cleanup(farm.urls)
+
+    report['finished_at'] = timezone.now().isoformat()
+    return report
@@ -0,0 +1,147 @@
+"""
+Host-level protection for check dispatch.
+
+Checks of targets on the same host (host:port) share MONITOR_HOST_CONCURRENCY
+slots. A slot is taken before the check's timeout starts, so waiting for one
+never turns into a false timeout.
+
+Each host also has a circuit breaker. It opens after
+MONITOR_BREAKER_THRESHOLD consecutive transport failures (timeouts and
+connection errors; an HTTP error status means the host answered). While open,
+checks of that host's targets are skipped without touching the network and
+without writing CheckResult rows. After a backoff one probe is let through
+(half-open): success closes the circuit, failure reopens it with the backoff
+doubled, up to MONITOR_BREAKER_MAX_BACKOFF.
+
+Breaker state lives in memory in the check process. Transitions ride on the
+outcome that caused them and ResultSink persists them to HostCircuit, which
+the dashboard reads and from which the next engine is seeded.
+"""
+import asyncio
+import contextlib
+import dataclasses
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import record_circuit, record_skip
+from .models import HostCircuit
+
+State = HostCircuit.State
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{(parts.hostname or '').lower()}:{parts.port or _DEFAULT_PORTS.get(parts.scheme, '')}"
+
+
+def load_open_circuits() -> list[dict]:
+    return list(HostCircuit.objects.exclude(state=State.CLOSED).values(
+        'host', 'state', 'consecutive_failures', 'opens', 'opened_at', 'retry_at', 'updated_at',
+    ))
+
+
+@dataclasses.dataclass
+class Circuit:
+    host: str
+    state: str = State.CLOSED
+    consecutive_failures: int = 0
+    opens: int = 0
+    opened_at: datetime | None = None
+    retry_at: datetime | None = None
+
+    def to_model(self) -> HostCircuit:
+        return HostCircuit(**dataclasses.asdict(self))
+
+
+class HostBreakers:
+    def __init__(self, threshold: int | None = None, backoff: float | None = None,
+                 max_backoff: float | None = None, host_concurrency: int | None = None, clock=timezone.now):
+        self.threshold = threshold or settings.MONITOR_BREAKER_THRESHOLD
+        self.backoff = backoff or settings.MONITOR_BREAKER_BACKOFF
+        self.max_backoff = max_backoff or settings.MONITOR_BREAKER_MAX_BACKOFF
+        self.host_concurrency = (
+            settings.MONITOR_HOST_CONCURRENCY if host_concurrency is None else host_concurrency
+        )
+        self.clock = clock
+        self._circuits: dict[str, Circuit] = {}
+        self._slots: dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def load(cls, **kwargs) -> 'HostBreakers':
+        """Breakers seeded with the circuits that were not closed when the last run stopped."""
+        return cls.seeded(load_open_circuits(), **kwargs)
+
+    @classmethod
+    def seeded(cls, rows, **kwargs) -> 'HostBreakers':
+        """Breakers seeded from load_open_circuits() rows (plain dicts, so they can cross processes)."""
+        breakers = cls(**kwargs)
+        for row in rows:
+            breakers._circuits[row['host']] = Circuit(
+                host=row['host'],
+                # A half-open probe did not finish; let the next one through.
+                state=State.OPEN,
+                consecutive_failures=row['consecutive_failures'],
+                opens=row['opens'],
+                opened_at=row['opened_at'],
+                retry_at=row['retry_at'] if row['state'] == State.OPEN else row['updated_at'],
+            )
+            record_circuit(row['host'], State.OPEN)
+        return breakers
+
+    def slot(self, host):
+        if not self.host_concurrency:
+            return contextlib.nullcontext()
+        if host not in self._slots:
+            self._slots[host] = asyncio.Semaphore(self.host_concurrency)
+        return self._slots[host]
+
+    def allow(self, host) -> bool:
+        """May a check of this host go ahead? Counts skipped checks."""
+        circuit = self._circuits.get(host)
+        if circuit is None or circuit.state == State.CLOSED:
+            return True
+        if circuit.state == State.OPEN and self.clock() >= circuit.retry_at:
+            # Only OPEN circuits are let through, so this is the one probe until it reports back.
+            circuit.state = State.HALF_OPEN
+            record_circuit(host, circuit.state)
+            return True
+        record_skip(host)
+        return False
+
+    def record(self, host, reachable: bool) -> Circuit | None:
+        """Feed a check result back. Returns a copy of the circuit if its state changed."""
+        circuit = self._circuits.get(host)
+        if reachable:
+            if circuit is None or circuit.state == State.CLOSED:
+                if circuit:
+                    circuit.consecutive_failures = 0
+                return None
+            self._circuits[host] = circuit = Circuit(host)
+            record_circuit(host, circuit.state)
+            return dataclasses.replace(circuit)
+
+        if circuit is None:
+            self._circuits[host] = circuit = Circuit(host)
+        circuit.consecutive_failures += 1
+        if circuit.state == State.HALF_OPEN or (
+            circuit.state == State.CLOSED and circuit.consecutive_failures >= self.threshold
+        ):
+            now = self.clock()
+            circuit.opens += 1
+            circuit.state = State.OPEN
+            circuit.opened_at = circuit.opened_at or now
+            circuit.retry_at = now + timedelta(
+                seconds=min(self.backoff * 2 ** (circuit.opens - 1), self.max_backoff)
+            )
+            record_circuit(host, circuit.state)
+            return dataclasses.replace(circuit)
+        return None
+
+    def state(self, host) -> str:
+        circuit = self._circuits.get(host)
+        return circuit.state if circuit else State.CLOSED
@@ -0,0 +1,42 @@
+"""
+Per-customer check budgets.
+
+All checks of an engine share --concurrency slots. Without a cap, one large
+customer whose targets fall due together could fill all of them, and every
+other customer's checks would queue behind it. Each customer therefore gets
+its own slots: Customer.check_budget, or by default MONITOR_CUSTOMER_CHECK_SHARE
+of the engine's concurrency. A check takes its customer slot before its host
+and global slots, so a customer at its budget queues without holding slots
+that other customers need. Targets without a customer have no budget.
+
+The budget comes from the customer_budget annotation added by
+TenantQuerySet.with_budgets(), so the engine never queries the database.
+"""
+import asyncio
+import contextlib
+import math
+
+from django.conf import settings
+
+
+class CustomerBudgets:
+    def __init__(self, concurrency: int, share: float | None = None):
+        share = settings.MONITOR_CUSTOMER_CHECK_SHARE if share is None else share
+        self.default = math.ceil(concurrency * share) if share else 0
+        self._slots: dict[int, tuple[int, asyncio.Semaphore]] = {}
+
+    def budget(self, target) -> int:
+        """Check slots of the target's customer; 0 means no cap."""
+        if target.customer_id is None:
+            return 0
+        return getattr(target, 'customer_budget', None) or self.default
+
+    def slot(self, target):
+        budget = self.budget(target)
+        if not budget:
+            return contextlib.nullcontext()
+        current = self._slots.get(target.customer_id)
+        if current is None or current[0] != budget:
+            # New customer or edited budget; checks holding the old slots finish on them.
+            current = self._slots[target.customer_id] = (budget, asyncio.Semaphore(budget))
+        return current[1]
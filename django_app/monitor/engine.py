@@ -0,0 +1,282 @@
+"""
+Async check engine: probes many targets concurrently on one event loop.
+
+The engine only does network I/O and returns CheckOutcome objects; persisting
+them is the caller's job, so the ORM never runs inside the event loop.
+"""
+import asyncio
+import codecs
+import functools
+import logging
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import aiohttp
+from django.conf import settings
+from django.utils import timezone
+
+from .breaker import Circuit, HostBreakers, host_key
+from .budgets import CustomerBudgets
+from .metrics import record_suppressed
+from .models import ServiceTarget
+from .topology import Topology
+from .tracing import PhaseTimer, TimedConnector, current_timer, trace_config
+
+logger = logging.getLogger('monitor')
+
+USER_AGENT = 'NetOps-Monitor/1.0'
+
+READ_CHUNK = 16 * 1024
+
+# HEAD rejected: retry the check with GET.
+HEAD_UNSUPPORTED = {405, 501}
+
+_FINISHED = object()
+
+
+@dataclass
+class CheckOutcome:
+    target: ServiceTarget
+    status: str
+    response_time_ms: float
+    status_code: int | None = None
+    error: str = ''
+    checked_at: datetime = field(default_factory=timezone.now)
+    dns_ms: float | None = None
+    connect_ms: float | None = None
+    tls_ms: float | None = None
+    ttfb_ms: float | None = None
+    transfer_ms: float | None = None
+    # False on timeouts and connection errors: the host itself did not answer.
+    reachable: bool = True
+    # Not checked because the host's circuit is open; no CheckResult is written.
+    skipped: bool = False
+    # Set when this outcome changed the host's circuit state.
+    circuit: Circuit | None = None
+
+
+# Plain-value fields, for passing outcomes between processes (shards, journal).
+OUTCOME_FIELDS = (
+    'status', 'response_time_ms', 'status_code', 'error',
+    'dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms', 'reachable', 'skipped',
+)
+
+
+class CheckEngine:
+    """
+    Usage:
+        async with CheckEngine(concurrency=200) as engine:
+            outcomes = await engine.check_many(targets)
+
+    Checks share one keep-alive connection pool (MONITOR_POOL_*) and a TTL
+    DNS cache for the engine's lifetime, so targets on the same host skip the
+    TCP/TLS handshake and lookup. Targets with fresh_connection go through a
+    second session that never reuses connections or cached DNS answers.
+    Targets annotated by topology.attach_upstreams() are not probed while
+    all of their upstreams are down. Each customer's checks are capped by its
+    budget (see monitor/budgets.py).
+    """
+
+    def __init__(self, concurrency: int | None = None, breakers: HostBreakers | None = None,
+                 topology: Topology | None = None):
+        self.concurrency = concurrency or settings.MONITOR_CHECK_CONCURRENCY
+        self.breakers = breakers or HostBreakers()
+        self.topology = topology or Topology()
+        self.budgets = CustomerBudgets(self.concurrency)
+        self.body_limit = settings.MONITOR_BODY_READ_LIMIT
+        self._semaphore = None
+        self._session = None
+        self._fresh_session = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = self._make_session('shared', TimedConnector(
+            limit=self.concurrency,
+            limit_per_host=settings.MONITOR_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.MONITOR_POOL_KEEPALIVE,
+            ttl_dns_cache=settings.MONITOR_DNS_CACHE_TTL,
+        ))
+        self._fresh_session = self._make_session('fresh', TimedConnector(
+            limit=self.concurrency, force_close=True, use_dns_cache=False,
+        ))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        await self._fresh_session.close()
+
+    @staticmethod
+    def _make_session(pool, connector):
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers={'User-Agent': USER_AGENT},
+            trace_configs=[trace_config(pool)],
+        )
+
+    async def check(self, target: ServiceTarget) -> CheckOutcome:
+        # Registered before the first await, so dependents dispatched after this wait for it.
+        self.topology.begin(target)
+        outcome = None
+        try:
+            upstream = await self.topology.blocked_by(target)
+            if upstream is not None:
+                record_suppressed()
+                outcome = CheckOutcome(
+                    target=target,
+                    status=ServiceTarget.Status.UNREACHABLE,
+                    response_time_ms=None,
+                    error=f"Skipped: upstream {upstream.name} is {upstream.status}",
+                    skipped=True,
+                )
+            else:
+                outcome = await self._check_host(target)
+            return outcome
+        finally:
+            self.topology.record(target, outcome and outcome.status, outcome and outcome.checked_at)
+
+    async def _check_host(self, target: ServiceTarget) -> CheckOutcome:
+        host = host_key(target.url)
+        # Customer and host slots first, so targets queued behind a busy customer or host
+        # don't hold global slots. The breaker is consulted only once all are held, i.e.
+        # after the checks ahead of this one have reported back.
+        async with self.budgets.slot(target), self.breakers.slot(host), self._semaphore:
+            if not self.breakers.allow(host):
+                return CheckOutcome(
+                    target=target,
+                    status=ServiceTarget.Status.DOWN,
+                    response_time_ms=0.0,
+                    error=f"Skipped: circuit open for {host}",
+                    skipped=True,
+                )
+            outcome = await self._probe(target)
+            outcome.circuit = self.breakers.record(host, outcome.reachable)
+        return outcome
+
+    async def check_many(self, targets) -> list[CheckOutcome]:
+        return await asyncio.gather(*(self.check(t) for t in targets))
+
+    async def _probe(self, target: ServiceTarget) -> CheckOutcome:
+        start = time.perf_counter()
+        timer = PhaseTimer()
+        current_timer.set(timer)  # task-local: read by TimedConnector
+        status = ServiceTarget.Status.DOWN
+        status_code = None
+        body = ''
+        error = ''
+        reachable = True
+
+        try:
+            if target.head_first and not target.body_pattern:
+                status_code, _ = await self._fetch('HEAD', target, timer, 0)
+            if status_code is None or status_code in HEAD_UNSUPPORTED:
+                budget = self.body_limit if target.max_body_bytes is None else target.max_body_bytes
+                status_code, body = await self._fetch('GET', target, timer, budget)
+            if not 200 <= status_code < 400:
+                error = f"HTTP {status_code}"
+            elif target.body_pattern and not _body_matches(target, body):
+                error = f"Body does not match {target.body_pattern!r} (first {len(body)} chars)"
+            else:
+                status = ServiceTarget.Status.UP
+        except asyncio.TimeoutError:
+            error = f"Timeout after {target.timeout}s"
+            reachable = False
+        except aiohttp.ClientConnectionError as e:
+            error = f"Connection error: {str(e)[:200]}"
+            reachable = False
+        except aiohttp.ClientError as e:
+            error = f"Error: {str(e)[:200]}"
+        except re.error as e:
+            # Stored before validation existed, or written without full_clean().
+            error = f"Invalid body pattern {target.body_pattern!r}: {e}"
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return CheckOutcome(
+            target=target,
+            status=status,
+            response_time_ms=round(elapsed_ms, 2),
+            status_code=status_code,
+            error=error,
+            reachable=reachable,
+            **timer.as_ms(),
+        )
+
+    async def _fetch(self, method, target, timer, budget) -> tuple[int, str]:
+        """Request the URL, reading at most `budget` body bytes. Returns (status, decoded prefix)."""
+        session = self._fresh_session if target.fresh_connection else self._session
+        async with session.request(
+            method,
+            target.url,
+            timeout=aiohttp.ClientTimeout(total=target.timeout),
+            allow_redirects=True,
+            trace_request_ctx=timer,
+        ) as resp:
+            timer.start('transfer')
+            chunks, size = [], 0
+            while size < budget:
+                chunk = await resp.content.read(min(READ_CHUNK, budget - size))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+            timer.stop('transfer')
+            if not resp.content.at_eof():
+                # Stop the download instead of draining the rest; this connection is not reused.
+                resp.close()
+            return resp.status, b''.join(chunks).decode(_codec(resp.charset), errors='replace')
+
+
+def _codec(charset: str | None) -> str:
+    """The response charset if Python knows it, else utf-8."""
+    if charset:
+        try:
+            return codecs.lookup(charset).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(pattern: str) -> re.Pattern:
+    return re.compile(pattern)
+
+
+def _body_matches(target: ServiceTarget, body: str) -> bool:
+    """Raises re.error for an invalid regex."""
+    if target.body_pattern_is_regex:
+        return _compile(target.body_pattern).search(body) is not None
+    return target.body_pattern in body
+
+
+def iter_outcomes(targets, concurrency: int | None = None, breakers: HostBreakers | None = None):
+    """
+    Blocking entry point for sync callers (management commands, views, jobs).
+
+    Yields outcomes as checks complete. The event loop runs on a helper
+    thread, so the caller's thread - and its DB connection - never enters
+    async context.
+    """
+    done = queue.Queue()
+
+    async def _run():
+        async with CheckEngine(concurrency, breakers) as engine:
+            async def _check(target):
+                done.put(await engine.check(target))
+            await asyncio.gather(*(_check(t) for t in targets))
+
+    def _loop():
+        try:
+            asyncio.run(_run())
+        except BaseException as e:
+            done.put(e)
+        finally:
+            done.put(_FINISHED)
+
+    threading.Thread(target=_loop, name='check-engine', daemon=True).start()
+    while (item := done.get()) is not _FINISHED:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
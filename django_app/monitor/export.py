@@ -0,0 +1,137 @@
+"""
+Streaming export of CheckResult history as NDJSON or CSV, optionally gzipped.
+
+Rows are read with values_list(...).iterator(chunk_size), so no model
+instances or serializers are built and memory stays flat regardless of how
+many rows are exported. Output is produced as a generator of byte chunks,
+suitable for StreamingHttpResponse or writing to a file.
+
+In interval storage mode there are no CheckResult rows. Each StatusInterval
+is exported as one row instead: its newest check, with the mean latency of
+the run, started_at of its first check and the number of checks in count.
+Raw results export as runs of one (count 1, started_at = checked_at).
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.conf import settings
+
+from .models import CheckResult, StatusInterval
+
+FORMATS = ('ndjson', 'csv')
+
+_PHASE_FIELDS = ['dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms']
+COLUMNS = [
+    'service_id', 'service', 'status', 'response_time_ms', 'status_code', 'error_message', *_PHASE_FIELDS,
+    'checked_at', 'started_at', 'count',
+]
+_FIELDS = [
+    'service_id', 'service__name', 'status', 'response_time_ms', 'status_code', 'error_message', *_PHASE_FIELDS,
+    'checked_at',
+]
+_INTERVAL_FIELDS = [
+    'service_id', 'service__name', 'status', 'latency_sum', 'latency_count', 'status_code', 'error_message',
+    'ended_at', 'started_at', 'count',
+]
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Encoded output is handed out in chunks of roughly this many bytes.
+WRITE_BUFFER = 64 * 1024
+
+
+def export_rows(service_ids=None, since=None, until=None, chunk_size=None, customer_ids=None):
+    """Yield result tuples in COLUMNS order, oldest first; customer_ids=None exports every customer."""
+    chunk_size = chunk_size or settings.MONITOR_EXPORT_CHUNK_SIZE
+    if settings.MONITOR_STORAGE_MODE == 'intervals':
+        yield from _interval_rows(service_ids, since, until, chunk_size, customer_ids)
+        return
+    results = CheckResult.objects.all()
+    if customer_ids is not None:
+        results = results.filter(customer_id__in=customer_ids)
+    if service_ids:
+        results = results.filter(service_id__in=service_ids)
+    if since:
+        results = results.filter(checked_at__gte=since)
+    if until:
+        results = results.filter(checked_at__lt=until)
+    rows = results.order_by('checked_at', 'id').values_list(*_FIELDS)
+    for row in rows.iterator(chunk_size=chunk_size):
+        checked_at = row[-1].isoformat()
+        yield row[:-1] + (checked_at, checked_at, 1)
+
+
+def _interval_rows(service_ids, since, until, chunk_size, customer_ids):
+    """One row per run that overlaps [since, until), by start."""
+    runs = StatusInterval.objects.all()
+    if customer_ids is not None:
+        runs = runs.filter(service__customer_id__in=customer_ids)
+    if service_ids:
+        runs = runs.filter(service_id__in=service_ids)
+    if since:
+        runs = runs.filter(ended_at__gte=since)
+    if until:
+        runs = runs.filter(started_at__lt=until)
+    rows = runs.order_by('started_at', 'id').values_list(*_INTERVAL_FIELDS)
+    for service_id, name, status, latency_sum, latency_count, code, error, ended_at, started_at, count in (
+        rows.iterator(chunk_size=chunk_size)
+    ):
+        mean = latency_sum / latency_count if latency_count else None
+        yield (
+            service_id, name, status, mean, code, error, *[None] * len(_PHASE_FIELDS),
+            ended_at.isoformat(), started_at.isoformat(), count,
+        )
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(COLUMNS, row)), separators=(',', ':')) + '\n'
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _buffered(lines):
+    chunk, size = [], 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        size += len(data)
+        if size >= WRITE_BUFFER:
+            yield b''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 16 + MAX_WBITS: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(rows, fmt='ndjson', compress=False):
+    """Encode rows from export_rows() as a generator of byte chunks."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    lines = _csv_lines(rows) if fmt == 'csv' else _ndjson_lines(rows)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if compress else chunks
+
+
+def filename(fmt, compress=False) -> str:
+    return f"check-results.{fmt}" + ('.gz' if compress else '')
@@ -0,0 +1,132 @@
+"""
+Run-length encoded status history (MONITOR_STORAGE_MODE = 'intervals').
+
+Most checks give the same answer as the previous one. In interval mode
+ResultSink writes no CheckResult rows. Instead it extends the target's open
+StatusInterval while status and status_code stay the same, and opens a new
+one when either changes. Per-check latency goes straight into the 1m rollups
+in the same transaction. Rollups therefore match between the two modes, and
+so do the uptime and percentiles served from them.
+
+status_history() answers the intervals API in either mode. In interval mode
+it reads StatusInterval rows. In results mode it run-length encodes the
+CheckResult rows on the fly.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+
+from .models import CheckResult, ResultRollup, StatusInterval
+from .rollups import Bucket, floor_time
+
+MODES = ('results', 'intervals')
+
+INTERVAL_FIELDS = [
+    'error_message', 'started_at', 'ended_at', 'count',
+    'latency_count', 'latency_min', 'latency_max', 'latency_sum', 'is_open',
+]
+
+
+def _start(result) -> StatusInterval:
+    interval = StatusInterval(
+        service_id=result.service_id,
+        status=result.status,
+        status_code=result.status_code,
+        error_message=result.error_message,
+        started_at=result.checked_at,
+        ended_at=result.checked_at,
+    )
+    _extend(interval, result)
+    return interval
+
+
+def _extend(interval, result):
+    """Count one more check in the run; works whichever end of the run the check is on."""
+    interval.count += 1
+    if result.checked_at >= interval.ended_at:
+        interval.ended_at = result.checked_at
+        interval.error_message = result.error_message
+    interval.started_at = min(interval.started_at, result.checked_at)
+    latency = result.response_time_ms
+    if latency is not None:
+        interval.latency_count += 1
+        interval.latency_sum += latency
+        interval.latency_min = latency if interval.latency_min is None else min(interval.latency_min, latency)
+        interval.latency_max = latency if interval.latency_max is None else max(interval.latency_max, latency)
+
+
+def _same_run(interval, result) -> bool:
+    return interval.status == result.status and interval.status_code == result.status_code
+
+
+def record_intervals(results):
+    """Fold unsaved CheckResults into the targets' StatusIntervals. Call inside the flush transaction."""
+    service_ids = {r.service_id for r in results}
+    current = {
+        interval.service_id: interval
+        for interval in StatusInterval.objects.select_for_update().filter(service_id__in=service_ids, is_open=True)
+    }
+    created, updated = [], {}
+    for result in sorted(results, key=lambda r: r.checked_at):
+        interval = current.get(result.service_id)
+        if interval is not None and _same_run(interval, result):
+            _extend(interval, result)
+        else:
+            if interval is not None:
+                interval.is_open = False
+                if interval.pk:
+                    updated[interval.pk] = interval
+            interval = current[result.service_id] = _start(result)
+            created.append(interval)
+            continue
+        if interval.pk:
+            updated[interval.pk] = interval
+
+    # Close superseded runs before opening new ones: one open run per target.
+    StatusInterval.objects.bulk_update(updated.values(), INTERVAL_FIELDS)
+    StatusInterval.objects.bulk_create(created)
+
+
+def minute_buckets(results) -> dict:
+    """{(service_id, minute): Bucket} of the results, for rollups.merge_buckets()."""
+    buckets = defaultdict(Bucket)
+    for result in results:
+        minute = floor_time(result.checked_at, ResultRollup.Granularity.MINUTE)
+        buckets[(result.service_id, minute)].add(result.status, result.response_time_ms)
+    return buckets
+
+
+def encode_results(rows, limit=None) -> list[StatusInterval]:
+    """Run-length encode CheckResults given newest first; at most `limit` runs, newest first."""
+    runs = []
+    for result in rows:
+        if runs and _same_run(runs[-1], result):
+            _extend(runs[-1], result)
+            continue
+        if limit is not None and len(runs) == limit:
+            break
+        runs.append(_start(result))
+    for run in runs[1:]:
+        run.is_open = False
+    return runs
+
+
+def status_history(service, since, until, limit) -> tuple[list[StatusInterval], bool]:
+    """
+    Runs of `service` that overlap [since, until), newest first, and whether
+    more exist. Interval mode returns runs that cross the window edges whole.
+    Results mode only counts the checks inside the window.
+    """
+    if settings.MONITOR_STORAGE_MODE == 'intervals':
+        runs = list(
+            StatusInterval.objects.filter(service=service, ended_at__gte=since, started_at__lt=until)
+            .order_by('-started_at', '-id')[:limit + 1]
+        )
+    else:
+        rows = (
+            CheckResult.objects.filter(service=service, checked_at__gte=since, checked_at__lt=until)
+            .order_by('-checked_at', '-id')
+            .only('service_id', 'status', 'status_code', 'error_message', 'checked_at', 'response_time_ms')
+        )
+        runs = encode_results(rows.iterator(chunk_size=2000), limit + 1)
+    return runs[:limit], len(runs) > limit
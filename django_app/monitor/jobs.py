@@ -0,0 +1,111 @@
+"""
+Background check jobs for the check API.
+
+POST /api/v1/check/ creates a CheckJob row and hands it to an in-process
+executor, so the request returns immediately. The database guarantees that
+at most one job is in flight (partial unique constraint on in_flight), which
+also coalesces triggers arriving on different gunicorn workers. Jobs whose
+worker died are expired after MONITOR_JOB_STALE_SECONDS without progress.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .metrics import record_check
+from .models import CheckJob, ServiceTarget
+from .serializers import RunCheckResultSerializer
+from .services import ServiceChecker
+from .tracing import phase_timings
+
+logger = logging.getLogger('monitor')
+
+# Minimum seconds between progress writes while a job is running.
+PROGRESS_INTERVAL = 1.0
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='check-job')
+
+
+def submit_check_job() -> tuple[CheckJob, bool]:
+    """Start a check pass, or return the one already in flight. Returns (job, created)."""
+    expire_stale_jobs()
+    while True:
+        try:
+            with transaction.atomic():
+                job = CheckJob.objects.create()
+        except IntegrityError:
+            job = CheckJob.objects.filter(in_flight=True).first()
+            if job is None:
+                continue  # the in-flight job finished in between; try again
+            return job, False
+        transaction.on_commit(lambda: _executor.submit(_run_in_executor, job.pk))
+        return job, True
+
+
+def expire_stale_jobs():
+    cutoff = timezone.now() - timedelta(seconds=settings.MONITOR_JOB_STALE_SECONDS)
+    expired = CheckJob.objects.filter(in_flight=True, updated_at__lt=cutoff).update(
+        state=CheckJob.State.FAILED,
+        in_flight=False,
+        error='Job stalled (worker restarted?)',
+        finished_at=timezone.now(),
+    )
+    if expired:
+        logger.warning("Expired %d stale check job(s)", expired)
+
+
+def _run_in_executor(job_id):
+    try:
+        run_check_job(job_id)
+    finally:
+        # The executor thread outlives the job; don't leave its connection idling.
+        connections.close_all()
+
+
+def run_check_job(job_id):
+    try:
+        targets = list(ServiceTarget.objects.filter(is_active=True).with_budgets())
+        CheckJob.objects.filter(pk=job_id).update(
+            state=CheckJob.State.RUNNING, started_at=timezone.now(), total=len(targets),
+            updated_at=timezone.now(),
+        )
+
+        last_write = time.monotonic()
+
+        def on_progress(done, total):
+            nonlocal last_write
+            if done < total and time.monotonic() - last_write < PROGRESS_INTERVAL:
+                return
+            CheckJob.objects.filter(pk=job_id).update(completed=done, updated_at=timezone.now())
+            last_write = time.monotonic()
+
+        results = ServiceChecker().check_targets(targets, on_progress=on_progress)
+
+        up = sum(1 for r in results if r.status == 'up')
+        down = len(results) - up
+        for r in results:
+            record_check(r.service.name, r.status, r.response_time_ms, phase_timings(r))
+
+        CheckJob.objects.filter(pk=job_id).update(
+            state=CheckJob.State.DONE,
+            in_flight=False,
+            completed=len(results),
+            up=up,
+            down=down,
+            results=RunCheckResultSerializer(results, many=True).data,
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+    except Exception:
+        logger.exception("Check job %s failed", job_id)
+        CheckJob.objects.filter(pk=job_id).update(
+            state=CheckJob.State.FAILED,
+            in_flight=False,
+            error='Failed to run checks',
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
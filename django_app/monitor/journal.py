@@ -0,0 +1,273 @@
+"""
+Write-behind journal for check outcomes (MONITOR_JOURNAL_DIR).
+
+Without a journal, run_checks writes each batch straight to the database, so
+a slow database stalls checking and a failed flush loses the batch. With a
+journal, JournaledSink.add() only appends the outcome to a segment file in
+the journal directory. A background thread seals the active segment every
+flush interval. It then writes the sealed segments to the database in order,
+one transaction per segment through ResultSink.write(), and deletes each
+segment once its transaction commits. While the database is down the thread
+retries with backoff and segments pile up on disk; checking carries on.
+
+Segments left behind by a crash, or by a shutdown while the database was
+down, are replayed first the next time the journal is opened. Each record is
+one line prefixed with its CRC-32, so a line torn by a crash ends the replay
+of its segment. Lines reach the OS on every append and are fsynced when the
+segment is sealed. Delivery is at least once: a crash between the commit and
+the delete writes that segment again.
+
+Segments written while the database is up keep their outcomes in memory, so
+lease bookkeeping on the targets is written with them. A backlog is read back
+from disk with the targets reloaded; their leases simply expire. So is a
+segment whose write failed: reloading drops outcomes of targets deleted in
+the meantime, which would otherwise fail every retry and block the journal.
+
+netops_journal_lag_seconds (age of the oldest result not yet in the database)
+and netops_journal_pending_results show how far behind the database is.
+"""
+import dataclasses
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import Error, connection
+
+from .breaker import Circuit
+from .engine import OUTCOME_FIELDS, CheckOutcome
+from .metrics import record_journal, record_journal_error
+from .models import ServiceTarget, CheckResult
+from .sink import ResultSink
+
+logger = logging.getLogger('monitor')
+
+SUFFIX = '.seg'
+MAX_BACKOFF = 60.0
+_CIRCUIT_TIMES = ('opened_at', 'retry_at')
+
+
+def encode_line(outcome: CheckOutcome) -> bytes:
+    circuit = None
+    if outcome.circuit:
+        circuit = dataclasses.asdict(outcome.circuit)
+        for name in _CIRCUIT_TIMES:
+            circuit[name] = circuit[name] and circuit[name].isoformat()
+    record = [
+        outcome.target.pk, outcome.checked_at.isoformat(), circuit,
+        *(getattr(outcome, f) for f in OUTCOME_FIELDS),
+    ]
+    payload = json.dumps(record, separators=(',', ':')).encode()
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def decode_record(record, targets: dict) -> CheckOutcome | None:
+    """None if the target no longer exists."""
+    target_id, checked_at, circuit, *values = record
+    target = targets.get(target_id)
+    if target is None:
+        return None
+    if circuit:
+        for name in _CIRCUIT_TIMES:
+            circuit[name] = circuit[name] and datetime.fromisoformat(circuit[name])
+    return CheckOutcome(
+        target=target,
+        checked_at=datetime.fromisoformat(checked_at),
+        circuit=Circuit(**circuit) if circuit else None,
+        **dict(zip(OUTCOME_FIELDS, values)),
+    )
+
+
+def read_segment(path) -> list:
+    """The records of a segment file, up to the first torn or corrupt line."""
+    records = []
+    with open(path, 'rb') as f:
+        for number, line in enumerate(f, start=1):
+            crc, _, payload = line.rstrip(b'\n').partition(b' ')
+            if not line.endswith(b'\n') or crc != b'%08x' % zlib.crc32(payload):
+                logger.warning("Journal segment %s is damaged at line %d; skipping the rest", path, number)
+                break
+            records.append(json.loads(payload))
+    return records
+
+
+@dataclasses.dataclass
+class Segment:
+    path: Path
+    records: int = 0
+    size: int = 0
+    # Wall-clock time of the oldest record.
+    first_at: float | None = None
+    # Outcomes appended by this process; None for segments replayed from disk.
+    outcomes: list | None = None
+
+
+class ResultJournal:
+    """Segment files in one directory, owned by a single process (flock)."""
+
+    def __init__(self, directory, segment_bytes: int | None = None, clock=time.time):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes or settings.MONITOR_JOURNAL_SEGMENT_BYTES
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._lockfile = open(self.directory / 'lock', 'w')
+        try:
+            fcntl.flock(self._lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lockfile.close()
+            raise RuntimeError(f"Journal {self.directory} is in use by another process")
+        self._sealed = deque(self._scan(path) for path in sorted(self.directory.glob(f'*{SUFFIX}')))
+        self._next_seq = int(self._sealed[-1].path.stem) + 1 if self._sealed else 1
+        self._active: Segment | None = None
+        self._file = None
+        if self._sealed:
+            logger.warning("Replaying %d journaled results from %s", len(self), self.directory)
+
+    def __len__(self):
+        segments = [*self._sealed, self._active] if self._active else self._sealed
+        return sum(segment.records for segment in segments)
+
+    def lag(self) -> float:
+        oldest = self._sealed[0] if self._sealed else self._active
+        if oldest is None or oldest.first_at is None:
+            return 0.0
+        return max(self.clock() - oldest.first_at, 0.0)
+
+    def append(self, outcome: CheckOutcome):
+        line = encode_line(outcome)
+        with self._lock:
+            if self._active is None:
+                path = self.directory / f'{self._next_seq:012d}{SUFFIX}'
+                self._next_seq += 1
+                self._file = open(path, 'ab')
+                self._active = Segment(path, first_at=self.clock(), outcomes=[])
+            self._file.write(line)
+            self._file.flush()
+            self._active.outcomes.append(outcome)
+            self._active.records += 1
+            self._active.size += len(line)
+            if self._active.size >= self.segment_bytes:
+                self._seal()
+
+    def seal(self):
+        with self._lock:
+            if self._active is not None:
+                self._seal()
+
+    def drain(self, write) -> list:
+        """
+        Call write(outcomes) for every pending segment, oldest first, deleting
+        each one after write() returns. The active segment is sealed first
+        unless older segments are still waiting. If write() raises, the failed
+        segment and the ones after it stay pending, and the failed one is
+        retried from disk.
+        """
+        if not self._sealed:
+            self.seal()
+        written = []
+        while self._sealed:
+            segment = self._sealed[0]
+            outcomes = segment.outcomes if segment.outcomes is not None else self._load(segment)
+            try:
+                written += write(outcomes)
+            except Exception:
+                segment.outcomes = None
+                raise
+            segment.path.unlink()
+            self._sealed.popleft()
+        return written
+
+    def close(self):
+        self.seal()
+        self._lockfile.close()
+
+    def _seal(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self._sealed:
+            # The database is behind: keep the backlog on disk, not in memory.
+            self._active.outcomes = None
+        self._sealed.append(self._active)
+        self._active = self._file = None
+
+    def _scan(self, path) -> Segment:
+        records = read_segment(path)
+        first_at = datetime.fromisoformat(records[0][1]).timestamp() if records else None
+        return Segment(path, records=len(records), size=path.stat().st_size, first_at=first_at)
+
+    def _load(self, segment) -> list[CheckOutcome]:
+        records = read_segment(segment.path)
+        targets = ServiceTarget.objects.in_bulk({record[0] for record in records})
+        outcomes = [decode_record(record, targets) for record in records]
+        return [outcome for outcome in outcomes if outcome is not None]
+
+
+class JournaledSink:
+    """
+    Drop-in for ResultSink in run_checks: add() only appends to the journal.
+    start() runs the thread that writes the journal to the database; flush()
+    stops it and writes what is left, leaving it on disk if that fails.
+    """
+
+    def __init__(self, sink: ResultSink, journal: ResultJournal):
+        self.sink = sink
+        self.journal = journal
+        self.flush_interval = sink.flush_interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.journal)
+
+    def add(self, outcome: CheckOutcome) -> list[CheckResult]:
+        self.journal.append(outcome)
+        return []
+
+    def maybe_flush(self) -> list[CheckResult]:
+        """Nothing to do: the writer thread flushes."""
+        return []
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self._thread.start()
+
+    def flush(self) -> list[CheckResult]:
+        if self._thread:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            return self.journal.drain(self.sink.write)
+        except Exception:
+            logger.exception("Could not write the journal; %d results stay in %s",
+                             len(self.journal), self.journal.directory)
+            return []
+        finally:
+            record_journal(len(self.journal), self.journal.lag())
+
+    def _run(self):
+        delay = self.flush_interval
+        while not self._stopping.wait(delay):
+            try:
+                self.journal.drain(self.sink.write)
+                delay = self.flush_interval
+            except Error as e:
+                delay = min(delay * 2, MAX_BACKOFF)
+                logger.warning("Could not write the journal (%s); retrying in %.0fs", e, delay)
+                record_journal_error()
+                connection.close()  # reconnect on the next attempt
+            except Exception:
+                # Not the database: the segment is retried from disk, so keep the thread alive.
+                delay = min(delay * 2, MAX_BACKOFF)
+                logger.exception("Could not write the journal; retrying in %.0fs", delay)
+                record_journal_error()
+            record_journal(len(self.journal), self.journal.lag())
+        connection.close()
@@ -0,0 +1,182 @@
+"""
+Lease-based work distribution for run_checks --distributed.
+
+Each worker claims due targets with SELECT ... FOR UPDATE SKIP LOCKED and
+stamps them with its id and a lease expiry. A target is only claimable when
+it is due (next_check_at has passed) and nobody holds a live lease on it, so
+any number of workers can share the fleet without checking a target twice.
+When a worker crashes its leases simply expire and other workers pick the
+targets up again. A worker claims no more of a customer's targets than the
+customer has free check slots (see monitor/budgets.py): claimed targets hold
+their leases while they wait for a slot, so one customer could otherwise take
+every claim. The lease is released, and next_check_at advanced, in the
+same transaction that stores the check result (see ResultSink). The
+dependency graph is kept between claims and reloaded every refresh_interval
+(MONITOR_SCHEDULER_REFRESH), like the scheduler's target list.
+
+MONITOR_LEASE_SECONDS must comfortably exceed the largest target timeout.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .metrics import record_claim, record_release, record_worker
+from .models import ServiceTarget
+from .topology import DependencyGraph
+
+logger = logging.getLogger('monitor')
+
+LEASE_FIELDS = ['next_check_at', 'lease_owner', 'lease_expires_at']
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseManager:
+    def __init__(self, worker_id: str | None = None, lease_seconds: int | None = None,
+                 refresh_interval: float | None = None, clock=time.monotonic):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds or settings.MONITOR_LEASE_SECONDS
+        self.refresh_interval = refresh_interval or settings.MONITOR_SCHEDULER_REFRESH
+        self.clock = clock
+        self._graph = None
+        self._graph_expires = 0.0
+        record_worker(self.worker_id)
+
+    def dependencies(self) -> DependencyGraph:
+        now = self.clock()
+        if self._graph is None or now >= self._graph_expires:
+            self._graph = DependencyGraph.load()
+            self._graph_expires = now + self.refresh_interval
+        return self._graph
+
+    def claim(self, limit: int, now=None, room=None) -> list[ServiceTarget]:
+        """
+        Lease up to `limit` due targets, most overdue first. room(target) is how
+        many more targets of that target's customer may be claimed, or None for
+        no cap; customers out of room are skipped in favour of the next ones.
+        """
+        now = now or timezone.now()
+        due = (
+            ServiceTarget.objects.select_for_update(skip_locked=True, of=('self',))
+            .with_budgets()
+            .filter(is_active=True)
+            .filter(Q(next_check_at__isnull=True) | Q(next_check_at__lte=now))
+            .filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now))
+            .order_by(F('next_check_at').asc(nulls_first=True))
+        )
+        targets, taken, full = [], Counter(), set()
+        with transaction.atomic():
+            # Each round that hits a cap excludes at least one more customer, so this ends.
+            while len(targets) < limit:
+                wanted = limit - len(targets)
+                rows = list(due.exclude(pk__in=[t.pk for t in targets]).exclude(customer_id__in=full)[:wanted])
+                capped = False
+                for t in rows:
+                    left = room(t) if room else None
+                    if left is not None and taken[t.customer_id] >= left:
+                        full.add(t.customer_id)
+                        capped = True
+                        continue
+                    taken[t.customer_id] += 1
+                    targets.append(t)
+                if not capped or len(rows) < wanted:
+                    break
+            if not targets:
+                return []
+            expires = now + timedelta(seconds=self.lease_seconds)
+            ServiceTarget.objects.filter(pk__in=[t.pk for t in targets]).update(
+                lease_owner=self.worker_id, lease_expires_at=expires,
+            )
+
+        reclaimed = 0
+        for t in targets:
+            if t.lease_owner and t.lease_owner != self.worker_id:
+                reclaimed += 1
+                logger.warning("Reclaimed %s from expired lease of %s", t.name, t.lease_owner)
+            t.lease_owner = self.worker_id
+            t.lease_expires_at = expires
+        record_claim(self.worker_id, len(targets), reclaimed)
+        return self.dependencies().attach(targets)
+
+    def release(self, target: ServiceTarget, now=None):
+        """Advance next_check_at and drop the lease in memory; ResultSink persists it."""
+        now = now or timezone.now()
+        interval = timedelta(seconds=max(target.check_interval, 1))
+        if target.next_check_at is None:
+            # First check: spread the follow-ups over one interval.
+            target.next_check_at = now + interval * random.random()
+        else:
+            target.next_check_at += interval
+            if target.next_check_at <= now:
+                target.next_check_at = now + interval
+        target.lease_owner = ''
+        target.lease_expires_at = None
+        record_release(self.worker_id, 1)
+
+    def abandon(self, target: ServiceTarget):
+        """Stop counting a lease that was not released; it expires and is reclaimed."""
+        record_release(self.worker_id, 1)
+
+
+class LeaseWorker:
+    def __init__(self, engine, on_outcome, leases: LeaseManager,
+                 poll_interval: float | None = None, max_in_flight: int | None = None):
+        self.engine = engine
+        self.on_outcome = on_outcome
+        self.leases = leases
+        self.poll_interval = poll_interval or settings.MONITOR_LEASE_POLL_INTERVAL
+        self.max_in_flight = max_in_flight or engine.concurrency
+        # Claimed but unfinished targets per customer id.
+        self._in_flight = Counter()
+
+    def _room(self, in_flight):
+        def room(target):
+            budget = self.engine.budgets.budget(target)
+            return budget - in_flight[target.customer_id] if budget else None
+        return room
+
+    async def run(self, should_stop):
+        """Claim and check due targets until should_stop() returns True, then drain."""
+        tasks = set()
+
+        while not should_stop():
+            free = self.max_in_flight - len(tasks)
+            room = self._room(self._in_flight.copy())
+            claimed = await sync_to_async(self.leases.claim)(free, room=room) if free > 0 else []
+            for target in claimed:
+                self._in_flight[target.customer_id] += 1
+                task = asyncio.create_task(self._dispatch(target))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if len(claimed) < free or free <= 0:
+                await asyncio.sleep(self.poll_interval)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _dispatch(self, target: ServiceTarget):
+        released = False
+        try:
+            outcome = await self.engine.check(target)
+            self.leases.release(target)
+            released = True
+            await sync_to_async(self.on_outcome)(outcome)
+        except Exception:
+            logger.exception("Check dispatch failed for %s", target.name)
+        finally:
+            self._in_flight[target.customer_id] -= 1
+            if not released:
+                self.leases.abandon(target)
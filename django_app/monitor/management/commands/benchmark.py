@@ -0,0 +1,76 @@
+"""
+  python manage.py benchmark
+  python manage.py benchmark --targets 5000 --results 2000000 --passes 2 -o bench.json
+  python manage.py benchmark --latency 80 --error-rate 0.05 --timeout-rate 0.01 --body-bytes 16384
+
+Seeds `bench-` targets against a local stub HTTP farm, times full check passes
+and dashboard requests, and prints a JSON report (see monitor/benchmark.py).
+Seeded targets carry a `benchmark:` external_id and are removed afterwards
+unless --keep is given; kept ones are replaced by the next run. Other targets
+are never touched, but use a scratch database (DATABASE_URL): the run writes
+real rows and its load skews the dashboard.
+"""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.benchmark import FarmProfile, run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Load-test the checker and the dashboard API against a local stub farm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', type=int, default=1000)
+        parser.add_argument('--results', type=int, default=100_000, help='historical results to backfill')
+        parser.add_argument('--passes', type=int, default=1, help='full check passes to time')
+        parser.add_argument('--requests', type=int, default=200, help='dashboard requests per variant')
+        parser.add_argument('--hosts', type=int, default=10, help='stub servers (distinct host:port)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='max checks in flight (default: MONITOR_CHECK_CONCURRENCY)')
+        parser.add_argument('--timeout', type=int, default=2, help='check timeout of the seeded targets (s)')
+        parser.add_argument('--latency', type=float, default=20.0, help='stub response latency (ms)')
+        parser.add_argument('--jitter', type=float, default=10.0, help='+/- latency jitter (ms)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='share of 500 responses')
+        parser.add_argument('--timeout-rate', type=float, default=0.0,
+                            help='share of responses that stall past the check timeout')
+        parser.add_argument('--body-bytes', type=int, default=0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='leave the seeded rows in place')
+        parser.add_argument('-o', '--output', default='-', help='file path (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['targets'] < 1:
+            raise CommandError("--targets must be at least 1")
+        if not 0 <= options['error_rate'] + options['timeout_rate'] <= 1:
+            raise CommandError("--error-rate plus --timeout-rate must be between 0 and 1")
+
+        profile = FarmProfile(
+            latency_ms=options['latency'],
+            jitter_ms=options['jitter'],
+            error_rate=options['error_rate'],
+            timeout_rate=options['timeout_rate'],
+            body_bytes=options['body_bytes'],
+            hang_seconds=options['timeout'] + 5,
+        )
+        report = run_benchmark(
+            targets=options['targets'],
+            results=options['results'],
+            passes=options['passes'],
+            requests=options['requests'],
+            hosts=options['hosts'],
+            concurrency=options['concurrency'],
+            profile=profile,
+            timeout=options['timeout'],
+            seed=options['seed'],
+            keep=options['keep'],
+            log=self.stderr.write,
+        )
+        data = json.dumps(report, indent=2) + '\n'
+        if options['output'] == '-':
+            sys.stdout.write(data)
+        else:
+            with open(options['output'], 'w') as out:
+                out.write(data)
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
@@ -0,0 +1,60 @@
+"""
+  python manage.py export_results > results.ndjson
+  python manage.py export_results --format csv --gzip -o results.csv.gz
+  python manage.py export_results --service 3 --since 2026-01-01 --until 2026-04-01
+
+Streams check results oldest first; memory use does not grow with the export.
+"""
+import argparse
+import sys
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from monitor.export import FORMATS, export_rows, stream_export
+
+
+def _parse_time(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise argparse.ArgumentTypeError(f"invalid date/time: {value}")
+        parsed = datetime.combine(day, time.min)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = 'Stream check result history as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', dest='fmt')
+        parser.add_argument('--service', type=int, action='append', default=[], help='target id (repeatable)')
+        parser.add_argument('--since', type=_parse_time, default=None)
+        parser.add_argument('--until', type=_parse_time, default=None)
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('-o', '--output', default='-', help='file path (default: stdout)')
+
+    def handle(self, *args, **options):
+        rows = export_rows(
+            service_ids=options['service'],
+            since=options['since'],
+            until=options['until'],
+            chunk_size=options['chunk_size'],
+        )
+        chunks = stream_export(rows, options['fmt'], options['gzip'])
+
+        if options['output'] == '-':
+            self._write(chunks, sys.stdout.buffer)
+        else:
+            with open(options['output'], 'wb') as out:
+                self._write(chunks, out)
+
+    @staticmethod
+    def _write(chunks, out):
+        for chunk in chunks:
+            out.write(chunk)
+        out.flush()
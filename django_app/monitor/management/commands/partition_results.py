@@ -0,0 +1,39 @@
+"""
+  python manage.py partition_results            # show partitions
+  python manage.py partition_results --ensure   # create upcoming partitions
+  python manage.py partition_results --convert  # one-off: partition the table (PostgreSQL)
+
+--convert rewrites the whole table under an exclusive lock: stop run_checks
+and run it in a maintenance window.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from monitor import partitions
+
+
+class Command(BaseCommand):
+    help = 'Manage range partitioning of check results by checked_at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true')
+        parser.add_argument('--ensure', action='store_true')
+        parser.add_argument('--months-ahead', type=int, default=settings.MONITOR_PARTITION_MONTHS_AHEAD)
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            raise CommandError("Partitioning is only available on PostgreSQL")
+
+        if options['convert']:
+            partitions.convert_to_partitioned(timezone.now(), options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(f"{partitions.TABLE} is partitioned"))
+        if options['ensure']:
+            for name in partitions.ensure_partitions(timezone.now(), options['months_ahead']):
+                self.stdout.write(f"  + partition {name}")
+
+        if not partitions.is_partitioned():
+            self.stdout.write(self.style.WARNING(f"{partitions.TABLE} is not partitioned"))
+            return
+        for name in partitions.list_partitions():
+            self.stdout.write(f"  {name}")
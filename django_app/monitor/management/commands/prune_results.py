@@ -0,0 +1,34 @@
+"""
+  python manage.py prune_results
+  python manage.py prune_results --dry-run
+  python manage.py prune_results --chunk-size 1000 --pause 0.5
+
+Deletes check results and closed status intervals older than each target's retention (retention_days,
+default MONITOR_RETENTION_DAYS). On a partitioned table it also creates
+upcoming monthly partitions, so schedule it at least daily.
+"""
+from django.core.management.base import BaseCommand
+
+from monitor.retention import prune_results
+
+
+class Command(BaseCommand):
+    help = 'Apply check result retention in bounded chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be deleted')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=None, help='seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        stats = prune_results(
+            chunk_size=options['chunk_size'], pause=options['pause'], dry_run=options['dry_run'],
+        )
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {stats['rows_deleted']} result rows, {stats['intervals_deleted']} status intervals"
+        ))
+        for name in stats['partitions_created']:
+            self.stdout.write(f"  + partition {name}")
+        for name in stats['partitions_dropped']:
+            self.stdout.write(f"  - partition {name}")
@@ -0,0 +1,18 @@
+"""
+  python manage.py rollup_results
+
+Folds new CheckResult rows into 1m/1h/1d rollups. Safe to run repeatedly
+(e.g. from cron every minute): each level resumes from its watermark.
+"""
+from django.core.management.base import BaseCommand
+
+from monitor.rollups import build_rollups
+
+
+class Command(BaseCommand):
+    help = 'Incrementally aggregate check results into 1m/1h/1d rollups'
+
+    def handle(self, *args, **options):
+        written = build_rollups()
+        summary = ', '.join(f"{granularity}: {count}" for granularity, count in written.items())
+        self.stdout.write(self.style.SUCCESS(f"Rollup buckets written - {summary}"))
@@ -1,14 +1,44 @@
 """
   python manage.py run_checks
-  python manage.py run_checks --continuous --interval 30
+  python manage.py run_checks --continuous
+  python manage.py run_checks --continuous --refresh 15
+  python manage.py run_checks --concurrency 500
+  python manage.py run_checks --continuous --distributed --metrics-port 9101
+  python manage.py run_checks --processes 4 --metrics-port 9101
+
+--continuous dispatches every target on its own check_interval and reloads
+the target list every --refresh seconds. With --distributed, due targets are
+leased from the database instead, so any number of workers can run side by
+side (see monitor/leasing.py). Results are written in batches
+(MONITOR_SINK_BATCH_SIZE / MONITOR_SINK_FLUSH_INTERVAL); SIGTERM flushes
+whatever is still buffered before exiting.
+
+With MONITOR_JOURNAL_DIR set, results are journaled on local disk first and
+written to the database by a background thread, so checking carries on while
+the database is slow or down (see monitor/journal.py).
+
+--processes N (implies --continuous) runs the checks in N worker processes,
+each with its own engine and a shard of the targets. This process is the only
+one that writes results and serves metrics (see monitor/shards.py).
 """
+import asyncio
 import signal
-import time
 
-from django.core.management.base import BaseCommand
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from prometheus_client import start_http_server
 
-from monitor.metrics import record_check, update_gauges
+from monitor.breaker import HostBreakers
+from monitor.engine import CheckEngine
+from monitor.journal import JournaledSink, ResultJournal
+from monitor.leasing import LEASE_FIELDS, LeaseManager, LeaseWorker
+from monitor.metrics import record_check
+from monitor.scheduler import CheckScheduler
 from monitor.services import ServiceChecker
+from monitor.shards import ShardedRunner
+from monitor.sink import ResultSink
+from monitor.tracing import phase_timings
 
 
 class Command(BaseCommand):
@@ -20,32 +50,116 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('--continuous', action='store_true')
-        parser.add_argument('--interval', type=int, default=60)
+        parser.add_argument('--refresh', type=float, default=None,
+                            help='seconds between target list (with --distributed: dependency graph) reloads '
+                                 '(default: MONITOR_SCHEDULER_REFRESH)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='max checks in flight (default: MONITOR_CHECK_CONCURRENCY)')
+        parser.add_argument('--distributed', action='store_true',
+                            help='claim due targets via database leases (implies --continuous)')
+        parser.add_argument('--worker-id', default=None,
+                            help='worker identity for leases and metrics (default: hostname:pid)')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='serve this process\'s Prometheus metrics on the given port')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='check in N worker processes, sharded by target (implies --continuous)')
 
     def handle(self, *args, **options):
         signal.signal(signal.SIGINT, self._handle_signal)
         signal.signal(signal.SIGTERM, self._handle_signal)
 
-        checker = ServiceChecker()
-        while not self._shutdown:
-            results = checker.check_all_active()
-            up = sum(1 for r in results if r.status == 'up')
-            down = len(results) - up
-            update_gauges(up, down)
+        if options['processes'] > 1 and options['distributed']:
+            raise CommandError("--processes cannot be combined with --distributed")
 
-            for r in results:
-                record_check(r.service.name, r.status, r.response_time_ms)
-                icon = '\u2713' if r.status == 'up' else '\u2717'
-                self.stdout.write(f"  {icon} {r.service.name}: {r.status} ({r.response_time_ms:.0f}ms)")
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
 
-            self.stdout.write(self.style.SUCCESS(f"Checked {len(results)}: {up} up, {down} down"))
+        journal = None
+        if settings.MONITOR_JOURNAL_DIR:
+            try:
+                journal = ResultJournal(settings.MONITOR_JOURNAL_DIR)
+            except RuntimeError as e:
+                raise CommandError(str(e))
 
-            if not options['continuous']:
-                break
-            time.sleep(options['interval'])
+        checker = ServiceChecker(concurrency=options['concurrency'], journal=journal)
+        try:
+            if options['processes'] > 1:
+                self._run_sharded(options, journal)
+            elif options['continuous'] or options['distributed']:
+                asyncio.run(self._run_continuous(checker, options, journal))
+            else:
+                self._run_once(checker)
+        finally:
+            if journal:
+                journal.close()
 
         if self._shutdown:
             self.stdout.write(self.style.WARNING("Shutting down gracefully..."))
 
+    def _run_once(self, checker):
+        results = checker.check_all_active()
+        up = sum(1 for r in results if r.status == 'up')
+        down = len(results) - up
+
+        for r in results:
+            self._report(r.service.name, r.status, r.response_time_ms, phase_timings(r))
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(results)}: {up} up, {down} down"))
+
+    async def _run_continuous(self, checker, options, journal):
+        leases = None
+        if options['distributed']:
+            leases = LeaseManager(options['worker_id'], refresh_interval=options['refresh'])
+        sink = self._make_sink(journal, target_fields=LEASE_FIELDS if leases else ())
+
+        def on_outcome(outcome):
+            self._handle_outcome(sink, outcome)
+
+        async def flush_periodically():
+            while True:
+                await asyncio.sleep(sink.flush_interval)
+                await sync_to_async(sink.maybe_flush)()
+
+        flusher = asyncio.create_task(flush_periodically())
+        try:
+            breakers = await sync_to_async(HostBreakers.load)()
+            async with CheckEngine(options['concurrency'], breakers) as engine:
+                if leases:
+                    self.stdout.write(f"Worker {leases.worker_id} claiming due targets")
+                    runner = LeaseWorker(engine, on_outcome, leases)
+                else:
+                    runner = CheckScheduler(engine, on_outcome, refresh_interval=options['refresh'])
+                await runner.run(lambda: self._shutdown)
+        finally:
+            flusher.cancel()
+            await sync_to_async(sink.flush)()
+
+    def _run_sharded(self, options, journal):
+        sink = self._make_sink(journal)
+        runner = ShardedRunner(options['processes'], options['concurrency'], options['refresh'])
+        self.stdout.write(f"Checking with {options['processes']} worker processes")
+        try:
+            runner.run(lambda outcome: self._handle_outcome(sink, outcome), lambda: self._shutdown, sink.maybe_flush)
+        finally:
+            sink.flush()
+
+    def _make_sink(self, journal, target_fields=()):
+        sink = ResultSink(target_fields=target_fields)
+        if journal is None:
+            return sink
+        sink = JournaledSink(sink, journal)
+        sink.start()
+        return sink
+
+    def _handle_outcome(self, sink, outcome):
+        if not outcome.skipped:
+            self._report(outcome.target.name, outcome.status, outcome.response_time_ms, phase_timings(outcome))
+        sink.add(outcome)
+
+    def _report(self, name, status, response_time_ms, phases=None):
+        record_check(name, status, response_time_ms, phases)
+        icon = '\u2713' if status == 'up' else '\u2717'
+        self.stdout.write(f"  {icon} {name}: {status} ({response_time_ms:.0f}ms)")
+
     def _handle_signal(self, signum, frame):
         self._shutdown = True
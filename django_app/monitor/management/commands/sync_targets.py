@@ -0,0 +1,50 @@
+"""
+  python manage.py sync_targets targets.csv
+  cmdb-export | python manage.py sync_targets - --format ndjson
+  python manage.py sync_targets targets.ndjson --partial --dry-run
+
+Creates, updates and deactivates targets to match an inventory document,
+keyed by external_id (see monitor/sync.py).
+"""
+import json
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.sync import FORMATS, sync_targets
+
+
+class Command(BaseCommand):
+    help = 'Sync service targets from an NDJSON or CSV inventory document'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="file path, or - for stdin")
+        parser.add_argument('--format', choices=FORMATS, default=None, dest='fmt',
+                            help='default: csv for *.csv files, ndjson otherwise')
+        parser.add_argument('--partial', action='store_true',
+                            help='only create/update the listed targets; leave unlisted ones active')
+        parser.add_argument('--dry-run', action='store_true', help='report the changes without writing them')
+        parser.add_argument('--allow-empty', action='store_true',
+                            help='accept a document without rows (deactivates every synced target)')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['fmt'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        try:
+            if path == '-':
+                summary = self._sync(sys.stdin, fmt, options)
+            else:
+                with open(path, encoding='utf-8', newline='') as f:
+                    summary = self._sync(f, fmt, options)
+        except ValidationError as e:
+            raise CommandError('Nothing synced:\n' + '\n'.join(e.messages))
+        self.stdout.write(json.dumps(summary))
+
+    @staticmethod
+    def _sync(lines, fmt, options):
+        return sync_targets(
+            lines, fmt, partial=options['partial'], dry_run=options['dry_run'], batch_size=options['batch_size'],
+            allow_empty=options['allow_empty'],
+        )
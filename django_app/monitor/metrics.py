@@ -1,5 +1,30 @@
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+"""
+Prometheus metrics.
+
+Counters and histograms are recorded by whichever process runs the checks.
+Under gunicorn, each worker keeps its own values. When
+PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py sets it), they are backed
+by files in that directory and /metrics aggregates all workers.
+
+Fleet state is not recorded: FleetCollector reads it from the database when
+/metrics is scraped, so every worker reports the same numbers. The per-target
+series are capped at MONITOR_METRICS_TARGET_LIMIT. Down targets are exported
+first, and the rest are counted in netops_target_series_omitted. A scrape
+therefore costs one aggregate query plus one query bounded by the cap.
+"""
+import os
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Value, When
 from django.http import HttpResponse
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, Info, generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from .models import ServiceTarget
 
 SERVICE_CHECKS_TOTAL = Counter(
     'netops_service_checks_total',
@@ -14,19 +39,204 @@ SERVICE_RESPONSE_TIME = Histogram(
     buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
 )
 
-SERVICES_UP = Gauge('netops_services_up', 'Services currently up')
-SERVICES_DOWN = Gauge('netops_services_down', 'Services currently down')
+SERVICE_PHASE_TIME = Histogram(
+    'netops_service_phase_seconds',
+    'Time spent per request phase (dns, connect, tls, ttfb, transfer)',
+    ['service_name', 'phase'],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+)
+
+HTTP_POOL = Counter(
+    'netops_http_pool_requests_total',
+    'Check requests served by a pooled keep-alive connection (hit) or a new one (miss)',
+    ['pool', 'result'],
+)
+DNS_CACHE = Counter('netops_dns_cache_lookups_total', 'Checker DNS cache lookups', ['pool', 'result'])
+
+HOST_CIRCUIT_STATE = Gauge(
+    'netops_host_circuit_state',
+    'Circuit breaker state per host (0 closed, 1 half-open, 2 open)',
+    ['host'],
+    multiprocess_mode='livemax',
+)
+CHECKS_SKIPPED = Counter(
+    'netops_checks_skipped_total',
+    'Checks skipped because the host circuit was open',
+    ['host'],
+)
+CHECKS_SUPPRESSED = Counter(
+    'netops_checks_suppressed_total', 'Checks not probed because every upstream of the target was down',
+)
+_CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+WORKER_INFO = Info('netops_worker', 'Identity of this check worker')
+LEASES_CLAIMED = Counter('netops_leases_claimed_total', 'Targets claimed by this worker', ['worker'])
+LEASES_RECLAIMED = Counter(
+    'netops_leases_reclaimed_total',
+    'Targets claimed after another worker let its lease expire',
+    ['worker'],
+)
+LEASES_HELD = Gauge(
+    'netops_leases_held', 'Targets currently leased by this worker', ['worker'], multiprocess_mode='livesum',
+)
+
+SHARD_TARGETS = Gauge('netops_shard_targets', 'Targets assigned to each checker process', ['shard'])
+SHARD_CHECKS = Counter('netops_shard_checks_total', 'Checks received from each checker process', ['shard'])
+SHARD_RESTARTS = Counter('netops_shard_restarts_total', 'Checker processes restarted after dying', ['shard'])
+SHARD_QUEUE_DEPTH = Gauge('netops_shard_queue_depth', 'Check results waiting for the writer process')
+
+JOURNAL_PENDING = Gauge('netops_journal_pending_results', 'Check results journaled but not yet in the database')
+JOURNAL_LAG = Gauge('netops_journal_lag_seconds', 'Age of the oldest check result not yet in the database')
+JOURNAL_WRITE_ERRORS = Counter('netops_journal_write_errors_total', 'Failed writes of journaled results to the DB')
 
 
-def record_check(service_name, status, response_time_ms):
+def record_check(service_name, status, response_time_ms, phases=None):
     SERVICE_CHECKS_TOTAL.labels(service_name=service_name, status=status).inc()
     SERVICE_RESPONSE_TIME.labels(service_name=service_name).observe(response_time_ms / 1000)
+    for phase, ms in (phases or {}).items():
+        SERVICE_PHASE_TIME.labels(service_name=service_name, phase=phase).observe(ms / 1000)
+
+
+def record_pool(pool, hit):
+    HTTP_POOL.labels(pool=pool, result='hit' if hit else 'miss').inc()
+
+
+def record_dns_cache(pool, hit):
+    DNS_CACHE.labels(pool=pool, result='hit' if hit else 'miss').inc()
+
+
+def record_circuit(host, state):
+    HOST_CIRCUIT_STATE.labels(host=host).set(_CIRCUIT_STATE_VALUES[state])
+
+
+def record_skip(host):
+    CHECKS_SKIPPED.labels(host=host).inc()
+
+
+def record_suppressed():
+    CHECKS_SUPPRESSED.inc()
+
+
+def record_worker(worker_id):
+    WORKER_INFO.info({'worker': worker_id})
+    LEASES_HELD.labels(worker=worker_id).set(0)
+
+
+def record_claim(worker_id, claimed, reclaimed):
+    LEASES_CLAIMED.labels(worker=worker_id).inc(claimed)
+    LEASES_RECLAIMED.labels(worker=worker_id).inc(reclaimed)
+    LEASES_HELD.labels(worker=worker_id).inc(claimed)
+
+
+def record_release(worker_id, released):
+    LEASES_HELD.labels(worker=worker_id).dec(released)
+
+
+def record_shard_targets(shard, count):
+    SHARD_TARGETS.labels(shard=shard).set(count)
+
+
+def record_shard_check(shard):
+    SHARD_CHECKS.labels(shard=shard).inc()
+
+
+def record_shard_restart(shard):
+    SHARD_RESTARTS.labels(shard=shard).inc()
+
+
+def record_queue_depth(depth):
+    SHARD_QUEUE_DEPTH.set(depth)
+
+
+def record_journal(pending, lag_seconds):
+    JOURNAL_PENDING.set(pending)
+    JOURNAL_LAG.set(lag_seconds)
+
+
+def record_journal_error():
+    JOURNAL_WRITE_ERRORS.inc()
+
+
+class FleetCollector:
+    """Fleet and per-target gauges computed from ServiceTarget/LatestResult at scrape time."""
+
+    def __init__(self, target_limit: int | None = None, clock=timezone.now):
+        self.target_limit = target_limit
+        self.clock = clock
+
+    def collect(self):
+        limit = settings.MONITOR_METRICS_TARGET_LIMIT if self.target_limit is None else self.target_limit
+        active = ServiceTarget.objects.filter(is_active=True)
+        counts = active.aggregate(
+            total=Count('id'),
+            up=Count('id', filter=Q(status=ServiceTarget.Status.UP)),
+            down=Count('id', filter=Q(status=ServiceTarget.Status.DOWN)),
+            unreachable=Count('id', filter=Q(status=ServiceTarget.Status.UNREACHABLE)),
+            checked=Count('latest'),
+        )
+        yield GaugeMetricFamily('netops_services_up', 'Services currently up', value=counts['up'])
+        yield GaugeMetricFamily('netops_services_down', 'Services currently down', value=counts['down'])
+        yield GaugeMetricFamily(
+            'netops_services_unreachable', 'Services not checked because their upstreams are down',
+            value=counts['unreachable'],
+        )
+        yield GaugeMetricFamily(
+            'netops_services_unknown', 'Active services not checked yet',
+            value=counts['total'] - counts['up'] - counts['down'] - counts['unreachable'],
+        )
+
+        labels = ['service_id', 'service_name']
+        up = GaugeMetricFamily('netops_target_up', 'Whether the target was up at its last check', labels=labels)
+        latency = GaugeMetricFamily(
+            'netops_target_response_time_seconds', 'Response time of the last check', labels=labels,
+        )
+        age = GaugeMetricFamily(
+            'netops_target_last_check_age_seconds', 'Seconds since the target was last checked', labels=labels,
+        )
+        rows = (
+            active.filter(latest__isnull=False)
+            .annotate(down_first=Case(
+                When(latest__status=ServiceTarget.Status.DOWN, then=Value(0)),
+                default=Value(1), output_field=IntegerField(),
+            ))
+            .order_by('down_first', 'name', 'id')
+            .values_list('id', 'name', 'latest__status', 'latest__response_time_ms', 'latest__checked_at')
+        )
+        now = self.clock()
+        exported = 0
+        for pk, name, status, response_time_ms, checked_at in (rows[:limit] if limit else ()):
+            values = [str(pk), name]
+            up.add_metric(values, 1 if status == ServiceTarget.Status.UP else 0)
+            if response_time_ms is not None:
+                latency.add_metric(values, response_time_ms / 1000)
+            age.add_metric(values, max((now - checked_at).total_seconds(), 0.0))
+            exported += 1
+        yield up
+        yield latency
+        yield age
+        yield GaugeMetricFamily(
+            'netops_target_series_omitted',
+            'Checked targets left out of the per-target series by MONITOR_METRICS_TARGET_LIMIT',
+            value=max(counts['checked'] - exported, 0),
+        )
+
+
+_fleet_registry = CollectorRegistry()
+_fleet_registry.register(FleetCollector())
+_multiprocess_registry = None
 
 
-def update_gauges(up_count, down_count):
-    SERVICES_UP.set(up_count)
-    SERVICES_DOWN.set(down_count)
+def _process_metrics() -> bytes:
+    global _multiprocess_registry
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return generate_latest(REGISTRY)
+    if _multiprocess_registry is None:
+        _multiprocess_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(_multiprocess_registry)
+    return generate_latest(_multiprocess_registry)
 
 
 def metrics_view(request):
-    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+    return HttpResponse(
+        _process_metrics() + generate_latest(_fleet_registry), content_type=CONTENT_TYPE_LATEST,
+    )
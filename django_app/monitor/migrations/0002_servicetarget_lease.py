@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicetarget',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicetarget',
+            name='lease_owner',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='servicetarget',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='servicetarget',
+            index=models.Index(fields=['is_active', 'next_check_at'], name='monitor_ser_is_acti_1f8045_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:24
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_servicetarget_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('in_flight', models.BooleanField(default=True)),
+                ('total', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('up', models.IntegerField(default=0)),
+                ('down', models.IntegerField(default=0)),
+                ('results', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('in_flight', True)), fields=('in_flight',), name='monitor_single_in_flight_check_job')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_latest(apps, schema_editor):
+    ServiceTarget = apps.get_model('monitor', 'ServiceTarget')
+    CheckResult = apps.get_model('monitor', 'CheckResult')
+    LatestResult = apps.get_model('monitor', 'LatestResult')
+
+    newest = CheckResult.objects.filter(service=models.OuterRef('pk')).order_by('-checked_at')
+    fields = ['status', 'response_time_ms', 'status_code', 'error_message', 'checked_at']
+    targets = ServiceTarget.objects.annotate(
+        **{f'last_{f}': models.Subquery(newest.values(f)[:1]) for f in fields}
+    ).filter(last_checked_at__isnull=False)
+
+    LatestResult.objects.bulk_create(
+        (LatestResult(service_id=t.pk, **{f: getattr(t, f'last_{f}') for f in fields}) for t in targets.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_checkjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestResult',
+            fields=[
+                ('service', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest', serialize=False, to='monitor.servicetarget')),
+                ('status', models.CharField(choices=[('up', 'Up'), ('down', 'Down'), ('unknown', 'Unknown')], max_length=10)),
+                ('response_time_ms', models.FloatField(null=True)),
+                ('status_code', models.IntegerField(null=True)),
+                ('error_message', models.TextField(blank=True, default='')),
+                ('checked_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(backfill_latest, migrations.RunPython.noop),
+    ]
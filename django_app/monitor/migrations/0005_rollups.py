@@ -0,0 +1,59 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_latestresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('1m', 'Minute'), ('1h', 'Hour'), ('1d', 'Day')], max_length=2)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('up_count', models.IntegerField(default=0)),
+                ('latency_count', models.IntegerField(default=0)),
+                ('latency_min', models.FloatField(null=True)),
+                ('latency_max', models.FloatField(null=True)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_histogram', models.JSONField(default=dict)),
+                ('p50', models.FloatField(null=True)),
+                ('p95', models.FloatField(null=True)),
+                ('p99', models.FloatField(null=True)),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('granularity', models.CharField(choices=[('1m', 'Minute'), ('1h', 'Hour'), ('1d', 'Day')], max_length=2, primary_key=True, serialize=False)),
+                ('processed_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='checkresult',
+            index=models.Index(fields=['checked_at'], name='monitor_che_checked_89c7d9_idx'),
+        ),
+        migrations.AddField(
+            model_name='resultrollup',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='monitor.servicetarget'),
+        ),
+        migrations.AddIndex(
+            model_name='resultrollup',
+            index=models.Index(fields=['granularity', 'bucket_start'], name='monitor_res_granula_b71430_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resultrollup',
+            constraint=models.UniqueConstraint(fields=('service', 'granularity', 'bucket_start'), name='monitor_rollup_unique_bucket'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0005_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicetarget',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, help_text='keep check results this long (default: MONITOR_RETENTION_DAYS)', null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+def create_fleet_state(apps, schema_editor):
+    apps.get_model('monitor', 'FleetState').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0006_servicetarget_retention_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetState',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='latestresult',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(create_fleet_state, migrations.RunPython.noop),
+    ]
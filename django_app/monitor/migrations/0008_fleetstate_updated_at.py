@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0007_fleetstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fleetstate',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0008_fleetstate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkresult',
+            name='connect_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='dns_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='tls_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='transfer_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='ttfb_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
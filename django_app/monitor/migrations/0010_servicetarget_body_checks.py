@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0009_checkresult_phases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicetarget',
+            name='body_pattern',
+            field=models.CharField(blank=True, default='', help_text='the first max_body_bytes must contain this', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='servicetarget',
+            name='body_pattern_is_regex',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='servicetarget',
+            name='head_first',
+            field=models.BooleanField(default=False, help_text='try HEAD first; fall back to GET if the server rejects it'),
+        ),
+        migrations.AddField(
+            model_name='servicetarget',
+            name='max_body_bytes',
+            field=models.PositiveIntegerField(blank=True, help_text='bytes of the body to read (default: MONITOR_BODY_READ_LIMIT)', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0010_servicetarget_body_checks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicetarget',
+            name='fresh_connection',
+            field=models.BooleanField(default=False, help_text='open a new connection and resolve DNS on every check (cold-start timing)'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0011_servicetarget_fresh_connection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostCircuit',
+            fields=[
+                ('host', models.CharField(help_text='host:port', max_length=255, primary_key=True, serialize=False)),
+                ('state', models.CharField(choices=[('closed', 'Closed'), ('open', 'Open'), ('half_open', 'Half-open')], default='closed', max_length=10)),
+                ('consecutive_failures', models.PositiveIntegerField(default=0)),
+                ('opens', models.PositiveIntegerField(default=0)),
+                ('opened_at', models.DateTimeField(blank=True, null=True)),
+                ('retry_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-17 19:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0012_hostcircuit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('up', 'Up'), ('down', 'Down'), ('unknown', 'Unknown')], max_length=10)),
+                ('status_code', models.IntegerField(null=True)),
+                ('error_message', models.TextField(blank=True, default='')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(help_text='time of the last check in the run')),
+                ('count', models.IntegerField(default=0)),
+                ('latency_count', models.IntegerField(default=0)),
+                ('latency_min', models.FloatField(null=True)),
+                ('latency_max', models.FloatField(null=True)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('is_open', models.BooleanField(default=True)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='intervals', to='monitor.servicetarget')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['service', '-started_at'], name='monitor_sta_service_6984da_idx'), models.Index(fields=['ended_at'], name='monitor_sta_ended_a_34a954_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_open', True)), fields=('service',), name='monitor_one_open_interval_per_service')],
+            },
+        ),
+    ]
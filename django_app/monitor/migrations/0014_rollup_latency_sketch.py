@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-17 20:02
+
+from django.db import migrations, models
+
+
+# A frozen copy of the version 1 format of monitor.sketch.LatencySketch.to_bytes(),
+# so this migration keeps working whatever becomes of the app code.
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def encode_histogram(histogram):
+    """The {index: count} histogram JSON as a serialized sketch (same bins)."""
+    bins = {}
+    for key, n in histogram.items():
+        bins[int(key)] = bins.get(int(key), 0) + n
+    out = bytearray([1])
+    _write_varint(out, len(bins))
+    previous = 0
+    for key in sorted(bins):
+        delta = key - previous
+        _write_varint(out, delta * 2 if delta >= 0 else -delta * 2 - 1)  # zigzag
+        _write_varint(out, bins[key])
+        previous = key
+    return bytes(out)
+
+
+def histograms_to_sketches(apps, schema_editor):
+    ResultRollup = apps.get_model('monitor', 'ResultRollup')
+    batch = []
+    for row in ResultRollup.objects.only('latency_histogram').iterator(chunk_size=2000):
+        row.latency_sketch = encode_histogram(row.latency_histogram)
+        batch.append(row)
+        if len(batch) == 2000:
+            ResultRollup.objects.bulk_update(batch, ['latency_sketch'])
+            batch = []
+    ResultRollup.objects.bulk_update(batch, ['latency_sketch'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0013_statusinterval'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resultrollup',
+            name='latency_sketch',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(histograms_to_sketches, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='resultrollup',
+            name='latency_histogram',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0014_rollup_latency_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicetarget',
+            name='depends_on',
+            field=models.ManyToManyField(blank=True, help_text='upstream targets (router, load balancer, ...); not checked while all of these are down', related_name='dependents', to='monitor.servicetarget'),
+        ),
+        migrations.AlterField(
+            model_name='checkresult',
+            name='status',
+            field=models.CharField(choices=[('up', 'Up'), ('down', 'Down'), ('unknown', 'Unknown'), ('unreachable', 'Unreachable')], max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='latestresult',
+            name='status',
+            field=models.CharField(choices=[('up', 'Up'), ('down', 'Down'), ('unknown', 'Unknown'), ('unreachable', 'Unreachable')], max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='servicetarget',
+            name='status',
+            field=models.CharField(choices=[('up', 'Up'), ('down', 'Down'), ('unknown', 'Unknown'), ('unreachable', 'Unreachable')], default='unknown', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='statusinterval',
+            name='status',
+            field=models.CharField(choices=[('up', 'Up'), ('down', 'Down'), ('unknown', 'Unknown'), ('unreachable', 'Unreachable')], max_length=12),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-17 20:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0015_target_dependencies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('check_budget', models.PositiveIntegerField(blank=True, help_text='max checks of this customer in flight per checker (default: MONITOR_CUSTOMER_CHECK_SHARE)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('users', models.ManyToManyField(blank=True, related_name='customers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='customer',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='monitor.customer'),
+        ),
+        migrations.AddField(
+            model_name='servicetarget',
+            name='customer',
+            field=models.ForeignKey(blank=True, help_text='owner; targets without one are visible to operators only', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='targets', to='monitor.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='checkresult',
+            index=models.Index(fields=['customer', 'service', '-checked_at'], name='monitor_che_custome_048725_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicetarget',
+            index=models.Index(fields=['customer', 'status'], name='monitor_ser_custome_71c0e8_idx'),
+        ),
+    ]
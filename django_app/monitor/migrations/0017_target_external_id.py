@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0016_customers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicetarget',
+            name='external_id',
+            field=models.CharField(blank=True, default=None, max_length=200, null=True, unique=True),
+        ),
+    ]
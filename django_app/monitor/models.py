@@ -1,40 +1,148 @@
 """
-MSP kontextus: Minden ügyfélnek külön ServiceTarget-jei lennének.
-Valódi rendszerben Customer FK kapcsolódna ide.
+MSP tenancy: every Customer owns its ServiceTargets. Users linked to
+customers only see those customers' targets and results (for_user()).
+Staff and superusers are operators and see the whole fleet; other accounts
+without a customer see nothing.
 """
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
 
+class Customer(models.Model):
+    name = models.CharField(max_length=200, unique=True)
+    users = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='customers', blank=True)
+    check_budget = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="max checks of this customer in flight per checker (default: MONITOR_CUSTOMER_CHECK_SHARE)",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
+def visible_customer_ids(user) -> list[int] | None:
+    """
+    Customers whose data the user may see; None for operators (staff and
+    superusers), who see everything. Other users without a customer see nothing.
+    """
+    if not hasattr(user, '_visible_customer_ids'):
+        if user.is_staff or user.is_superuser:
+            ids = None
+        elif user.pk is None:
+            ids = []
+        else:
+            ids = list(user.customers.order_by().values_list('id', flat=True))
+        user._visible_customer_ids = ids
+    return user._visible_customer_ids
+
+
+class TenantQuerySet(models.QuerySet):
+    def for_user(self, user):
+        ids = visible_customer_ids(user)
+        return self if ids is None else self.filter(customer_id__in=ids)
+
+    def with_budgets(self):
+        """Annotate customer_budget for the engine's per-customer slots (see monitor/budgets.py)."""
+        return self.annotate(customer_budget=models.F('customer__check_budget'))
+
+
 class ServiceTarget(models.Model):
     class Status(models.TextChoices):
         UP = 'up', 'Up'
         DOWN = 'down', 'Down'
         UNKNOWN = 'unknown', 'Unknown'
+        # Not checked because every upstream is down (see monitor/topology.py).
+        UNREACHABLE = 'unreachable', 'Unreachable'
 
+    customer = models.ForeignKey(
+        Customer, null=True, blank=True, on_delete=models.PROTECT, related_name='targets',
+        help_text="owner; targets without one are visible to operators only",
+    )
     name = models.CharField(max_length=200)
     url = models.URLField()
+    # Natural key of targets managed from an inventory (see monitor/sync.py).
+    external_id = models.CharField(max_length=200, null=True, blank=True, unique=True, default=None)
     check_interval = models.IntegerField(default=60, help_text="seconds")
     timeout = models.IntegerField(default=10)
-    status = models.CharField(max_length=10, choices=Status.choices, default=Status.UNKNOWN)
+    status = models.CharField(max_length=12, choices=Status.choices, default=Status.UNKNOWN)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Distributed workers (run_checks --distributed) claim due targets via a lease.
+    next_check_at = models.DateTimeField(null=True, blank=True)
+    lease_owner = models.CharField(max_length=200, blank=True, default='')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    retention_days = models.PositiveIntegerField(
+        null=True, blank=True, help_text="keep check results this long (default: MONITOR_RETENTION_DAYS)"
+    )
+    # Body handling: checks stream at most max_body_bytes and drop the connection after that.
+    head_first = models.BooleanField(
+        default=False, help_text="try HEAD first; fall back to GET if the server rejects it"
+    )
+    max_body_bytes = models.PositiveIntegerField(
+        null=True, blank=True, help_text="bytes of the body to read (default: MONITOR_BODY_READ_LIMIT)"
+    )
+    body_pattern = models.CharField(
+        max_length=500, blank=True, default='', help_text="the first max_body_bytes must contain this"
+    )
+    body_pattern_is_regex = models.BooleanField(default=False)
+    fresh_connection = models.BooleanField(
+        default=False, help_text="open a new connection and resolve DNS on every check (cold-start timing)"
+    )
+    depends_on = models.ManyToManyField(
+        'self', symmetrical=False, related_name='dependents', blank=True,
+        help_text="upstream targets (router, load balancer, ...); not checked while all of these are down",
+    )
+
+    objects = TenantQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name} ({self.status})"
 
+    def clean(self):
+        if self.body_pattern and self.body_pattern_is_regex:
+            try:
+                re.compile(self.body_pattern)
+            except re.error as e:
+                raise ValidationError({'body_pattern': f"Invalid regular expression: {e}"})
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_active', 'next_check_at']),
+            models.Index(fields=['customer', 'status']),
+        ]
 
 
 class CheckResult(models.Model):
     service = models.ForeignKey(ServiceTarget, on_delete=models.CASCADE, related_name='results')
-    status = models.CharField(max_length=10, choices=ServiceTarget.Status.choices)
+    # The target's customer when the check ran, so tenant-wide reads use one index.
+    # No FK constraint: results outlive customer changes of their target.
+    customer = models.ForeignKey(
+        Customer, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+    )
+    status = models.CharField(max_length=12, choices=ServiceTarget.Status.choices)
     response_time_ms = models.FloatField(null=True)
     status_code = models.IntegerField(null=True)
     error_message = models.TextField(blank=True, default='')
     checked_at = models.DateTimeField(default=timezone.now)
+    # Request phases (see monitor/tracing.py); null when the check never reached that phase.
+    dns_ms = models.FloatField(null=True, blank=True)
+    connect_ms = models.FloatField(null=True, blank=True)
+    tls_ms = models.FloatField(null=True, blank=True)
+    ttfb_ms = models.FloatField(null=True, blank=True)
+    transfer_ms = models.FloatField(null=True, blank=True)
+
+    objects = TenantQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.service.name}: {self.status} ({self.response_time_ms}ms)"
@@ -43,4 +151,203 @@ class CheckResult(models.Model):
         ordering = ['-checked_at']
         indexes = [
             models.Index(fields=['service', '-checked_at']),
+            models.Index(fields=['checked_at']),
+            models.Index(fields=['customer', 'service', '-checked_at']),
+        ]
+
+
+class StatusInterval(models.Model):
+    """
+    Run of consecutive checks with the same status and status_code, written
+    instead of CheckResult rows when MONITOR_STORAGE_MODE is 'intervals'
+    (see monitor/intervals.py). The newest run of each target is open and
+    grows with every matching check.
+    """
+    service = models.ForeignKey(ServiceTarget, on_delete=models.CASCADE, related_name='intervals')
+    status = models.CharField(max_length=12, choices=ServiceTarget.Status.choices)
+    status_code = models.IntegerField(null=True)
+    # Of the newest check in the run.
+    error_message = models.TextField(blank=True, default='')
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(help_text="time of the last check in the run")
+    count = models.IntegerField(default=0)
+    latency_count = models.IntegerField(default=0)
+    latency_min = models.FloatField(null=True)
+    latency_max = models.FloatField(null=True)
+    latency_sum = models.FloatField(default=0)
+    is_open = models.BooleanField(default=True)
+
+    @property
+    def latency_mean(self):
+        return self.latency_sum / self.latency_count if self.latency_count else None
+
+    def __str__(self):
+        return f"{self.service_id}: {self.status} x{self.count} from {self.started_at}"
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['service', '-started_at']),
+            models.Index(fields=['ended_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['service'], condition=models.Q(is_open=True), name='monitor_one_open_interval_per_service'
+            ),
+        ]
+
+
+class LatestResult(models.Model):
+    """Newest CheckResult per target, kept in sync by ResultSink so reads never touch CheckResult."""
+    service = models.OneToOneField(
+        ServiceTarget, on_delete=models.CASCADE, primary_key=True, related_name='latest'
+    )
+    status = models.CharField(max_length=12, choices=ServiceTarget.Status.choices)
+    response_time_ms = models.FloatField(null=True)
+    status_code = models.IntegerField(null=True)
+    error_message = models.TextField(blank=True, default='')
+    checked_at = models.DateTimeField()
+    # FleetState.version of the flush that wrote this row; live streams poll for version > last seen.
+    version = models.BigIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"{self.service_id}: {self.status} @ {self.checked_at}"
+
+
+class HostCircuit(models.Model):
+    """Circuit breaker state of one host (see monitor/breaker.py); written on transitions only."""
+
+    class State(models.TextChoices):
+        CLOSED = 'closed', 'Closed'
+        OPEN = 'open', 'Open'
+        HALF_OPEN = 'half_open', 'Half-open'
+
+    host = models.CharField(max_length=255, primary_key=True, help_text="host:port")
+    state = models.CharField(max_length=10, choices=State.choices, default=State.CLOSED)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    # Consecutive openings without a successful probe; the backoff doubles with each.
+    opens = models.PositiveIntegerField(default=0)
+    opened_at = models.DateTimeField(null=True, blank=True)
+    retry_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.host} ({self.state})"
+
+
+class FleetState(models.Model):
+    """
+    Single-row change counter for the fleet. Bumped by every result flush and
+    every ServiceTarget save/delete (monitor/signals.py); drives the SSE stream
+    and the dashboard's ETag and response cache.
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def bump(cls) -> int:
+        """
+        Increment and return the version. Call inside the writing transaction:
+        the row lock makes concurrent writers commit in version order.
+        """
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1, updated_at=timezone.now()):
+            cls.objects.get_or_create(pk=1)
+            return cls.bump()
+        return cls.objects.values_list('version', flat=True).get(pk=1)
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    def __str__(self):
+        return f"fleet v{self.version}"
+
+
+class ResultRollup(models.Model):
+    """Per-target aggregate of CheckResult over one minute, hour or day (see monitor/rollups.py)."""
+
+    class Granularity(models.TextChoices):
+        MINUTE = '1m', 'Minute'
+        HOUR = '1h', 'Hour'
+        DAY = '1d', 'Day'
+
+    service = models.ForeignKey(ServiceTarget, on_delete=models.CASCADE, related_name='rollups')
+    granularity = models.CharField(max_length=2, choices=Granularity.choices)
+    bucket_start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    up_count = models.IntegerField(default=0)
+    latency_count = models.IntegerField(default=0)
+    latency_min = models.FloatField(null=True)
+    latency_max = models.FloatField(null=True)
+    latency_sum = models.FloatField(default=0)
+    # LatencySketch.to_bytes() (monitor/sketch.py); mergeable, so hours/days roll up from minutes.
+    latency_sketch = models.BinaryField(default=b'')
+    p50 = models.FloatField(null=True)
+    p95 = models.FloatField(null=True)
+    p99 = models.FloatField(null=True)
+
+    @property
+    def latency_mean(self):
+        return self.latency_sum / self.latency_count if self.latency_count else None
+
+    def __str__(self):
+        return f"{self.service_id} {self.granularity} @ {self.bucket_start}"
+
+    class Meta:
+        ordering = ['bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['service', 'granularity', 'bucket_start'], name='monitor_rollup_unique_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start']),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Everything before processed_until has been folded into rollups of this granularity."""
+    granularity = models.CharField(max_length=2, choices=ResultRollup.Granularity.choices, primary_key=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.granularity} < {self.processed_until}"
+
+
+class CheckJob(models.Model):
+    """A check pass triggered through the API and run in the background."""
+
+    class State(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    state = models.CharField(max_length=10, choices=State.choices, default=State.QUEUED)
+    # True while queued or running; the partial unique constraint allows one such job at a time.
+    in_flight = models.BooleanField(default=True)
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    up = models.IntegerField(default=0)
+    down = models.IntegerField(default=0)
+    results = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.state})"
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['in_flight'],
+                condition=models.Q(in_flight=True),
+                name='monitor_single_in_flight_check_job',
+            ),
         ]
@@ -0,0 +1,172 @@
+"""
+Optional native range partitioning of CheckResult by checked_at (PostgreSQL).
+
+The table is converted once, during a maintenance window, with
+`manage.py partition_results --convert`. After that, monthly partitions
+named <table>_pYYYYMM are created ahead of time by ensure_partitions()
+(run by prune_results), and retention drops whole partitions instead of
+deleting rows. A partitioned table's primary key must contain the partition
+key, so the converted table uses (id, checked_at); ids still come from the
+same identity sequence, so the ORM keeps addressing rows by id.
+
+On any other database every function here is a no-op, so SQLite keeps
+working for development and tests.
+"""
+import logging
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import CheckResult
+
+logger = logging.getLogger('monitor')
+
+TABLE = CheckResult._meta.db_table
+_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(dt) -> datetime:
+    return datetime(dt.year, dt.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(dt, months) -> datetime:
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(start) -> str:
+    return f'{TABLE}_p{start:%Y%m}'
+
+
+def partition_bounds(name):
+    """(start, end) for a partition following our naming scheme, else None."""
+    match = _PARTITION_RE.match(name)
+    if not match:
+        return None
+    start = datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)
+    return start, add_months(start, 1)
+
+
+def is_supported() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned() -> bool:
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions() -> list[str]:
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s ORDER BY child.relname
+            """,
+            [TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _create_partition(cursor, start):
+    name = partition_name(start)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+        [start, add_months(start, 1)],
+    )
+    return name
+
+
+def ensure_partitions(now, months_ahead: int) -> list[str]:
+    """Create monthly partitions from the current month up to months_ahead. Returns new ones."""
+    if not is_partitioned():
+        return []
+    existing = set(list_partitions())
+    created = []
+    with connection.cursor() as cursor:
+        for i in range(months_ahead + 1):
+            start = add_months(month_start(now), i)
+            if partition_name(start) not in existing:
+                created.append(_create_partition(cursor, start))
+    for name in created:
+        logger.info("Created partition %s", name)
+    return created
+
+
+def drop_partitions_before(cutoff) -> list[str]:
+    """Drop partitions whose whole range is older than cutoff."""
+    dropped = []
+    with connection.cursor() as cursor:
+        for name in list_partitions():
+            bounds = partition_bounds(name)
+            if bounds and bounds[1] <= cutoff:
+                cursor.execute(f'DROP TABLE "{name}"')
+                dropped.append(name)
+                logger.info("Dropped partition %s", name)
+    return dropped
+
+
+def convert_to_partitioned(now, months_ahead: int):
+    """
+    Rebuild CheckResult as a partitioned table and copy existing rows over.
+
+    Takes an exclusive lock for the duration of the copy; stop run_checks first.
+    """
+    if not is_supported():
+        raise RuntimeError("Partitioning requires PostgreSQL")
+    if is_partitioned():
+        return
+
+    legacy = f'{TABLE}_legacy'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE %s",
+            [legacy, '%_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [legacy],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE (checked_at)'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, checked_at)')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{legacy}" DROP CONSTRAINT "{name}"')
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        # Keep Django's index names so later migrations still find them.
+        for name, definition in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+            cursor.execute(re.sub(rf' ON ((?:\S+\.)?){legacy} ', rf' ON \g<1>{TABLE} ', definition))
+
+        cursor.execute(f'SELECT min(checked_at) FROM "{legacy}"')
+        first = cursor.fetchone()[0] or now
+        start = month_start(first)
+        while start <= add_months(month_start(now), months_ahead):
+            _create_partition(cursor, start)
+            start = add_months(start, 1)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{legacy}"')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT max(id) FROM \"{TABLE}\"), 1))",
+            [TABLE],
+        )
+        cursor.execute(f'DROP TABLE "{legacy}"')
+    logger.info("Converted %s to a partitioned table", TABLE)
@@ -0,0 +1,77 @@
+"""
+Retention for CheckResult and StatusInterval.
+
+Each target keeps results for its retention_days, or MONITOR_RETENTION_DAYS
+when unset. Rows are deleted in bounded chunks (MONITOR_RETENTION_CHUNK_SIZE)
+with a pause between chunks, so pruning never holds long locks or floods
+WAL. On a partitioned table (see monitor/partitions.py), months that are
+past every target's retention are dropped as whole partitions first.
+Status intervals (interval storage mode) are deleted once their last check
+is past retention; open intervals are kept.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import partitions
+from .models import CheckResult, ServiceTarget, StatusInterval
+
+logger = logging.getLogger('monitor')
+
+
+def delete_in_chunks(queryset, chunk_size, pause, dry_run=False) -> int:
+    if dry_run:
+        return queryset.count()
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+        if len(ids) < chunk_size:
+            return deleted
+        time.sleep(pause)
+
+
+def prune_results(now=None, chunk_size=None, pause=None, dry_run=False) -> dict:
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.MONITOR_RETENTION_CHUNK_SIZE
+    pause = settings.MONITOR_RETENTION_PAUSE if pause is None else pause
+    default_days = settings.MONITOR_RETENTION_DAYS
+    stats = {'partitions_created': [], 'partitions_dropped': [], 'rows_deleted': 0, 'intervals_deleted': 0}
+
+    overrides = dict(
+        ServiceTarget.objects.filter(retention_days__isnull=False).values_list('pk', 'retention_days')
+    )
+
+    if partitions.is_partitioned() and not dry_run:
+        stats['partitions_created'] = partitions.ensure_partitions(now, settings.MONITOR_PARTITION_MONTHS_AHEAD)
+        longest = max([default_days, *overrides.values()])
+        stats['partitions_dropped'] = partitions.drop_partitions_before(now - timedelta(days=longest))
+
+    stale = CheckResult.objects.filter(checked_at__lt=now - timedelta(days=default_days))
+    stats['rows_deleted'] += delete_in_chunks(
+        stale.exclude(service_id__in=list(overrides)), chunk_size, pause, dry_run,
+    )
+    for service_id, days in overrides.items():
+        stats['rows_deleted'] += delete_in_chunks(
+            CheckResult.objects.filter(service_id=service_id, checked_at__lt=now - timedelta(days=days)),
+            chunk_size, pause, dry_run,
+        )
+
+    closed = StatusInterval.objects.filter(is_open=False)
+    stats['intervals_deleted'] += delete_in_chunks(
+        closed.filter(ended_at__lt=now - timedelta(days=default_days)).exclude(service_id__in=list(overrides)),
+        chunk_size, pause, dry_run,
+    )
+    for service_id, days in overrides.items():
+        stats['intervals_deleted'] += delete_in_chunks(
+            closed.filter(service_id=service_id, ended_at__lt=now - timedelta(days=days)),
+            chunk_size, pause, dry_run,
+        )
+
+    logger.info("Retention: %s", stats)
+    return stats
@@ -0,0 +1,324 @@
+"""
+Incremental rollups of CheckResult into 1m / 1h / 1d buckets per target.
+
+Each level has a watermark (RollupWatermark). A run folds only rows in
+[watermark, cutoff) into the next level and advances the watermark in the
+same transaction, so re-runs never double count:
+
+    raw CheckResult --> 1m --> 1h --> 1d
+
+Raw rows are only consumed once they are MONITOR_ROLLUP_LAG seconds old,
+which leaves room for batched writes still in flight. In interval storage
+mode ResultSink merges checks into 1m buckets itself (monitor/intervals.py);
+the 1m watermark then only gates the levels above. Higher levels only
+consume fully elapsed buckets of the level below.
+
+Results written behind a watermark, e.g. replayed from the result journal
+after a database outage, would never be consumed. ResultSink therefore folds
+them into every level that has already passed them (fold_late_results()),
+in the writing transaction. Writers and build_level() lock the watermark
+rows, so a late result is counted by exactly one of them.
+
+Latency percentiles come from a LatencySketch per bucket (monitor/sketch.py).
+The sketch has bounded relative error and merges across buckets.
+window_summary() merges them for any window and set of targets.
+"""
+import functools
+import operator
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import CheckResult, ResultRollup, RollupWatermark, ServiceTarget
+from .sketch import RELATIVE_ACCURACY, LatencySketch  # noqa: F401 (re-exported)
+
+G = ResultRollup.Granularity
+
+BUCKET_SIZES = {
+    G.MINUTE: timedelta(minutes=1),
+    G.HOUR: timedelta(hours=1),
+    G.DAY: timedelta(days=1),
+}
+
+# Level each granularity is built from; None means raw CheckResult rows.
+SOURCES = {G.MINUTE: None, G.HOUR: G.MINUTE, G.DAY: G.HOUR}
+
+# Buckets of the target level processed per transaction.
+WINDOW_BUCKETS = {G.MINUTE: 60, G.HOUR: 24, G.DAY: 7}
+
+
+def floor_time(dt, granularity):
+    if granularity == G.MINUTE:
+        return dt.replace(second=0, microsecond=0)
+    if granularity == G.HOUR:
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_time(dt, granularity):
+    floored = floor_time(dt, granularity)
+    return floored if floored == dt else floored + BUCKET_SIZES[granularity]
+
+
+class Bucket:
+    """In-memory accumulator with the same shape as a ResultRollup row."""
+
+    __slots__ = ('count', 'up_count', 'latency_count', 'latency_min', 'latency_max', 'latency_sum', 'sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.up_count = 0
+        self.latency_count = 0
+        self.latency_min = None
+        self.latency_max = None
+        self.latency_sum = 0.0
+        self.sketch = LatencySketch()
+
+    @classmethod
+    def from_row(cls, row: ResultRollup) -> 'Bucket':
+        bucket = cls()
+        bucket.count = row.count
+        bucket.up_count = row.up_count
+        bucket.latency_count = row.latency_count
+        bucket.latency_min = row.latency_min
+        bucket.latency_max = row.latency_max
+        bucket.latency_sum = row.latency_sum
+        bucket.sketch = LatencySketch.from_bytes(row.latency_sketch)
+        return bucket
+
+    def add(self, status, latency_ms):
+        self.count += 1
+        if status == ServiceTarget.Status.UP:
+            self.up_count += 1
+        if latency_ms is None:
+            return
+        self.latency_count += 1
+        self.latency_sum += latency_ms
+        self.latency_min = latency_ms if self.latency_min is None else min(self.latency_min, latency_ms)
+        self.latency_max = latency_ms if self.latency_max is None else max(self.latency_max, latency_ms)
+        self.sketch.add(latency_ms)
+
+    def merge(self, other: 'Bucket'):
+        self.count += other.count
+        self.up_count += other.up_count
+        self.latency_count += other.latency_count
+        self.latency_sum += other.latency_sum
+        for attr, pick in (('latency_min', min), ('latency_max', max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        self.sketch.merge(other.sketch)
+
+    def quantile(self, q):
+        value = self.sketch.quantile(q)
+        if value is None:
+            return None
+        return round(min(max(value, self.latency_min), self.latency_max), 2)
+
+    @property
+    def uptime(self):
+        return self.up_count / self.count if self.count else None
+
+    @property
+    def latency_mean(self):
+        return self.latency_sum / self.latency_count if self.latency_count else None
+
+    def to_fields(self) -> dict:
+        return {
+            'count': self.count,
+            'up_count': self.up_count,
+            'latency_count': self.latency_count,
+            'latency_min': self.latency_min,
+            'latency_max': self.latency_max,
+            'latency_sum': self.latency_sum,
+            'latency_sketch': self.sketch.to_bytes(),
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+def merge_buckets(granularity, buckets: dict):
+    """Fold {(service_id, bucket_start): Bucket} into existing ResultRollup rows."""
+    if not buckets:
+        return
+    service_ids = {sid for sid, _ in buckets}
+    starts = {start for _, start in buckets}
+    existing = {
+        (row.service_id, row.bucket_start): row
+        for row in ResultRollup.objects.filter(
+            granularity=granularity, service_id__in=service_ids, bucket_start__in=starts,
+        )
+    }
+
+    to_create, to_update = [], []
+    for (service_id, start), bucket in buckets.items():
+        row = existing.get((service_id, start))
+        if row is None:
+            to_create.append(ResultRollup(
+                service_id=service_id, granularity=granularity, bucket_start=start, **bucket.to_fields()
+            ))
+            continue
+        merged = Bucket.from_row(row)
+        merged.merge(bucket)
+        for field, value in merged.to_fields().items():
+            setattr(row, field, value)
+        to_update.append(row)
+
+    ResultRollup.objects.bulk_create(to_create, batch_size=1000)
+    ResultRollup.objects.bulk_update(to_update, list(Bucket().to_fields()), batch_size=1000)
+
+
+def _accumulate(granularity, start, end) -> dict:
+    """Aggregate source data in [start, end) into {(service_id, bucket_start): Bucket}."""
+    buckets = defaultdict(Bucket)
+    source = SOURCES[granularity]
+    if source is None:
+        rows = CheckResult.objects.filter(checked_at__gte=start, checked_at__lt=end).order_by().values_list(
+            'service_id', 'checked_at', 'status', 'response_time_ms',
+        )
+        for service_id, checked_at, status, latency in rows.iterator(chunk_size=5000):
+            buckets[(service_id, floor_time(checked_at, granularity))].add(status, latency)
+    else:
+        rows = ResultRollup.objects.filter(
+            granularity=source, bucket_start__gte=start, bucket_start__lt=end,
+        ).order_by()
+        for row in rows.iterator(chunk_size=2000):
+            buckets[(row.service_id, floor_time(row.bucket_start, granularity))].merge(Bucket.from_row(row))
+    return buckets
+
+
+def _initial_watermark(granularity):
+    source = SOURCES[granularity]
+    if source is None:
+        # In interval mode the sink writes minute buckets directly and there are no raw rows.
+        first = min(
+            filter(None, [
+                CheckResult.objects.aggregate(first=Min('checked_at'))['first'],
+                ResultRollup.objects.filter(granularity=granularity).aggregate(first=Min('bucket_start'))['first'],
+            ]),
+            default=None,
+        )
+    else:
+        first = ResultRollup.objects.filter(granularity=source).aggregate(first=Min('bucket_start'))['first']
+    return floor_time(first, granularity) if first else None
+
+
+def _cutoff(granularity, now):
+    source = SOURCES[granularity]
+    if source is None:
+        return floor_time(now - timedelta(seconds=settings.MONITOR_ROLLUP_LAG), granularity)
+    source_mark = RollupWatermark.objects.filter(granularity=source).first()
+    return floor_time(source_mark.processed_until, granularity) if source_mark else None
+
+
+def build_level(granularity, now=None) -> int:
+    """Advance one level's watermark as far as its source allows. Returns buckets written."""
+    now = now or timezone.now()
+    cutoff = _cutoff(granularity, now)
+    mark = RollupWatermark.objects.filter(granularity=granularity).first()
+    start = mark.processed_until if mark else _initial_watermark(granularity)
+    if cutoff is None or start is None:
+        return 0
+
+    written = 0
+    step = BUCKET_SIZES[granularity] * WINDOW_BUCKETS[granularity]
+    while start < cutoff:
+        end = min(start + step, cutoff)
+        with transaction.atomic():
+            # Serialises with fold_late_results(): late rows are either read here or folded by their writer.
+            list(RollupWatermark.objects.select_for_update().filter(granularity=granularity))
+            buckets = _accumulate(granularity, start, end)
+            merge_buckets(granularity, buckets)
+            RollupWatermark.objects.update_or_create(granularity=granularity, defaults={'processed_until': end})
+        written += len(buckets)
+        start = end
+    return written
+
+
+def fold_late_results(results, levels=tuple(SOURCES), now=None):
+    """
+    Merge results checked before the watermark of any of `levels` straight
+    into those levels. Call inside the writing transaction. Results younger
+    than MONITOR_ROLLUP_LAG cannot be behind a watermark and cost no query.
+    """
+    horizon = (now or timezone.now()) - timedelta(seconds=settings.MONITOR_ROLLUP_LAG)
+    late = [r for r in results if r.checked_at < horizon]
+    if not late:
+        return
+    marks = dict(
+        RollupWatermark.objects.select_for_update().filter(granularity__in=levels)
+        .values_list('granularity', 'processed_until')
+    )
+    for granularity in levels:
+        mark = marks.get(granularity)
+        buckets = defaultdict(Bucket)
+        for r in late:
+            if mark and r.checked_at < mark:
+                buckets[(r.service_id, floor_time(r.checked_at, granularity))].add(r.status, r.response_time_ms)
+        merge_buckets(granularity, buckets)
+
+
+def build_rollups(now=None) -> dict:
+    now = now or timezone.now()
+    return {granularity: build_level(granularity, now) for granularity in SOURCES}
+
+
+def _tiles(start, end, levels) -> list:
+    """Cover [start, end) with (granularity, lo, hi) ranges, coarsest first where rollups exist."""
+    if start >= end or not levels:
+        return []
+    (granularity, processed_until), finer = levels[0], levels[1:]
+    lo = ceil_time(start, granularity)
+    hi = min(floor_time(end, granularity), processed_until or lo)
+    if lo >= hi:
+        return _tiles(start, end, finer)
+    return [*_tiles(start, lo, finer), (granularity, lo, hi), *_tiles(hi, end, finer)]
+
+
+def window_summary(since, until, service_ids=None) -> Bucket:
+    """
+    Everything checked in [since, until) for the given targets (all when
+    None), merged into one Bucket in a fixed number of queries.
+
+    Rolled-up time is read at the coarsest level that tiles it: whole days,
+    then hours, then minutes at the edges. Each target therefore contributes
+    at most a few hundred rows plus one per day, however often it is checked.
+    Time the 1m level has not reached yet is read from the minute buckets
+    that interval mode writes on flush, and from raw rows. So are the partial
+    minutes at the window edges.
+    """
+    marks = dict(RollupWatermark.objects.values_list('granularity', 'processed_until'))
+    minute_mark = marks.get(G.MINUTE)
+    rollups = ResultRollup.objects.order_by().only(
+        'count', 'up_count', 'latency_count', 'latency_min', 'latency_max', 'latency_sum', 'latency_sketch',
+    )
+    raw = CheckResult.objects.order_by().values_list('status', 'response_time_ms')
+    if service_ids:
+        rollups = rollups.filter(service_id__in=service_ids)
+        raw = raw.filter(service_id__in=service_ids)
+
+    total = Bucket()
+    raw_ranges = [Q(checked_at__gte=since, checked_at__lt=until)]
+    tail = since
+    if minute_mark and minute_mark > since:
+        start = min(ceil_time(since, G.MINUTE), until)
+        end = max(min(floor_time(until, G.MINUTE), minute_mark), start)
+        tiles = _tiles(start, end, [(G.DAY, marks.get(G.DAY)), (G.HOUR, marks.get(G.HOUR)), (G.MINUTE, end)])
+        if tiles:
+            covered = functools.reduce(operator.or_, [
+                Q(granularity=granularity, bucket_start__gte=lo, bucket_start__lt=hi) for granularity, lo, hi in tiles
+            ])
+            for row in rollups.filter(covered).iterator(chunk_size=2000):
+                total.merge(Bucket.from_row(row))
+        raw_ranges = [Q(checked_at__gte=since, checked_at__lt=start), Q(checked_at__gte=end, checked_at__lt=until)]
+        tail = max(end, minute_mark)
+
+    for row in rollups.filter(granularity=G.MINUTE, bucket_start__gte=tail, bucket_start__lt=until).iterator():
+        total.merge(Bucket.from_row(row))
+    for status, latency in raw.filter(functools.reduce(operator.or_, raw_ranges)).iterator(chunk_size=5000):
+        total.add(status, latency)
+    return total
@@ -0,0 +1,142 @@
+"""
+Per-target scheduler for run_checks --continuous.
+
+Targets sit in a min-heap keyed on their next due time. Each one is
+dispatched when its own check_interval expires; the next due time is
+derived from the previous due time (not from when the check finished), so
+slow checks do not make the schedule drift. The target list is reloaded
+periodically, so added, removed and edited targets are picked up without a
+restart. Targets due together are dispatched upstreams first (see
+monitor/topology.py).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import ServiceTarget
+from .topology import attach_upstreams, depth_of
+
+logger = logging.getLogger('monitor')
+
+# Upper bound on a single idle wait, so a stop request is noticed promptly.
+MAX_TICK = 1.0
+
+
+def load_active_targets() -> list[ServiceTarget]:
+    return attach_upstreams(ServiceTarget.objects.filter(is_active=True).with_budgets())
+
+
+def _interval(target: ServiceTarget) -> int:
+    return max(target.check_interval, 1)
+
+
+class CheckScheduler:
+    def __init__(self, engine, on_outcome, load_targets=load_active_targets,
+                 refresh_interval: float | None = None, clock=time.monotonic):
+        self.engine = engine
+        self.on_outcome = on_outcome
+        self.load_targets = load_targets
+        self.refresh_interval = refresh_interval or settings.MONITOR_SCHEDULER_REFRESH
+        self.clock = clock
+        self._targets: dict[int, ServiceTarget] = {}
+        self._entries: dict[int, tuple[float, int]] = {}
+        self._heap: list[tuple[float, int, int]] = []
+        self._seq = itertools.count()
+        self._running: set[int] = set()
+
+    def __len__(self):
+        return len(self._targets)
+
+    def sync(self, targets, now: float | None = None):
+        """Reconcile the schedule with the current target list."""
+        now = self.clock() if now is None else now
+        fresh = {t.pk: t for t in targets}
+
+        for pk in self._targets.keys() - fresh.keys():
+            del self._targets[pk]
+            del self._entries[pk]
+
+        for pk, target in fresh.items():
+            previous = self._targets.get(pk)
+            self._targets[pk] = target
+            if previous is None:
+                # Spread first checks over one interval instead of firing all at once.
+                self._schedule(pk, now + random.uniform(0, _interval(target)))
+            elif _interval(previous) != _interval(target):
+                last = self._entries[pk][0] - _interval(previous)
+                self._schedule(pk, max(now, last + _interval(target)))
+
+    def pop_due(self, now: float | None = None) -> list[ServiceTarget]:
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, seq, pk = heapq.heappop(self._heap)
+            if self._entries.get(pk) != (due_at, seq):
+                continue  # stale entry: removed or rescheduled
+            target = self._targets[pk]
+            interval = _interval(target)
+            next_due = due_at + interval
+            if next_due <= now:
+                # We fell behind (e.g. the process was paused); skip missed slots.
+                next_due += ((now - next_due) // interval + 1) * interval
+            self._schedule(pk, next_due)
+            if pk in self._running:
+                logger.warning("Skipping %s: previous check still running", target.name)
+                continue
+            due.append(target)
+        due.sort(key=depth_of)
+        return due
+
+    def next_due_in(self, now: float | None = None) -> float | None:
+        now = self.clock() if now is None else now
+        while self._heap and self._entries.get(self._heap[0][2]) != self._heap[0][:2]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - now)
+
+    async def run(self, should_stop):
+        """Dispatch checks until should_stop() returns True, then drain in-flight checks."""
+        tasks = set()
+        next_refresh = 0.0
+
+        while not should_stop():
+            now = self.clock()
+            if now >= next_refresh:
+                self.sync(await sync_to_async(self.load_targets)(), now)
+                next_refresh = now + self.refresh_interval
+
+            for target in self.pop_due(now):
+                task = asyncio.create_task(self._dispatch(target))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            wait = min(MAX_TICK, next_refresh - now)
+            due_in = self.next_due_in(now)
+            if due_in is not None:
+                wait = min(wait, due_in)
+            await asyncio.sleep(max(wait, 0.0))
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _schedule(self, pk: int, due_at: float):
+        seq = next(self._seq)
+        self._entries[pk] = (due_at, seq)
+        heapq.heappush(self._heap, (due_at, seq, pk))
+
+    async def _dispatch(self, target: ServiceTarget):
+        self._running.add(target.pk)
+        try:
+            outcome = await self.engine.check(target)
+            await sync_to_async(self.on_outcome)(outcome)
+        except Exception:
+            logger.exception("Check dispatch failed for %s", target.name)
+        finally:
+            self._running.discard(target.pk)
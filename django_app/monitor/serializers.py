@@ -1,14 +1,43 @@
 from rest_framework import serializers
-from .models import ServiceTarget, CheckResult
+from .models import ServiceTarget, CheckResult, CheckJob, HostCircuit, LatestResult, ResultRollup, StatusInterval
 
 
 class CheckResultSerializer(serializers.ModelSerializer):
+    PHASE_FIELDS = ['dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms']
+
     class Meta:
         model = CheckResult
+        fields = [
+            'status', 'response_time_ms', 'status_code', 'error_message', 'checked_at',
+            'dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'transfer_ms',
+        ]
+
+
+class IntervalResultSerializer(serializers.ModelSerializer):
+    """
+    A StatusInterval as a result history row (interval storage mode): the
+    run's newest check with the run's mean latency, started_at and count.
+    """
+    response_time_ms = serializers.FloatField(source='latency_mean')
+    checked_at = serializers.DateTimeField(source='ended_at')
+
+    class Meta:
+        model = StatusInterval
+        fields = ['status', 'response_time_ms', 'status_code', 'error_message', 'checked_at', 'started_at', 'count']
+
+    def to_representation(self, instance):
+        # Runs keep no per-phase timings.
+        return {**super().to_representation(instance), **dict.fromkeys(CheckResultSerializer.PHASE_FIELDS)}
+
+
+class LatestResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LatestResult
         fields = ['status', 'response_time_ms', 'status_code', 'error_message', 'checked_at']
 
 
 class ServiceTargetSerializer(serializers.ModelSerializer):
+    """Expects the queryset to select_related('latest'); never queries CheckResult."""
     last_result = serializers.SerializerMethodField()
 
     class Meta:
@@ -16,17 +45,56 @@ class ServiceTargetSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'url', 'status', 'is_active', 'check_interval', 'updated_at', 'last_result']
 
     def get_last_result(self, obj):
-        if hasattr(obj, '_prefetched_last_result'):
-            results = obj._prefetched_last_result
-            if results:
-                return CheckResultSerializer(results[0]).data
-        latest = obj.results.first()
-        if latest:
-            return CheckResultSerializer(latest).data
-        return None
+        latest = getattr(obj, 'latest', None)
+        if latest is None:
+            return None
+        return LatestResultSerializer(latest).data
 
 
 class RunCheckResultSerializer(serializers.Serializer):
     service = serializers.CharField(source='service.name')
     status = serializers.CharField()
     ms = serializers.FloatField(source='response_time_ms')
+
+
+class CheckJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id')
+
+    class Meta:
+        model = CheckJob
+        fields = [
+            'job_id', 'state', 'total', 'completed', 'up', 'down', 'results', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+
+
+class ResultRollupSerializer(serializers.ModelSerializer):
+    uptime = serializers.SerializerMethodField()
+    latency_mean = serializers.FloatField()
+
+    class Meta:
+        model = ResultRollup
+        fields = [
+            'bucket_start', 'count', 'up_count', 'uptime',
+            'latency_min', 'latency_max', 'latency_mean', 'p50', 'p95', 'p99',
+        ]
+
+    def get_uptime(self, obj):
+        return obj.up_count / obj.count if obj.count else None
+
+
+class StatusIntervalSerializer(serializers.ModelSerializer):
+    latency_mean = serializers.FloatField()
+
+    class Meta:
+        model = StatusInterval
+        fields = [
+            'status', 'status_code', 'error_message', 'started_at', 'ended_at', 'count',
+            'latency_min', 'latency_max', 'latency_mean',
+        ]
+
+
+class HostCircuitSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HostCircuit
+        fields = ['host', 'state', 'consecutive_failures', 'opened_at', 'retry_at']
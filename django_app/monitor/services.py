@@ -1,56 +1,39 @@
-import logging
-import time
-
-import requests
-from django.db import transaction
-
+from .breaker import HostBreakers
+from .engine import iter_outcomes
+from .journal import JournaledSink, ResultJournal
 from .models import ServiceTarget, CheckResult
-
-logger = logging.getLogger('monitor')
+from .sink import ResultSink
+from .topology import attach_upstreams
 
 
 class ServiceChecker:
-    def check_service(self, target: ServiceTarget) -> CheckResult:
-        start = time.time()
-        status = ServiceTarget.Status.DOWN
-        status_code = None
-        error = ''
-
-        try:
-            resp = requests.get(
-                target.url,
-                timeout=target.timeout,
-                allow_redirects=True,
-                headers={'User-Agent': 'NetOps-Monitor/1.0'},
-            )
-            status_code = resp.status_code
-            if 200 <= status_code < 400:
-                status = ServiceTarget.Status.UP
-            else:
-                error = f"HTTP {status_code}"
-        except requests.ConnectionError as e:
-            error = f"Connection error: {str(e)[:200]}"
-        except requests.Timeout:
-            error = f"Timeout after {target.timeout}s"
-        except requests.RequestException as e:
-            error = f"Error: {str(e)[:200]}"
-
-        elapsed_ms = (time.time() - start) * 1000
-
-        with transaction.atomic():
-            result = CheckResult.objects.create(
-                service=target,
-                status=status,
-                response_time_ms=round(elapsed_ms, 2),
-                status_code=status_code,
-                error_message=error,
-            )
-            target.status = status
-            target.save(update_fields=['status', 'updated_at'])
-
-        logger.info("Checked %s: %s (%.0fms)", target.name, status, elapsed_ms)
-        return result
+    def __init__(self, concurrency: int | None = None, journal: ResultJournal | None = None):
+        self.concurrency = concurrency
+        self.journal = journal
+
+    def check_service(self, target: ServiceTarget) -> CheckResult | None:
+        """None if the check was skipped because the target's host circuit is open."""
+        results = self.check_targets([target])
+        return results[0] if results else None
+
+    def check_targets(self, targets, on_progress=None) -> list[CheckResult]:
+        """
+        on_progress(done, total) is called after every completed check. Checks
+        skipped by an open host circuit are counted as done but return no result.
+        With a journal, results left over from earlier runs are written and
+        returned too, and results the database could not take stay journaled.
+        """
+        targets = attach_upstreams(targets)
+        sink = ResultSink()
+        if self.journal:
+            sink = JournaledSink(sink, self.journal)
+        results = []
+        outcomes = iter_outcomes(targets, self.concurrency, HostBreakers.load())
+        for done, outcome in enumerate(outcomes, start=1):
+            results += sink.add(outcome)
+            if on_progress:
+                on_progress(done, len(targets))
+        return results + sink.flush()
 
     def check_all_active(self) -> list[CheckResult]:
-        targets = ServiceTarget.objects.filter(is_active=True)
-        return [self.check_service(t) for t in targets]
+        return self.check_targets(ServiceTarget.objects.filter(is_active=True).with_budgets())
@@ -0,0 +1,58 @@
+"""
+Entry point of a checker process started by run_checks --processes (see
+monitor/shards.py). Started with the 'spawn' method, so this module must
+not import Django models before django.setup() has run.
+
+The process never touches the database. Its inbox delivers the current
+target list of its shard, or None to stop. Outcomes go back to the writer
+as compact tuples on the shared results queue, followed by (DONE, shard)
+once in-flight checks have drained.
+"""
+import asyncio
+import queue
+import signal
+
+DONE = 'done'
+
+# How often the scheduler picks up a new assignment from the inbox.
+INBOX_POLL = 1.0
+
+
+def run_shard(shard, inbox, results, concurrency, host_concurrency, circuits):
+    import django
+    django.setup()
+    # Ctrl-C reaches the whole process group; the writer decides when workers stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_run(shard, inbox, results, concurrency, host_concurrency, circuits))
+    results.put((DONE, shard))
+
+
+async def _run(shard, inbox, results, concurrency, host_concurrency, circuits):
+    from .breaker import HostBreakers
+    from .engine import CheckEngine
+    from .scheduler import CheckScheduler
+    from .shards import encode_outcome
+
+    targets = []
+    stopping = False
+
+    def load_targets():
+        nonlocal targets, stopping
+        while True:
+            try:
+                item = inbox.get_nowait()
+            except queue.Empty:
+                return targets
+            if item is None:
+                stopping = True
+            else:
+                targets = item
+
+    def on_outcome(outcome):
+        results.put(encode_outcome(shard, outcome))
+
+    breakers = HostBreakers.seeded(circuits, host_concurrency=host_concurrency)
+    async with CheckEngine(concurrency, breakers) as engine:
+        scheduler = CheckScheduler(engine, on_outcome, load_targets, refresh_interval=INBOX_POLL)
+        await scheduler.run(lambda: stopping)
@@ -0,0 +1,196 @@
+"""
+Multi-core checking for run_checks --processes N.
+
+One asyncio engine is bound to a single core: TLS handshakes, response
+parsing and building outcomes all run under one GIL. ShardedRunner spreads
+active targets over N checker processes by a stable hash of the target id,
+or of its dependency tree (monitor/shard_worker.py). Each worker runs its
+own CheckEngine and CheckScheduler. The calling process stays the only writer. It reloads
+targets and reassigns shards every refresh, and turns the compact result
+tuples from the shared queue back into CheckOutcomes for ResultSink. It
+also owns the Prometheus metrics, including per-shard throughput and the
+queue depth.
+
+Limits are per worker: --concurrency applies to each process, and
+MONITOR_HOST_CONCURRENCY is divided between them. Each worker keeps its own
+host circuit breakers, seeded from HostCircuit at start.
+"""
+import dataclasses
+import logging
+import math
+import multiprocessing
+import queue
+import time
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from .breaker import Circuit, host_key, load_open_circuits
+from .engine import OUTCOME_FIELDS, CheckOutcome
+from .metrics import (
+    record_circuit, record_queue_depth, record_shard_check, record_shard_restart, record_shard_targets,
+    record_skip, record_suppressed,
+)
+from .models import ServiceTarget
+from .scheduler import load_active_targets
+from .shard_worker import DONE, run_shard
+
+logger = logging.getLogger('monitor')
+
+# Results handled per wakeup before the writer attends to flushing and refreshes.
+DRAIN_BATCH = 1000
+STOP_TIMEOUT = 60.0
+
+
+def shard_of(target_id: int, shards: int) -> int:
+    return zlib.crc32(str(target_id).encode()) % shards
+
+
+def _shard_key(target) -> int:
+    """Targets that depend on each other share a worker, so upstreams can suppress their dependents."""
+    return getattr(target, 'component', target.pk)
+
+
+def encode_outcome(shard, outcome: CheckOutcome) -> tuple:
+    circuit = dataclasses.astuple(outcome.circuit) if outcome.circuit else None
+    return (
+        shard, outcome.target.pk, outcome.checked_at.timestamp(), circuit,
+        *(getattr(outcome, f) for f in OUTCOME_FIELDS),
+    )
+
+
+def decode_outcome(item, targets: dict) -> CheckOutcome | None:
+    """None if the target was deleted since it was assigned."""
+    _, target_id, checked_at, circuit, *values = item
+    target = targets.get(target_id)
+    if target is None:
+        return None
+    return CheckOutcome(
+        target=target,
+        checked_at=datetime.fromtimestamp(checked_at, dt_timezone.utc),
+        circuit=Circuit(*circuit) if circuit else None,
+        **dict(zip(OUTCOME_FIELDS, values)),
+    )
+
+
+class ShardedRunner:
+    def __init__(self, processes: int, concurrency: int | None = None, refresh_interval: float | None = None,
+                 load_targets=load_active_targets):
+        self.processes = processes
+        self.concurrency = concurrency or settings.MONITOR_CHECK_CONCURRENCY
+        self.refresh_interval = refresh_interval or settings.MONITOR_SCHEDULER_REFRESH
+        self.host_concurrency = math.ceil(settings.MONITOR_HOST_CONCURRENCY / processes)
+        self.load_targets = load_targets
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue(maxsize=settings.MONITOR_SHARD_QUEUE_SIZE)
+        self._workers: dict[int, tuple] = {}
+        self._assignments: dict[int, list] = {}
+        self._targets: dict = {}
+        self._circuits = []
+
+    def run(self, on_outcome, should_stop, idle=None):
+        """
+        Check until should_stop() returns True, calling on_outcome(outcome) in
+        this thread for every result and idle() between batches.
+        """
+        self._circuits = load_open_circuits()
+        for shard in range(self.processes):
+            self._start_worker(shard)
+        next_refresh = 0.0
+        try:
+            while not should_stop():
+                now = time.monotonic()
+                if now >= next_refresh:
+                    self._assign(self.load_targets())
+                    next_refresh = now + self.refresh_interval
+                self._drain(on_outcome, timeout=min(1.0, max(next_refresh - now, 0.0)))
+                if idle:
+                    idle()
+                self._restart_dead_workers()
+        finally:
+            self._stop(on_outcome)
+
+    def _start_worker(self, shard):
+        inbox = self._context.Queue()
+        process = self._context.Process(
+            target=run_shard,
+            args=(shard, inbox, self._results, self.concurrency, self.host_concurrency, self._circuits),
+            name=f'checker-{shard}',
+            daemon=True,
+        )
+        process.start()
+        self._workers[shard] = (process, inbox)
+        if shard in self._assignments:
+            inbox.put(self._assignments[shard])
+
+    def _assign(self, targets):
+        self._targets = {t.pk: t for t in targets}
+        shards = {shard: [] for shard in range(self.processes)}
+        for target in targets:
+            shards[shard_of(_shard_key(target), self.processes)].append(target)
+        for shard, assigned in shards.items():
+            self._assignments[shard] = assigned
+            self._workers[shard][1].put(assigned)
+            record_shard_targets(shard, len(assigned))
+
+    def _drain(self, on_outcome, timeout) -> set:
+        """Handle up to DRAIN_BATCH results; returns the shards that reported DONE."""
+        done = set()
+        try:
+            items = [self._results.get(timeout=timeout)]
+        except queue.Empty:
+            return done
+        while len(items) < DRAIN_BATCH:
+            try:
+                items.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        for item in items:
+            if item[0] == DONE:
+                done.add(item[1])
+            else:
+                self._deliver(item, on_outcome)
+        try:
+            record_queue_depth(self._results.qsize())
+        except NotImplementedError:  # macOS
+            pass
+        return done
+
+    def _deliver(self, item, on_outcome):
+        record_shard_check(item[0])
+        outcome = decode_outcome(item, self._targets)
+        if outcome is None:
+            return
+        host = host_key(outcome.target.url)
+        if outcome.status == ServiceTarget.Status.UNREACHABLE:
+            record_suppressed()
+        elif outcome.skipped:
+            record_skip(host)
+        if outcome.circuit:
+            record_circuit(host, outcome.circuit.state)
+        on_outcome(outcome)
+
+    def _restart_dead_workers(self):
+        for shard, (process, _) in list(self._workers.items()):
+            if not process.is_alive():
+                logger.error("Checker process %s exited with %s; restarting", shard, process.exitcode)
+                record_shard_restart(shard)
+                self._start_worker(shard)
+
+    def _stop(self, on_outcome):
+        for _, inbox in self._workers.values():
+            inbox.put(None)
+        running = set(self._workers)
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while running and time.monotonic() < deadline:
+            done = self._drain(on_outcome, timeout=0.5)
+            if not done and self._results.empty():
+                # A worker that died without reporting DONE has nothing more to send.
+                done = {shard for shard in running if not self._workers[shard][0].is_alive()}
+            running -= done
+        for shard, (process, _) in self._workers.items():
+            process.join(timeout=5)
+            if process.is_alive():
+                logger.warning("Checker process %s did not stop; terminating", shard)
+                process.terminate()
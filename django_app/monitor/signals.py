@@ -0,0 +1,26 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FleetState, HostCircuit, ServiceTarget
+from .topology import check_dependencies
+
+
+@receiver(post_save, sender=ServiceTarget)
+@receiver(post_delete, sender=ServiceTarget)
+@receiver(post_save, sender=HostCircuit)
+@receiver(post_delete, sender=HostCircuit)
+def bump_fleet_version(sender, **kwargs):
+    """Edits outside ResultSink (admin, API) change the dashboard too; bulk writes bump in the sink."""
+    FleetState.bump()
+
+
+@receiver(m2m_changed, sender=ServiceTarget.depends_on.through)
+def reject_dependency_cycles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Dependencies added from either side (target.depends_on or target.dependents) must not form a cycle."""
+    if action != 'pre_add':
+        return
+    if reverse:
+        for dependent in pk_set:
+            check_dependencies(dependent, [instance.pk])
+    else:
+        check_dependencies(instance.pk, pk_set)
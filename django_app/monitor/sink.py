@@ -0,0 +1,155 @@
+"""
+Buffered write path for check outcomes.
+
+Outcomes are collected in memory and written in one transaction per flush:
+a bulk_create for the CheckResult rows, a single bulk_update for the
+affected ServiceTarget statuses (plus any target_fields the caller mutated,
+e.g. lease bookkeeping) and an upsert of each target's LatestResult, stamped
+with a freshly bumped FleetState.version so live streams can pick up the
+change. Host circuit transitions carried by the outcomes are upserted into
+HostCircuit in the same transaction. Checks skipped by an open circuit only
+update the target; checks suppressed by a down upstream also update its
+LatestResult, so the dashboard shows them as unreachable.
+A flush happens when the buffer reaches batch_size, when flush_interval has
+elapsed, or when the owner calls flush() on shutdown. With MONITOR_JOURNAL_DIR
+set, run_checks journals outcomes on local disk first and a background thread
+hands them to write() (see monitor/journal.py).
+
+With storage='intervals' (MONITOR_STORAGE_MODE), no CheckResult rows are
+inserted. The checks extend the targets' StatusIntervals and are merged into
+the 1m rollups instead (see monitor/intervals.py). Results older than the
+rollup watermarks, as replayed by the journal, are also folded into the
+rollup levels that already passed them. The targets are updated
+first, so concurrent flushes for the same target are serialised by its row
+lock before they read intervals or rollup buckets.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .engine import CheckOutcome
+from .intervals import MODES, minute_buckets, record_intervals
+from .models import ServiceTarget, CheckResult, LatestResult, FleetState, HostCircuit, ResultRollup
+from .rollups import fold_late_results, merge_buckets
+
+logger = logging.getLogger('monitor')
+
+LATEST_FIELDS = ['status', 'response_time_ms', 'status_code', 'error_message', 'checked_at']
+CIRCUIT_FIELDS = ['state', 'consecutive_failures', 'opens', 'opened_at', 'retry_at', 'updated_at']
+
+
+class ResultSink:
+    def __init__(self, batch_size: int | None = None, flush_interval: float | None = None,
+                 target_fields=(), storage: str | None = None, clock=time.monotonic):
+        self.batch_size = batch_size or settings.MONITOR_SINK_BATCH_SIZE
+        self.storage = storage or settings.MONITOR_STORAGE_MODE
+        if self.storage not in MODES:
+            raise ValueError(f"Unknown storage mode {self.storage!r}")
+        self.flush_interval = flush_interval or settings.MONITOR_SINK_FLUSH_INTERVAL
+        self.target_fields = ['status', 'updated_at', *target_fields]
+        self.clock = clock
+        self._buffer: list[CheckOutcome] = []
+        self._lock = threading.Lock()
+        self._last_flush = clock()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, outcome: CheckOutcome) -> list[CheckResult]:
+        """Buffer an outcome; returns the flushed rows if this triggered a flush."""
+        with self._lock:
+            self._buffer.append(outcome)
+            full = len(self._buffer) >= self.batch_size
+        if full or self._interval_elapsed():
+            return self.flush()
+        return []
+
+    def maybe_flush(self) -> list[CheckResult]:
+        if self._buffer and self._interval_elapsed():
+            return self.flush()
+        return []
+
+    def flush(self) -> list[CheckResult]:
+        """Write the buffer. In interval mode the returned CheckResults are not saved."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._last_flush = self.clock()
+        return self.write(batch)
+
+    def write(self, batch) -> list[CheckResult]:
+        """Write outcomes in one transaction, bypassing the buffer."""
+        if not batch:
+            return []
+
+        now = timezone.now()
+        results = []
+        targets = {}
+        latest = {}
+        circuits = {}
+        for outcome in batch:
+            target = outcome.target
+            target.status = outcome.status
+            target.updated_at = now
+            targets[target.pk] = target
+            if outcome.circuit:
+                circuits[outcome.circuit.host] = outcome.circuit.to_model()
+            suppressed = outcome.status == ServiceTarget.Status.UNREACHABLE
+            if outcome.skipped and not suppressed:
+                continue  # host circuit open: no network check, so no result row
+            result = CheckResult(
+                service=target,
+                customer_id=target.customer_id,
+                status=outcome.status,
+                response_time_ms=outcome.response_time_ms,
+                status_code=outcome.status_code,
+                error_message=outcome.error,
+                checked_at=outcome.checked_at,
+                dns_ms=outcome.dns_ms,
+                connect_ms=outcome.connect_ms,
+                tls_ms=outcome.tls_ms,
+                ttfb_ms=outcome.ttfb_ms,
+                transfer_ms=outcome.transfer_ms,
+            )
+            if not outcome.skipped:
+                results.append(result)
+            if target.pk not in latest or latest[target.pk].checked_at <= outcome.checked_at:
+                latest[target.pk] = result
+
+        with transaction.atomic():
+            if self.storage == 'intervals':
+                ServiceTarget.objects.bulk_update(targets.values(), self.target_fields, batch_size=self.batch_size)
+                record_intervals(results)
+                merge_buckets(ResultRollup.Granularity.MINUTE, minute_buckets(results))
+                fold_late_results(results, levels=(ResultRollup.Granularity.HOUR, ResultRollup.Granularity.DAY))
+            else:
+                CheckResult.objects.bulk_create(results, batch_size=self.batch_size)
+                ServiceTarget.objects.bulk_update(targets.values(), self.target_fields, batch_size=self.batch_size)
+                fold_late_results(results)
+            # Bumped last so the counter row stays locked as briefly as possible.
+            version = FleetState.bump()
+            LatestResult.objects.bulk_create(
+                [LatestResult(service_id=pk, version=version, **{f: getattr(r, f) for f in LATEST_FIELDS})
+                 for pk, r in latest.items()],
+                update_conflicts=True,
+                unique_fields=['service'],
+                update_fields=[*LATEST_FIELDS, 'version'],
+                batch_size=self.batch_size,
+            )
+            if circuits:
+                HostCircuit.objects.bulk_create(
+                    circuits.values(),
+                    update_conflicts=True,
+                    unique_fields=['host'],
+                    update_fields=CIRCUIT_FIELDS,
+                )
+
+        for r in results:
+            logger.info("Checked %s: %s (%.0fms)", r.service.name, r.status, r.response_time_ms)
+        return results
+
+    def _interval_elapsed(self) -> bool:
+        return self.clock() - self._last_flush >= self.flush_interval
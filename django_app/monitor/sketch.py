@@ -0,0 +1,118 @@
+"""
+Mergeable latency sketch (DDSketch, https://arxiv.org/abs/1908.10693).
+
+Latencies are counted in logarithmic bins. Bin i holds (gamma^(i-1), gamma^i],
+with gamma = (1 + a) / (1 - a), so every quantile comes back within a
+relative error of a (RELATIVE_ACCURACY). Merging two sketches adds their
+bin counts, so minute sketches fold into hours and days. Any window or set
+of targets can be summarised without touching raw results.
+
+At most MAX_BINS bins are kept. Beyond that the lowest bins are collapsed,
+which only affects the lowest quantiles; with 2% accuracy, 0.01 ms to
+10^6 ms needs about 460 bins. to_bytes() stores the bins as
+delta-encoded varints, about two bytes per occupied bin.
+"""
+import math
+
+RELATIVE_ACCURACY = 0.02
+MAX_BINS = 1024
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_VALUE = 0.01
+_FORMAT_VERSION = 1
+
+
+def _key(value: float) -> int:
+    return math.ceil(math.log(max(value, _MIN_VALUE)) / _LOG_GAMMA)
+
+
+def _value(key: int) -> float:
+    """Bin midpoint in the relative-error sense."""
+    return 2 * _GAMMA ** key / (_GAMMA + 1)
+
+
+def _write_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+class LatencySketch:
+    __slots__ = ('bins', 'count')
+
+    def __init__(self):
+        self.bins: dict[int, int] = {}
+        self.count = 0
+
+    def add(self, value: float, n: int = 1):
+        key = _key(value)
+        self.bins[key] = self.bins.get(key, 0) + n
+        self.count += n
+        if len(self.bins) > MAX_BINS:
+            self._collapse()
+
+    def merge(self, other: 'LatencySketch'):
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.count += other.count
+        if len(self.bins) > MAX_BINS:
+            self._collapse()
+
+    def quantile(self, q: float) -> float | None:
+        """Approximate q-quantile (0 <= q <= 1), None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return _value(key)
+        return _value(max(self.bins))
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - MAX_BINS + 1]
+        self.bins[excess[-1]] += sum(self.bins.pop(key) for key in excess[:-1])
+
+    def to_bytes(self) -> bytes:
+        out = bytearray([_FORMAT_VERSION])
+        _write_varint(out, len(self.bins))
+        previous = 0
+        for key in sorted(self.bins):
+            delta = key - previous
+            _write_varint(out, delta * 2 if delta >= 0 else -delta * 2 - 1)  # zigzag
+            _write_varint(out, self.bins[key])
+            previous = key
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data) -> 'LatencySketch':
+        sketch = cls()
+        if not data:
+            return sketch
+        data = bytes(data)
+        if data[0] != _FORMAT_VERSION:
+            raise ValueError(f"Unknown sketch format {data[0]}")
+        size, pos = _read_varint(data, 1)
+        key = 0
+        for _ in range(size):
+            zigzag, pos = _read_varint(data, pos)
+            key += zigzag // 2 if zigzag % 2 == 0 else -(zigzag + 1) // 2
+            n, pos = _read_varint(data, pos)
+            sketch.bins[key] = n
+            sketch.count += n
+        return sketch
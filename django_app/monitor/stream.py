@@ -0,0 +1,266 @@
+"""
+Live fleet updates for the Server-Sent Events endpoint (/api/v1/stream/).
+
+Every ResultSink flush bumps FleetState.version and stamps the LatestResult
+rows it wrote with it. One FleetBroadcaster per web process keeps the fleet
+snapshot in memory and polls for rows with a newer version (an indexed range
+scan that is usually empty), then fans the changes out to all connected
+streams through bounded queues. Open dashboards therefore cost one cheap
+poll per process instead of a full dashboard query each.
+
+A stream gets a snapshot on connect, then `status` events for target status
+transitions and `result` events for new latest results. Every event carries
+the version as its SSE id, so a reconnecting client (Last-Event-ID) only
+receives targets that changed while it was away. A subscriber whose queue
+overflows is resynchronised with a fresh snapshot instead of being dropped.
+Streams of customer users only see their customers' targets.
+
+A bump without a newer LatestResult row is a target edit (admin, API, sync).
+The broadcaster then reloads the target list. If targets were added, deleted,
+renamed or moved to another customer, every stream is resynchronised.
+
+Under gunicorn's gthread workers every open stream holds a worker thread.
+Each process therefore serves at most MONITOR_STREAM_MAX_CLIENTS streams,
+and further clients get a 503 before they take a thread for good. That way
+regular requests, /health and /metrics always have threads left.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from .models import FleetState, LatestResult, ServiceTarget
+from .serializers import LatestResultSerializer
+
+logger = logging.getLogger('monitor')
+
+RESYNC = object()
+
+
+class StreamLimitReached(Exception):
+    pass
+
+
+def format_event(event, data, event_id=None) -> str:
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def _entry(target, latest):
+    return {
+        'id': target.pk,
+        'name': target.name,
+        'status': latest.status if latest else target.status,
+        'last_result': LatestResultSerializer(latest).data if latest else None,
+    }
+
+
+class FleetBroadcaster:
+    def __init__(self, poll_interval: float | None = None, queue_size: int | None = None, start_thread=True,
+                 max_clients: int | None = None):
+        self.poll_interval = poll_interval or settings.MONITOR_STREAM_POLL_INTERVAL
+        self.queue_size = queue_size or settings.MONITOR_STREAM_QUEUE_SIZE
+        self.max_clients = max_clients or settings.MONITOR_STREAM_MAX_CLIENTS
+        self.start_thread = start_thread
+        self.version = None  # None until the snapshot is loaded
+        self._targets: dict[int, dict] = {}
+        self._versions: dict[int, int] = {}
+        self._customers: dict[int, int | None] = {}
+        # Subscription queue -> visible customer ids, None for the whole fleet.
+        self._subscribers: dict[queue.Queue, set | None] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, since: int | None = None, customer_ids=None) -> tuple[dict, queue.Queue]:
+        """
+        Register a stream. Returns (snapshot, queue of (event, version, data) tuples).
+        Raises StreamLimitReached if max_clients streams are open.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise StreamLimitReached(f"{self.max_clients} streams are open")
+            if self.version is None:
+                self._load()
+            subscription = queue.Queue(maxsize=self.queue_size)
+            self._subscribers[subscription] = customer_ids
+            snapshot = self._snapshot(since, customer_ids)
+        self._ensure_thread()
+        return snapshot, subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.pop(subscription, None)
+
+    def snapshot(self, since: int | None = None, customer_ids=None) -> dict:
+        with self._lock:
+            return self._snapshot(since, customer_ids)
+
+    def poll(self) -> int:
+        """Publish changes written since the last poll. Returns the number of events."""
+        # Read first: rows stamped up to this version are committed, later ones are for the next poll.
+        current = FleetState.current()
+        rows = LatestResult.objects.filter(version__gt=self.version).select_related('service').order_by('version')
+        events = []
+        with self._lock:
+            for row in rows:
+                previous = self._targets.get(row.service_id)
+                entry = _entry(row.service, row)
+                if previous is None or previous['status'] != entry['status']:
+                    events.append(('status', row.version, {
+                        'id': row.service_id,
+                        'name': entry['name'],
+                        'status': entry['status'],
+                        'previous': previous['status'] if previous else None,
+                    }))
+                events.append(('result', row.version, entry))
+                self._targets[row.service_id] = entry
+                self._versions[row.service_id] = row.version
+                self._customers[row.service_id] = row.service.customer_id
+                self.version = max(self.version, row.version)
+            resync = current > self.version and self._reload_targets(current)
+            self.version = max(self.version, current)
+            subscribers = list(self._subscribers.items())
+            customers = dict(self._customers)
+
+        if resync:
+            for subscription, _ in subscribers:
+                self._resync(subscription)
+            return len(events)
+        for subscription, customer_ids in subscribers:
+            for event in events:
+                if customer_ids is not None and customers[event[2]['id']] not in customer_ids:
+                    continue
+                try:
+                    subscription.put_nowait(event)
+                except queue.Full:
+                    self._resync(subscription)
+                    break
+        return len(events)
+
+    def _load(self):
+        # Read the version first: anything written meanwhile is re-applied by the next poll.
+        version = FleetState.current()
+        for target in ServiceTarget.objects.select_related('latest'):
+            latest = getattr(target, 'latest', None)
+            self._targets[target.pk] = _entry(target, latest)
+            self._versions[target.pk] = latest.version if latest else 0
+            self._customers[target.pk] = target.customer_id
+        self.version = version
+
+    def _reload_targets(self, version) -> bool:
+        """Apply added, deleted, renamed and re-assigned targets. Returns whether any changed."""
+        targets = {t.pk: t for t in ServiceTarget.objects.only('name', 'status', 'customer')}
+        changed = False
+        for pk in self._targets.keys() - targets.keys():
+            del self._targets[pk], self._versions[pk], self._customers[pk]
+            changed = True
+        for pk, target in targets.items():
+            entry = self._targets.get(pk)
+            if entry is None:
+                self._targets[pk] = _entry(target, None)
+            elif entry['name'] != target.name or self._customers[pk] != target.customer_id:
+                self._targets[pk] = {**entry, 'name': target.name}
+            else:
+                continue
+            self._versions[pk] = version
+            self._customers[pk] = target.customer_id
+            changed = True
+        return changed
+
+    def _snapshot(self, since, customer_ids=None) -> dict:
+        visible = {
+            pk: entry for pk, entry in self._targets.items()
+            if customer_ids is None or self._customers[pk] in customer_ids
+        }
+        services = [entry for pk, entry in visible.items() if since is None or self._versions[pk] > since]
+        services.sort(key=lambda entry: entry['name'])
+        statuses = [entry['status'] for entry in visible.values()]
+        return {
+            'version': self.version,
+            'since': since,
+            'summary': {
+                'total': len(statuses),
+                'up': statuses.count(ServiceTarget.Status.UP),
+                'down': statuses.count(ServiceTarget.Status.DOWN),
+                'unreachable': statuses.count(ServiceTarget.Status.UNREACHABLE),
+            },
+            'services': services,
+        }
+
+    @staticmethod
+    def _resync(subscription):
+        while True:
+            try:
+                subscription.get_nowait()
+            except queue.Empty:
+                break
+        subscription.put_nowait(RESYNC)
+
+    def _ensure_thread(self):
+        if not self.start_thread:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fleet-stream', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        idle = True
+        while True:
+            time.sleep(self.poll_interval)
+            if not self._subscribers:
+                if not idle:
+                    connections.close_all()
+                    idle = True
+                continue
+            idle = False
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Fleet stream poll failed")
+                connections.close_all()
+
+
+class EventStream:
+    """
+    SSE body for one client. It subscribes when created, so a full broadcaster
+    raises StreamLimitReached before the response starts. The server calls
+    close() when the response ends, which unsubscribes, even if the body was
+    never iterated.
+    """
+
+    def __init__(self, broadcaster: FleetBroadcaster, since: int | None = None, customer_ids=None,
+                 keepalive: float | None = None):
+        self.broadcaster = broadcaster
+        self.customer_ids = customer_ids
+        self.keepalive = keepalive or settings.MONITOR_STREAM_KEEPALIVE
+        self.snapshot, self.subscription = broadcaster.subscribe(since, customer_ids)
+
+    def __iter__(self):
+        snapshot = self.snapshot
+        yield format_event('snapshot', snapshot, snapshot['version'])
+        while True:
+            try:
+                item = self.subscription.get(timeout=self.keepalive)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if item is RESYNC:
+                snapshot = self.broadcaster.snapshot(customer_ids=self.customer_ids)
+                yield format_event('snapshot', snapshot, snapshot['version'])
+                continue
+            event, version, data = item
+            yield format_event(event, data, version)
+
+    def close(self):
+        self.broadcaster.unsubscribe(self.subscription)
+
+
+broadcaster = FleetBroadcaster()
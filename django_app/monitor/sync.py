@@ -0,0 +1,203 @@
+"""
+Bulk import and sync of ServiceTargets from an inventory such as a CMDB.
+
+The document is NDJSON (one object per line) or CSV with a header row. It is
+read line by line, so it never has to fit in memory as text. Targets are
+matched on external_id:
+  - rows with an unknown external_id are created;
+  - rows whose fields differ are updated, and listed targets are reactivated
+    unless the row sets is_active;
+  - targets with an external_id missing from the document are deactivated,
+    unless the sync is partial.
+A full sync of a document without rows is refused unless allow_empty is
+set, so an empty or lost request body cannot deactivate the whole inventory.
+Targets without an external_id (created in the admin) are never touched.
+Fields without a column keep their current values. Empty CSV cells mean
+the field's default, or null where the field allows it. `customer` is a
+customer name.
+
+plan_sync() validates every row and diffs the document against the
+existing targets in memory, using two queries. apply_sync() writes the plan
+in one transaction with batched bulk_create/bulk_update/update. It skips
+model signals, so it bumps FleetState once for the whole sync. Nothing is
+written if any row is invalid.
+"""
+import copy
+import csv
+import dataclasses
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Customer, FleetState, ServiceTarget
+
+FORMATS = ('ndjson', 'csv')
+
+SYNC_FIELDS = [
+    'name', 'url', 'customer', 'check_interval', 'timeout', 'is_active', 'retention_days',
+    'head_first', 'max_body_bytes', 'body_pattern', 'body_pattern_is_regex', 'fresh_connection',
+]
+REQUIRED = ('external_id', 'name', 'url')
+
+# Validation stops after this many bad rows.
+MAX_ERRORS = 20
+
+_BOOLEANS = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+
+
+@dataclasses.dataclass
+class SyncPlan:
+    create: list = dataclasses.field(default_factory=list)
+    update: list = dataclasses.field(default_factory=list)
+    # Names of the fields changed on any of the updated targets.
+    fields: set = dataclasses.field(default_factory=set)
+    deactivate: list = dataclasses.field(default_factory=list)
+    unchanged: int = 0
+
+    def summary(self) -> dict:
+        return {
+            'created': len(self.create),
+            'updated': len(self.update),
+            'deactivated': len(self.deactivate),
+            'unchanged': self.unchanged,
+        }
+
+
+def _csv_value(name, raw):
+    field = ServiceTarget._meta.get_field(name)
+    if raw == '':
+        return None if field.null else field.get_default()
+    if field.get_internal_type() == 'BooleanField':
+        return _BOOLEANS.get(raw.lower(), raw)
+    return raw
+
+
+def read_records(lines, fmt):
+    """Yield (line number, row dict) from an iterable of text lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            if None in row:
+                raise ValidationError(f"line {reader.line_num}: more cells than columns")
+            yield reader.line_num, {
+                name: _csv_value(name, raw) if name in SYNC_FIELDS and name != 'customer' else raw
+                for name, raw in row.items()
+            }
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ValidationError(f"line {number}: invalid JSON ({e})")
+        if not isinstance(row, dict):
+            raise ValidationError(f"line {number}: expected an object")
+        yield number, row
+
+
+def _apply_row(row, customers, existing: ServiceTarget | None) -> tuple[ServiceTarget, set]:
+    """
+    A validated copy of the existing target (or a new one) with the row applied,
+    and the attnames of the fields the row changed.
+    """
+    unknown = set(row) - set(SYNC_FIELDS) - {'external_id'}
+    if unknown:
+        raise ValidationError(f"unknown fields: {', '.join(sorted(unknown))}")
+    missing = [name for name in REQUIRED if row.get(name) in (None, '')]
+    if missing:
+        raise ValidationError(f"missing {', '.join(missing)}")
+    values = {name: row[name] for name in SYNC_FIELDS if name in row and name != 'customer'}
+    values.setdefault('is_active', True)
+    if 'customer' in row:
+        name = row['customer']
+        if name and name not in customers:
+            raise ValidationError(f"unknown customer {name!r}")
+        values['customer_id'] = customers[name] if name else None
+    target = copy.copy(existing) if existing else ServiceTarget(external_id=str(row['external_id']))
+    for name, value in values.items():
+        setattr(target, name, value)
+    # Validated as it will be saved, so a row cannot break fields it leaves alone
+    # (e.g. turning on body_pattern_is_regex for a stored pattern that is no regex).
+    # The customer comes from the preloaded names; validating the FK would query.
+    target.full_clean(exclude=['customer', 'external_id'], validate_unique=False, validate_constraints=False)
+    if existing is None:
+        return target, set(values)
+    return target, {name for name in values if getattr(target, name) != getattr(existing, name)}
+
+
+def _error_text(error: ValidationError) -> str:
+    if hasattr(error, 'error_dict'):
+        return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+def plan_sync(records, partial=False, allow_empty=False) -> SyncPlan:
+    """
+    Diff (line number, row) records against the targets with an external_id.
+    Raises ValidationError listing the bad rows (up to MAX_ERRORS).
+    """
+    customers = dict(Customer.objects.values_list('name', 'id'))
+    existing = ServiceTarget.objects.filter(external_id__isnull=False).in_bulk(field_name='external_id')
+    plan, seen, errors = SyncPlan(), {}, []
+    now = timezone.now()
+    for number, row in records:
+        key = str(row.get('external_id') or '')
+        try:
+            if key in seen:
+                raise ValidationError(f"duplicate external_id {key!r} (first on line {seen[key]})")
+            target, changed = _apply_row(row, customers, existing.get(key))
+        except ValidationError as e:
+            errors.append(f"line {number}: {_error_text(e)}")
+            if len(errors) >= MAX_ERRORS:
+                break
+            continue
+        seen[key] = number
+        if key not in existing:
+            plan.create.append(target)
+            continue
+        if not changed:
+            plan.unchanged += 1
+            continue
+        target.updated_at = now
+        plan.fields |= {'customer' if name == 'customer_id' else name for name in changed}
+        plan.update.append(target)
+    if errors:
+        raise ValidationError(errors)
+    if not seen and not partial and not allow_empty:
+        raise ValidationError("the document has no rows; a full sync would deactivate every synced target")
+    if not partial:
+        plan.deactivate = [t.pk for key, t in existing.items() if key not in seen and t.is_active]
+    return plan
+
+
+def apply_sync(plan: SyncPlan, batch_size: int | None = None):
+    batch_size = batch_size or settings.MONITOR_SYNC_BATCH_SIZE
+    if not (plan.create or plan.update or plan.deactivate):
+        return
+    with transaction.atomic():
+        ServiceTarget.objects.bulk_create(plan.create, batch_size=batch_size)
+        if plan.update:
+            ServiceTarget.objects.bulk_update(plan.update, [*sorted(plan.fields), 'updated_at'], batch_size=batch_size)
+        now = timezone.now()
+        for start in range(0, len(plan.deactivate), batch_size):
+            ServiceTarget.objects.filter(pk__in=plan.deactivate[start:start + batch_size]).update(
+                is_active=False, updated_at=now,
+            )
+        FleetState.bump()
+
+
+def sync_targets(lines, fmt='ndjson', partial=False, dry_run=False, batch_size=None, allow_empty=False) -> dict:
+    """Sync targets from a document; returns the counts of created/updated/deactivated/unchanged targets."""
+    try:
+        plan = plan_sync(read_records(lines, fmt), partial=partial, allow_empty=allow_empty)
+    except UnicodeDecodeError as e:
+        raise ValidationError(f"document is not UTF-8 ({e})")
+    except csv.Error as e:
+        raise ValidationError(f"invalid CSV ({e})")
+    if not dry_run:
+        apply_sync(plan, batch_size)
+    return plan.summary()
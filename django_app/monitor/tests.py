@@ -1,17 +1,133 @@
-from unittest.mock import patch, MagicMock
+import asyncio
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
 
-import requests
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import REGISTRY
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from .models import ServiceTarget, CheckResult
+from .breaker import Circuit, HostBreakers, host_key
+from .budgets import CustomerBudgets
+from .engine import CheckEngine, CheckOutcome
+from . import partitions
+from .jobs import run_check_job
+from .journal import JournaledSink, ResultJournal
+from .leasing import LEASE_FIELDS, LeaseManager, LeaseWorker
+from .metrics import FleetCollector
+from .models import (
+    Customer, ServiceTarget, CheckResult, CheckJob, FleetState, HostCircuit, LatestResult, ResultRollup,
+)
+from .retention import prune_results
+from .rollups import RELATIVE_ACCURACY, Bucket, build_rollups, window_summary
+from .scheduler import CheckScheduler
 from .services import ServiceChecker
+from .shards import ShardedRunner, decode_outcome, encode_outcome, shard_of
+from .sink import ResultSink
+from .sketch import LatencySketch
+from .stream import RESYNC, FleetBroadcaster
+from .topology import DependencyGraph, attach_upstreams
+from .views import RollupView
 
 User = get_user_model()
 
 
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    /status/<code> answers with that code, /sleep/<seconds> answers 200 late,
+    /big/<kb> sends <kb> KiB of padding followed by 'MARKER'.
+    /charset/<name> sends 'MARKER' as text/html in that charset.
+    HEAD is answered like GET except on /nohead/..., which rejects it with 405.
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive, so pooled connections get reused
+    methods = []
+
+    def do_GET(self):
+        self.methods.append(self.command)
+        _, kind, arg = self.path.split('/', 2)
+        if kind == 'sleep':
+            time.sleep(float(arg))
+            code = 200
+        elif kind == 'big':
+            self.send_big(int(arg))
+            return
+        elif kind == 'charset':
+            self.send_body(b'MARKER', f'text/html; charset={arg}')
+            return
+        elif kind == 'nohead':
+            code = 405 if self.command == 'HEAD' else int(arg)
+        else:
+            code = int(arg)
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_HEAD = do_GET
+
+    def send_big(self, kb):
+        self.send_body(b'.' * (kb * 1024) + b'MARKER')
+
+    def send_body(self, body, content_type=None):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerMixin:
+    """Serves real HTTP on 127.0.0.1 so checks exercise the actual client."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+
+def closed_port_url():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    return f'http://127.0.0.1:{port}/'
+
+
 class ServiceTargetModelTest(TestCase):
     def test_str_representation(self):
         target = ServiceTarget.objects.create(name="Test", url="https://example.com")
@@ -55,19 +171,14 @@ class CheckResultModelTest(TestCase):
         self.assertEqual(CheckResult.objects.count(), 0)
 
 
-class ServiceCheckerTest(TestCase):
+class ServiceCheckerTest(StubServerMixin, TestCase):
     def setUp(self):
         self.target = ServiceTarget.objects.create(
-            name="Test Service", url="https://example.com", timeout=5
+            name="Test Service", url=f"{self.base_url}/status/200", timeout=5
         )
         self.checker = ServiceChecker()
 
-    @patch('monitor.services.requests.get')
-    def test_check_service_up(self, mock_get):
-        mock_resp = MagicMock()
-        mock_resp.status_code = 200
-        mock_get.return_value = mock_resp
-
+    def test_check_service_up(self):
         result = self.checker.check_service(self.target)
 
         self.assertEqual(result.status, 'up')
@@ -77,11 +188,141 @@ class ServiceCheckerTest(TestCase):
         self.target.refresh_from_db()
         self.assertEqual(self.target.status, 'up')
 
-    @patch('monitor.services.requests.get')
-    def test_check_service_down_http_error(self, mock_get):
-        mock_resp = MagicMock()
-        mock_resp.status_code = 500
-        mock_get.return_value = mock_resp
+    def test_records_phase_timings(self):
+        self.target.url = f"{self.base_url}/sleep/0.2".replace('127.0.0.1', 'localhost')
+
+        result = self.checker.check_service(self.target)
+
+        self.assertEqual(result.status, 'up')
+        self.assertIsNotNone(result.dns_ms)
+        self.assertGreaterEqual(result.connect_ms, 0)
+        self.assertEqual(result.tls_ms, 0)  # plain HTTP
+        self.assertGreaterEqual(result.ttfb_ms, 200)
+        self.assertIsNotNone(result.transfer_ms)
+        self.assertLessEqual(result.ttfb_ms + result.connect_ms, result.response_time_ms)
+
+    def test_failed_connect_leaves_later_phases_empty(self):
+        self.target.url = closed_port_url()
+
+        result = self.checker.check_service(self.target)
+
+        self.assertIsNone(result.ttfb_ms)
+        self.assertIsNone(result.transfer_ms)
+
+    def test_body_pattern_within_budget(self):
+        self.target.url = f"{self.base_url}/big/1"
+        self.target.body_pattern = 'MARK'
+        self.assertEqual(self.checker.check_service(self.target).status, 'up')
+
+        self.target.body_pattern = r'MARK\w+$'
+        self.target.body_pattern_is_regex = True
+        self.assertEqual(self.checker.check_service(self.target).status, 'up')
+
+        self.target.body_pattern = 'missing'
+        result = self.checker.check_service(self.target)
+        self.assertEqual(result.status, 'down')
+        self.assertIn("Body does not match 'missing'", result.error_message)
+
+    def test_reads_at_most_the_byte_budget(self):
+        self.target.url = f"{self.base_url}/big/4096"  # 4 MiB
+        self.target.max_body_bytes = 2048
+        self.target.body_pattern = 'MARKER'
+
+        result = self.checker.check_service(self.target)
+
+        self.assertEqual(result.status, 'down')
+        self.assertIn('first 2048 chars', result.error_message)
+
+    def test_head_first(self):
+        _StubHandler.methods.clear()
+        self.target.head_first = True
+        self.assertEqual(self.checker.check_service(self.target).status, 'up')
+        self.assertEqual(_StubHandler.methods, ['HEAD'])
+
+        _StubHandler.methods.clear()
+        self.target.url = f"{self.base_url}/nohead/200"
+        self.assertEqual(self.checker.check_service(self.target).status, 'up')
+        self.assertEqual(_StubHandler.methods, ['HEAD', 'GET'])
+
+    def pool_counts(self, pool):
+        return [
+            REGISTRY.get_sample_value('netops_http_pool_requests_total', {'pool': pool, 'result': r}) or 0
+            for r in ('hit', 'miss')
+        ]
+
+    def test_connections_are_pooled(self):
+        hits, misses = self.pool_counts('shared')
+
+        results = ServiceChecker(concurrency=1).check_targets([self.target] * 3)
+
+        self.assertEqual([r.status for r in results], ['up'] * 3)
+        self.assertEqual(self.pool_counts('shared'), [hits + 2, misses + 1])
+        self.assertEqual([r.connect_ms for r in results][1:], [0, 0])
+
+    def test_fresh_connection_never_reuses(self):
+        self.target.fresh_connection = True
+        hits, misses = self.pool_counts('fresh')
+
+        ServiceChecker(concurrency=1).check_targets([self.target] * 3)
+
+        self.assertEqual(self.pool_counts('fresh'), [hits, misses + 3])
+
+    def test_open_circuit_skips_dead_host(self):
+        url = closed_port_url()
+        targets = [ServiceTarget.objects.create(name=f"Dead{i}", url=f"{url}{i}") for i in range(4)]
+
+        with self.settings(MONITOR_BREAKER_THRESHOLD=2):
+            results = ServiceChecker(concurrency=1).check_targets(targets)
+
+        self.assertEqual(len(results), 2)  # the rest never touched the network
+        self.assertEqual(CheckResult.objects.filter(service__in=targets).count(), 2)
+        self.assertEqual(ServiceTarget.objects.filter(pk__in=[t.pk for t in targets], status='down').count(), 4)
+        circuit = HostCircuit.objects.get()
+        self.assertEqual(circuit.state, 'open')
+        self.assertEqual(circuit.host, host_key(url))
+
+        # A new run is seeded from the stored state and skips the host straight away.
+        self.assertIsNone(self.checker.check_service(targets[0]))
+
+    def test_http_errors_do_not_trip_the_breaker(self):
+        self.target.url = f"{self.base_url}/status/503"
+        with self.settings(MONITOR_BREAKER_THRESHOLD=1):
+            results = ServiceChecker().check_targets([self.target] * 2)
+        self.assertEqual(len(results), 2)
+        self.assertFalse(HostCircuit.objects.exists())
+
+    def test_per_host_concurrency_cap(self):
+        self.target.url = f"{self.base_url}/sleep/0.2"
+        start = time.monotonic()
+        with self.settings(MONITOR_HOST_CONCURRENCY=1):
+            ServiceChecker(concurrency=10).check_targets([self.target] * 3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+
+    def test_unknown_charset_falls_back_to_utf8(self):
+        self.target.url = f"{self.base_url}/charset/bogus"
+        self.target.body_pattern = 'MARKER'
+        self.assertEqual(self.checker.check_service(self.target).status, 'up')
+
+    def test_stored_invalid_regex_is_a_down_result(self):
+        self.target.url = f"{self.base_url}/big/1"
+        self.target.body_pattern = 'price (USD'
+        self.target.body_pattern_is_regex = True
+        other = ServiceTarget.objects.create(name="Other", url=f"{self.base_url}/status/200")
+
+        results = {r.service_id: r for r in ServiceChecker().check_targets([self.target, other])}
+
+        self.assertEqual(results[other.pk].status, 'up')
+        self.assertEqual(results[self.target.pk].status, 'down')
+        self.assertIn("Invalid body pattern 'price (USD'", results[self.target.pk].error_message)
+
+    def test_invalid_body_regex_is_rejected(self):
+        self.target.body_pattern = '(unclosed'
+        self.target.body_pattern_is_regex = True
+        with self.assertRaises(ValidationError):
+            self.target.full_clean()
+
+    def test_check_service_down_http_error(self):
+        self.target.url = f"{self.base_url}/status/500"
 
         result = self.checker.check_service(self.target)
 
@@ -89,48 +330,814 @@ class ServiceCheckerTest(TestCase):
         self.assertEqual(result.status_code, 500)
         self.assertIn("HTTP 500", result.error_message)
 
-    @patch('monitor.services.requests.get')
-    def test_check_service_connection_error(self, mock_get):
-        mock_get.side_effect = requests.ConnectionError("Connection refused")
+    def test_check_service_connection_error(self):
+        self.target.url = closed_port_url()
 
         result = self.checker.check_service(self.target)
 
         self.assertEqual(result.status, 'down')
         self.assertIn("Connection error", result.error_message)
 
-    @patch('monitor.services.requests.get')
-    def test_check_service_timeout(self, mock_get):
-        mock_get.side_effect = requests.Timeout()
+    def test_check_service_timeout(self):
+        self.target.url = f"{self.base_url}/sleep/3"
+        self.target.timeout = 1
 
         result = self.checker.check_service(self.target)
 
         self.assertEqual(result.status, 'down')
         self.assertIn("Timeout", result.error_message)
 
-    @patch('monitor.services.requests.get')
-    def test_check_all_active_skips_inactive(self, mock_get):
-        mock_resp = MagicMock()
-        mock_resp.status_code = 200
-        mock_get.return_value = mock_resp
-
+    def test_check_all_active_skips_inactive(self):
         ServiceTarget.objects.create(name="Inactive", url="https://inactive.com", is_active=False)
 
         results = self.checker.check_all_active()
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0].service.name, "Test Service")
 
-    @patch('monitor.services.requests.get')
-    def test_check_creates_result_and_updates_target(self, mock_get):
-        mock_resp = MagicMock()
-        mock_resp.status_code = 200
-        mock_get.return_value = mock_resp
-
+    def test_check_creates_result_and_updates_target(self):
         self.checker.check_service(self.target)
 
         self.assertEqual(CheckResult.objects.count(), 1)
         self.target.refresh_from_db()
         self.assertEqual(self.target.status, 'up')
 
+    def test_check_all_active_runs_concurrently(self):
+        for i in range(5):
+            ServiceTarget.objects.create(name=f"Slow {i}", url=f"{self.base_url}/sleep/0.5")
+
+        start = time.monotonic()
+        results = self.checker.check_all_active()
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(results), 6)
+        self.assertLess(elapsed, 2.0)
+
+    def test_concurrency_limit_is_respected(self):
+        for i in range(4):
+            ServiceTarget.objects.create(name=f"Slow {i}", url=f"{self.base_url}/sleep/0.3")
+
+        start = time.monotonic()
+        ServiceChecker(concurrency=1).check_all_active()
+        elapsed = time.monotonic() - start
+
+        self.assertGreaterEqual(elapsed, 1.2)
+
+
+class HostBreakersTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.breakers = HostBreakers(threshold=3, backoff=10, max_backoff=25, clock=lambda: self.now)
+        self.host = host_key('https://Example.com/health')
+
+    def test_host_key(self):
+        self.assertEqual(self.host, 'example.com:443')
+        self.assertEqual(host_key('http://10.0.0.1:8080/x'), '10.0.0.1:8080')
+
+    def test_opens_after_consecutive_failures(self):
+        self.assertIsNone(self.breakers.record(self.host, False))
+        self.assertIsNone(self.breakers.record(self.host, True))  # success resets the count
+        self.assertIsNone(self.breakers.record(self.host, False))
+        self.assertIsNone(self.breakers.record(self.host, False))
+        circuit = self.breakers.record(self.host, False)
+
+        self.assertEqual(circuit.state, 'open')
+        self.assertEqual(circuit.retry_at, self.now + timedelta(seconds=10))
+        self.assertFalse(self.breakers.allow(self.host))
+        self.assertTrue(self.breakers.allow('other.com:443'))
+
+    def test_half_open_probe_backs_off_and_closes(self):
+        for _ in range(3):
+            self.breakers.record(self.host, False)
+
+        self.now += timedelta(seconds=10)
+        self.assertTrue(self.breakers.allow(self.host))   # the probe
+        self.assertFalse(self.breakers.allow(self.host))  # only one at a time
+        circuit = self.breakers.record(self.host, False)
+        self.assertEqual(circuit.retry_at, self.now + timedelta(seconds=20))
+
+        self.now += timedelta(seconds=20)
+        self.assertTrue(self.breakers.allow(self.host))
+        self.assertEqual(self.breakers.record(self.host, False).retry_at, self.now + timedelta(seconds=25))
+
+        self.now += timedelta(seconds=25)
+        self.assertTrue(self.breakers.allow(self.host))
+        self.assertEqual(self.breakers.record(self.host, True).state, 'closed')
+        self.assertTrue(self.breakers.allow(self.host))
+
+
+class CheckSchedulerTest(TestCase):
+    def make_scheduler(self, **kwargs):
+        return CheckScheduler(engine=None, on_outcome=None, refresh_interval=30, **kwargs)
+
+    def make_target(self, pk, interval):
+        return ServiceTarget(pk=pk, name=f"T{pk}", url="https://example.com", check_interval=interval)
+
+    def test_first_checks_are_jittered_within_one_interval(self):
+        scheduler = self.make_scheduler()
+        scheduler.sync([self.make_target(i, 60) for i in range(1, 51)], now=0)
+
+        self.assertEqual(len(scheduler.pop_due(now=60)), 50)
+        self.assertLess(scheduler.next_due_in(now=60), 60)
+
+    def test_each_target_follows_its_own_interval(self):
+        scheduler = self.make_scheduler()
+        fast, slow = self.make_target(1, 15), self.make_target(2, 300)
+        scheduler.sync([fast, slow], now=0)
+        scheduler.pop_due(now=300)
+
+        dispatched = []
+        for now in range(301, 601):
+            dispatched += [t.pk for t in scheduler.pop_due(now=now)]
+
+        self.assertEqual(dispatched.count(1), 20)
+        self.assertEqual(dispatched.count(2), 1)
+
+    def test_schedule_does_not_drift_or_burst_after_a_stall(self):
+        scheduler = self.make_scheduler()
+        scheduler.sync([self.make_target(1, 10)], now=0)
+        scheduler.pop_due(now=10)
+        due_at = scheduler.next_due_in(now=0)
+
+        self.assertEqual(len(scheduler.pop_due(now=due_at + 55)), 1)
+        self.assertEqual(scheduler.pop_due(now=due_at + 55), [])
+        self.assertAlmostEqual(scheduler.next_due_in(now=due_at + 55), 5)
+
+    def test_sync_picks_up_removed_and_edited_targets(self):
+        scheduler = self.make_scheduler()
+        scheduler.sync([self.make_target(1, 60), self.make_target(2, 60)], now=0)
+        scheduler.pop_due(now=60)
+
+        scheduler.sync([self.make_target(1, 600)], now=70)
+
+        self.assertEqual(len(scheduler), 1)
+        self.assertEqual(scheduler.pop_due(now=599), [])
+        self.assertEqual([t.pk for t in scheduler.pop_due(now=660)], [1])
+
+    def test_run_dispatches_due_targets_until_stopped(self):
+        class FakeEngine:
+            async def check(self, target):
+                return CheckOutcome(target=target, status='up', response_time_ms=1.0)
+
+        outcomes = []
+        scheduler = CheckScheduler(
+            FakeEngine(), outcomes.append,
+            load_targets=lambda: [self.make_target(1, 1), self.make_target(2, 1)],
+        )
+        asyncio.run(scheduler.run(lambda: len(outcomes) >= 4))
+
+        self.assertGreaterEqual(len(outcomes), 4)
+        self.assertEqual({o.target.pk for o in outcomes}, {1, 2})
+
+
+class ShardedRunnerTest(StubServerMixin, TestCase):
+    def test_shards_are_stable_and_cover_all_processes(self):
+        shards = [shard_of(pk, 4) for pk in range(1, 201)]
+
+        self.assertEqual(shards, [shard_of(pk, 4) for pk in range(1, 201)])
+        self.assertEqual(set(shards), {0, 1, 2, 3})
+
+    def test_outcome_round_trips_through_the_queue_tuple(self):
+        target = ServiceTarget.objects.create(name="Api", url="https://api.example.com")
+        outcome = CheckOutcome(
+            target=target, status='down', response_time_ms=12.5, status_code=503,
+            error="HTTP 503", dns_ms=1.0, ttfb_ms=10.0, reachable=True,
+        )
+
+        decoded = decode_outcome(encode_outcome(0, outcome), {target.pk: target})
+
+        self.assertEqual(decoded, outcome)
+        self.assertIsNone(decode_outcome(encode_outcome(0, outcome), {}))
+
+    def test_workers_check_every_target_and_the_caller_writes(self):
+        targets = [
+            ServiceTarget.objects.create(name=f"T{i}", url=f"{self.base_url}/status/200", check_interval=1)
+            for i in range(6)
+        ]
+        sink = ResultSink()
+        runner = ShardedRunner(2, concurrency=5, refresh_interval=30, load_targets=lambda: targets)
+
+        def on_outcome(outcome):
+            sink.add(outcome)
+            sink.flush()
+
+        deadline = time.monotonic() + 60
+        runner.run(on_outcome, lambda: (
+            time.monotonic() > deadline
+            or LatestResult.objects.count() == len(targets)
+        ))
+
+        self.assertEqual(LatestResult.objects.count(), len(targets))
+        self.assertFalse(CheckResult.objects.exclude(status='up').exists())
+
+
+class TopologyTest(StubServerMixin, TestCase):
+    def make(self, name, url=None, upstreams=()):
+        target = ServiceTarget.objects.create(name=name, url=url or f"{self.base_url}/status/200")
+        target.depends_on.set(upstreams)
+        return target
+
+    def test_dependency_cycles_are_rejected(self):
+        core = self.make("Core")
+        edge = self.make("Edge", upstreams=[core])
+        app = self.make("App", upstreams=[edge])
+
+        for add in (lambda: core.depends_on.add(app), lambda: app.dependents.add(core),
+                    lambda: core.depends_on.add(core)):
+            with self.assertRaises(ValidationError), transaction.atomic():
+                add()
+        self.assertFalse(core.depends_on.exists())
+
+    def test_graph_is_ordered_by_depth_and_cycles_in_the_database_are_broken(self):
+        core = self.make("Core")
+        edge = self.make("Edge", upstreams=[core])
+        app = self.make("App", upstreams=[edge])
+        loner = self.make("Loner")
+        # Written behind the validation's back.
+        ServiceTarget.depends_on.through.objects.create(from_servicetarget=core, to_servicetarget=app)
+
+        with self.assertLogs('monitor', 'WARNING'):
+            targets = attach_upstreams([app, loner, edge, core])
+
+        self.assertEqual([t.depth for t in targets], [0, 0, 1, 2])
+        self.assertEqual({t.component for t in targets if t != loner}, {core.pk})
+        self.assertEqual(targets[-1].upstreams[edge.pk].name, "Edge")
+
+    def test_targets_behind_a_down_upstream_are_not_probed(self):
+        router = self.make("Router", url=closed_port_url())
+        behind = self.make("Behind", url=closed_port_url(), upstreams=[router])
+        further = self.make("Further", url=closed_port_url(), upstreams=[behind])
+        redundant = self.make("Redundant", upstreams=[router, self.make("Backup")])
+
+        results = ServiceChecker().check_targets([further, behind, redundant, router])
+
+        self.assertEqual({r.service.name for r in results}, {"Router", "Redundant"})
+        for target in (behind, further):
+            target.refresh_from_db()
+            self.assertEqual(target.status, ServiceTarget.Status.UNREACHABLE)
+            self.assertFalse(target.results.exists())
+        self.assertIn("upstream Router is down", behind.latest.error_message)
+        self.assertIn("upstream Behind is unreachable", further.latest.error_message)
+        self.assertEqual(redundant.results.get().status, 'up')
+
+
+class ResultSinkTest(TestCase):
+    def setUp(self):
+        self.targets = [
+            ServiceTarget.objects.create(name=f"Svc{i}", url=f"https://{i}.example.com") for i in range(3)
+        ]
+        self.now = 0.0
+
+    def make_sink(self, **kwargs):
+        return ResultSink(clock=lambda: self.now, **kwargs)
+
+    def outcome(self, target, status='up'):
+        return CheckOutcome(target=target, status=status, response_time_ms=12.5, status_code=200)
+
+    def test_flush_writes_batch_in_constant_queries(self):
+        sink = self.make_sink(batch_size=100, flush_interval=60)
+        for t in self.targets:
+            sink.add(self.outcome(t))
+
+        # savepoint, INSERT, UPDATE targets, bump + read version, upsert latest, release
+        with self.assertNumQueries(7):
+            results = sink.flush()
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(CheckResult.objects.count(), 3)
+        self.assertEqual(ServiceTarget.objects.filter(status='up').count(), 3)
+
+    def test_flushes_when_batch_is_full(self):
+        sink = self.make_sink(batch_size=2, flush_interval=60)
+
+        self.assertEqual(sink.add(self.outcome(self.targets[0])), [])
+        self.assertEqual(len(sink.add(self.outcome(self.targets[1]))), 2)
+        self.assertEqual(len(sink), 0)
+
+    def test_flushes_when_interval_elapsed(self):
+        sink = self.make_sink(batch_size=100, flush_interval=5)
+        sink.add(self.outcome(self.targets[0]))
+        self.assertEqual(sink.maybe_flush(), [])
+
+        self.now = 5
+        self.assertEqual(len(sink.maybe_flush()), 1)
+
+    def test_last_outcome_wins_for_target_status(self):
+        sink = self.make_sink(batch_size=100, flush_interval=60)
+        sink.add(self.outcome(self.targets[0], 'up'))
+        sink.add(self.outcome(self.targets[0], 'down'))
+        sink.flush()
+
+        self.targets[0].refresh_from_db()
+        self.assertEqual(self.targets[0].status, 'down')
+        self.assertEqual(CheckResult.objects.count(), 2)
+        self.assertEqual(self.targets[0].latest.status, 'down')
+
+    def test_latest_result_is_upserted(self):
+        sink = self.make_sink(batch_size=100, flush_interval=60)
+        sink.add(self.outcome(self.targets[0], 'up'))
+        sink.flush()
+        sink.add(CheckOutcome(target=self.targets[0], status='down', response_time_ms=None, error='Timeout'))
+        sink.flush()
+
+        latest = LatestResult.objects.get(service=self.targets[0])
+        self.assertEqual(LatestResult.objects.count(), 1)
+        self.assertEqual(latest.status, 'down')
+        self.assertEqual(latest.error_message, 'Timeout')
+        self.assertEqual(latest.checked_at, CheckResult.objects.first().checked_at)
+
+
+class ResultJournalTest(TestCase):
+    def setUp(self):
+        self.target = ServiceTarget.objects.create(name="Api", url="https://api.example.com")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def open_journal(self, **kwargs):
+        journal = ResultJournal(self.directory, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def outcome(self, status='up', **kwargs):
+        return CheckOutcome(target=self.target, status=status, response_time_ms=12.5, status_code=200, **kwargs)
+
+    def segments(self):
+        return sorted(f for f in os.listdir(self.directory) if f.endswith('.seg'))
+
+    def test_sink_journals_outcomes_and_drain_writes_them(self):
+        sink = JournaledSink(ResultSink(), self.open_journal())
+        with self.assertNumQueries(0):
+            sink.add(self.outcome())
+            sink.add(self.outcome('down'))
+
+        self.assertEqual(len(sink), 2)
+        self.assertEqual(len(sink.flush()), 2)
+        self.assertEqual(CheckResult.objects.count(), 2)
+        self.assertEqual(self.segments(), [])
+
+    def test_unflushed_segments_are_replayed_on_open(self):
+        circuit = Circuit(host='api.example.com', state='open', consecutive_failures=5, opens=1,
+                          opened_at=timezone.now(), retry_at=timezone.now() + timedelta(seconds=30))
+        journal = ResultJournal(self.directory)
+        journal.append(self.outcome('down', error="HTTP 503", ttfb_ms=4.0, circuit=circuit))
+        journal.append(self.outcome())
+        journal.close()  # stopped before the database came back
+
+        replayed = self.open_journal()
+        self.assertEqual(len(replayed), 2)
+        results = replayed.drain(ResultSink().write)
+
+        self.assertEqual([r.status for r in results], ['down', 'up'])
+        self.assertEqual(results[0].error_message, "HTTP 503")
+        self.assertEqual(results[0].ttfb_ms, 4.0)
+        self.assertEqual(HostCircuit.objects.get().retry_at, circuit.retry_at)
+        self.assertEqual(len(replayed), 0)
+
+    def test_failed_write_keeps_segment_and_torn_line_ends_replay(self):
+        journal = ResultJournal(self.directory)
+        journal.append(self.outcome())
+        journal.append(self.outcome('down'))
+        journal.seal()
+        with patch.object(ResultSink, 'write', side_effect=OperationalError("database is down")):
+            self.assertEqual(ServiceChecker(journal=journal).check_targets([]), [])
+        journal.close()
+        with open(os.path.join(self.directory, self.segments()[0]), 'ab') as f:
+            f.write(b'0badc0de [')  # crashed mid-append
+
+        results = self.open_journal().drain(ResultSink().write)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(self.segments(), [])
+
+    def test_deleted_target_does_not_block_the_journal(self):
+        other = ServiceTarget.objects.create(name="Gone", url="https://gone.example.com")
+        journal = self.open_journal()
+        journal.append(self.outcome())
+        journal.append(CheckOutcome(target=other, status='up', response_time_ms=1.0))
+        other.delete()
+        sink = JournaledSink(ResultSink(), journal)
+
+        self.assertEqual(sink.flush(), [])  # fails on the deleted target
+        self.assertEqual(len(sink.flush()), 1)  # retried from disk without it
+        self.assertEqual(self.segments(), [])
+
+    def test_journal_is_owned_by_one_process(self):
+        self.open_journal()
+
+        with self.assertRaises(RuntimeError):
+            ResultJournal(self.directory)
+
+
+class LeaseManagerTest(TestCase):
+    def setUp(self):
+        self.targets = [
+            ServiceTarget.objects.create(name=f"Svc{i}", url=f"https://{i}.example.com") for i in range(4)
+        ]
+
+    def test_workers_never_claim_the_same_target(self):
+        first = LeaseManager('worker-a').claim(limit=3)
+        second = LeaseManager('worker-b').claim(limit=3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({t.pk for t in first} & {t.pk for t in second})
+        self.assertEqual(ServiceTarget.objects.filter(lease_owner='worker-a').count(), 3)
+
+    def test_expired_leases_are_reclaimed(self):
+        LeaseManager('crashed', lease_seconds=60).claim(limit=4)
+
+        later = timezone.now() + timedelta(seconds=61)
+        reclaimed = LeaseManager('survivor').claim(limit=10, now=later)
+
+        self.assertEqual(len(reclaimed), 4)
+        self.assertTrue(all(t.lease_owner == 'survivor' for t in reclaimed))
+
+    def test_targets_not_yet_due_are_skipped(self):
+        ServiceTarget.objects.update(next_check_at=timezone.now() + timedelta(minutes=5))
+        ServiceTarget.objects.filter(pk=self.targets[0].pk).update(next_check_at=timezone.now())
+
+        claimed = LeaseManager('worker-a').claim(limit=10)
+
+        self.assertEqual([t.pk for t in claimed], [self.targets[0].pk])
+
+    def test_release_is_persisted_with_the_result(self):
+        leases = LeaseManager('worker-a')
+        target = leases.claim(limit=1)[0]
+        target.next_check_at = timezone.now()
+        due = target.next_check_at
+
+        leases.release(target)
+        sink = ResultSink(target_fields=LEASE_FIELDS)
+        sink.add(CheckOutcome(target=target, status='up', response_time_ms=5.0))
+        sink.flush()
+
+        target.refresh_from_db()
+        self.assertEqual(target.lease_owner, '')
+        self.assertIsNone(target.lease_expires_at)
+        self.assertEqual(target.next_check_at, due + timedelta(seconds=target.check_interval))
+        self.assertEqual(target.status, 'up')
+
+    def test_claims_stop_at_each_customers_budget(self):
+        big = Customer.objects.create(name="Big", check_budget=2)
+        small = Customer.objects.create(name="Small", check_budget=2)
+        # Big's four targets are the most overdue, one of them is still being checked.
+        ServiceTarget.objects.update(customer=big, next_check_at=timezone.now() - timedelta(minutes=5))
+        for i in range(2):
+            ServiceTarget.objects.create(name=f"Small{i}", url=f"https://s{i}.example.com", customer=small,
+                                         next_check_at=timezone.now() - timedelta(minutes=1))
+        worker = LeaseWorker(CheckEngine(concurrency=8), None, LeaseManager('worker-a'))
+        worker._in_flight[big.pk] = 1
+
+        claimed = worker.leases.claim(limit=6, room=worker._room(worker._in_flight))
+
+        self.assertEqual(sorted(t.customer_id for t in claimed), [big.pk, small.pk, small.pk])
+        self.assertEqual(ServiceTarget.objects.filter(lease_owner='worker-a').count(), 3)
+
+    def test_dependency_graph_is_kept_between_claims(self):
+        core, edge = self.targets[:2]
+        edge.depends_on.add(core)
+        now = [0.0]
+        leases = LeaseManager('worker-a', lease_seconds=1, refresh_interval=30, clock=lambda: now[0])
+
+        with patch.object(DependencyGraph, 'load', wraps=DependencyGraph.load) as load:
+            claimed = leases.claim(limit=4)
+            later = timezone.now() + timedelta(seconds=2)
+            leases.claim(limit=4, now=later)
+            self.assertEqual(load.call_count, 1)
+            now[0] = 31
+            leases.claim(limit=4, now=later + timedelta(seconds=2))
+            self.assertEqual(load.call_count, 2)
+        self.assertEqual(claimed[-1].pk, edge.pk)
+        self.assertEqual(list(claimed[-1].upstreams), [core.pk])
+
+    def test_failed_dispatch_stops_counting_the_lease(self):
+        class FailingEngine:
+            concurrency = 4
+
+            async def check(self, target):
+                raise RuntimeError('boom')
+
+        leases = LeaseManager('worker-f')
+        target = leases.claim(limit=1)[0]
+        self.assertEqual(REGISTRY.get_sample_value('netops_leases_held', {'worker': 'worker-f'}), 1)
+
+        with self.assertLogs('monitor', 'ERROR'):
+            asyncio.run(LeaseWorker(FailingEngine(), None, leases)._dispatch(target))
+
+        self.assertEqual(REGISTRY.get_sample_value('netops_leases_held', {'worker': 'worker-f'}), 0)
+
+
+class RollupTest(TestCase):
+    def setUp(self):
+        self.target = ServiceTarget.objects.create(name="Svc", url="https://a.com")
+        self.t0 = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+
+    def add_results(self, start, latencies, status='up'):
+        CheckResult.objects.bulk_create([
+            CheckResult(service=self.target, status=status, response_time_ms=ms,
+                        checked_at=start + timedelta(seconds=10 * i))
+            for i, ms in enumerate(latencies)
+        ])
+
+    def test_minute_hour_and_day_levels(self):
+        self.add_results(self.t0, [10, 20, 30])
+        self.add_results(self.t0 + timedelta(minutes=5), [40], status='down')
+
+        build_rollups(now=self.t0 + timedelta(days=2))
+
+        minutes = ResultRollup.objects.filter(granularity='1m')
+        self.assertEqual(minutes.count(), 2)
+        hour = ResultRollup.objects.get(granularity='1h')
+        self.assertEqual(hour.bucket_start, self.t0)
+        self.assertEqual((hour.count, hour.up_count), (4, 3))
+        self.assertEqual((hour.latency_min, hour.latency_max, hour.latency_mean), (10, 40, 25))
+        self.assertAlmostEqual(hour.p50, 20, delta=20 * RELATIVE_ACCURACY)
+        day = ResultRollup.objects.get(granularity='1d')
+        self.assertEqual(day.bucket_start, self.t0.replace(hour=0))
+        self.assertEqual((day.count, day.up_count), (4, 3))
+
+    def test_reruns_only_process_new_rows(self):
+        self.add_results(self.t0, [10, 20])
+        build_rollups(now=self.t0 + timedelta(minutes=10))
+        build_rollups(now=self.t0 + timedelta(minutes=10))
+        self.add_results(self.t0 + timedelta(minutes=20), [30])
+        build_rollups(now=self.t0 + timedelta(minutes=30))
+
+        self.assertEqual(sum(ResultRollup.objects.filter(granularity='1m').values_list('count', flat=True)), 3)
+
+    def test_rows_younger_than_lag_wait(self):
+        self.add_results(self.t0, [10])
+        with self.settings(MONITOR_ROLLUP_LAG=600):
+            build_rollups(now=self.t0 + timedelta(minutes=5))
+        self.assertFalse(ResultRollup.objects.exists())
+
+    def test_journal_replay_behind_the_watermarks_is_rolled_up(self):
+        self.add_results(self.t0, [10, 20])
+        build_rollups()
+        late = self.t0 + timedelta(minutes=30)
+        with tempfile.TemporaryDirectory() as directory:
+            journal = ResultJournal(directory)
+            for storage in ('results', 'intervals'):
+                journal.append(CheckOutcome(target=self.target, status='down', response_time_ms=40.0, checked_at=late))
+                journal.drain(ResultSink(storage=storage).write)  # database back after the outage
+            journal.close()
+        build_rollups()
+
+        minute = ResultRollup.objects.get(granularity='1m', bucket_start=late)
+        self.assertEqual((minute.count, minute.up_count), (2, 0))
+        hour = ResultRollup.objects.get(granularity='1h', bucket_start=self.t0)
+        self.assertEqual((hour.count, hour.up_count, hour.latency_max), (4, 2, 40))
+        total = window_summary(self.t0, timezone.now())
+        self.assertEqual((total.count, total.up_count), (4, 2))
+
+    def test_percentiles_have_bounded_relative_error(self):
+        bucket = Bucket()
+        for ms in range(1, 1001):
+            bucket.add('up', float(ms))
+        for q, exact in ((0.5, 500), (0.95, 950), (0.99, 990)):
+            self.assertAlmostEqual(bucket.quantile(q), exact, delta=exact * RELATIVE_ACCURACY + 1)
+
+    def test_sketch_is_compact_and_mergeable(self):
+        a, b, both = LatencySketch(), LatencySketch(), LatencySketch()
+        for ms in range(1, 2001):
+            (a if ms % 2 else b).add(ms / 10)
+            both.add(ms / 10)
+        a.merge(LatencySketch.from_bytes(b.to_bytes()))
+
+        self.assertEqual(a.bins, both.bins)
+        self.assertEqual(a.quantile(0.99), both.quantile(0.99))
+        self.assertLess(len(both.to_bytes()), 3 * len(both.bins) + 4)
+
+    def test_migrated_histograms_decode_as_sketches(self):
+        encode_histogram = importlib.import_module('monitor.migrations.0014_rollup_latency_sketch').encode_histogram
+        sketch = LatencySketch.from_bytes(encode_histogram({'-40': 2, '0': 1, '7': 5, '300': 1}))
+        self.assertEqual(sketch.bins, {-40: 2, 0: 1, 7: 5, 300: 1})
+        self.assertEqual(sketch.count, 9)
+        self.assertEqual(LatencySketch.from_bytes(encode_histogram({})).count, 0)
+
+    def test_window_summary_merges_rollups_and_recent_rows(self):
+        start = self.t0 - timedelta(days=2)
+        latencies = [float(5 + (i * 37) % 400) for i in range(306)]
+        CheckResult.objects.bulk_create([
+            CheckResult(service=self.target, status='down' if i % 9 == 0 else 'up', response_time_ms=ms,
+                        checked_at=start + timedelta(minutes=10 * i, seconds=7))
+            for i, ms in enumerate(latencies)
+        ])
+        build_rollups(now=self.t0)  # the last ~3 hours stay raw
+        since, until = start + timedelta(minutes=17, seconds=30), self.t0 + timedelta(hours=2, seconds=5)
+
+        with self.assertNumQueries(4):
+            total = window_summary(since, until, [self.target.pk])
+
+        expected = Bucket()
+        for status, ms in CheckResult.objects.filter(checked_at__gte=since, checked_at__lt=until).values_list(
+            'status', 'response_time_ms'
+        ):
+            expected.add(status, ms)
+        self.assertEqual((total.count, total.up_count), (expected.count, expected.up_count))
+        self.assertEqual((total.latency_min, total.latency_max), (expected.latency_min, expected.latency_max))
+        for q in (0.5, 0.95, 0.99):
+            self.assertEqual(total.quantile(q), expected.quantile(q))
+        self.assertTrue(ResultRollup.objects.filter(granularity='1d').exists())
+
+    def test_latency_api(self):
+        user = User.objects.create_user(username='u', password='p', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user)
+        self.add_results(self.t0, [10, 20, 30, 40])
+
+        resp = client.get('/api/v1/latency/', {
+            'service': self.target.pk, 'since': (self.t0 - timedelta(hours=1)).isoformat(), 'q': ['0.5', '1'],
+        })
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['count'], 4)
+        self.assertAlmostEqual(data['quantiles']['0.5'], 20, delta=20 * RELATIVE_ACCURACY)
+        self.assertEqual(data['quantiles']['1'], 40)
+
+        self.assertEqual(client.get('/api/v1/latency/', {'q': '2'}).status_code, 400)
+
+    def test_rollup_api(self):
+        user = User.objects.create_user(username='u', password='p', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user)
+        self.add_results(self.t0, [10, 30])
+        self.add_results(self.t0 + timedelta(minutes=5), [50])
+        build_rollups(now=self.t0 + timedelta(hours=2))
+
+        resp = client.get(
+            f'/api/v1/services/{self.target.pk}/rollups/',
+            {'granularity': '1h', 'since': (self.t0 - timedelta(hours=1)).isoformat()},
+        )
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(len(data['buckets']), 1)
+        self.assertEqual(data['summary']['count'], 3)
+        self.assertEqual(data['summary']['uptime'], 1.0)
+        self.assertEqual(data['summary']['latency_mean'], 30)
+        self.assertFalse(data['truncated'])
+
+        with patch.object(RollupView, 'MAX_BUCKETS', 1):
+            data = client.get(f'/api/v1/services/{self.target.pk}/rollups/', {
+                'granularity': '1m', 'since': self.t0.isoformat(), 'until': (self.t0 + timedelta(hours=1)).isoformat(),
+            }).json()
+        self.assertEqual(len(data['buckets']), 1)
+        self.assertTrue(data['truncated'])
+        self.assertEqual(data['next_since'], (self.t0 + timedelta(minutes=5)).isoformat().replace('+00:00', 'Z'))
+        self.assertEqual((data['summary']['count'], data['summary']['latency_max']), (3, 50))
+
+        resp = client.get(f'/api/v1/services/{self.target.pk}/rollups/', {'granularity': '5m'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class StatusIntervalTest(TestCase):
+    # (status, status_code, latency, error): runs up/200 x3, down/500, down/timeout x2, up/200
+    CHECKS = [
+        ('up', 200, 10.0, ''), ('up', 200, 20.0, ''), ('up', 200, 30.0, ''),
+        ('down', 500, 5.0, 'HTTP 500'), ('down', None, None, 'Timeout'), ('down', None, None, 'Timeout'),
+        ('up', 200, 40.0, ''),
+    ]
+
+    def setUp(self):
+        self.t0 = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        self.user = User.objects.create_user(username='u', password='p', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def record(self, target, storage, flush_every=3):
+        sink = ResultSink(batch_size=100, flush_interval=60, storage=storage)
+        for i, (status, code, latency, error) in enumerate(self.CHECKS):
+            sink.add(CheckOutcome(
+                target=target, status=status, response_time_ms=latency, status_code=code, error=error,
+                checked_at=self.t0 + timedelta(seconds=20 * i),
+            ))
+            if i % flush_every == flush_every - 1:
+                sink.flush()
+        sink.flush()
+
+    def test_interval_mode_writes_one_row_per_run(self):
+        target = ServiceTarget.objects.create(name="Svc", url="https://a.com")
+        self.record(target, 'intervals')
+
+        runs = list(target.intervals.order_by('started_at'))
+        self.assertEqual([(r.status, r.status_code, r.count) for r in runs], [
+            ('up', 200, 3), ('down', 500, 1), ('down', None, 2), ('up', 200, 1),
+        ])
+        self.assertEqual([r.is_open for r in runs], [False, False, False, True])
+        self.assertEqual(runs[0].latency_mean, 20)
+        self.assertEqual(runs[0].ended_at, self.t0 + timedelta(seconds=40))
+        self.assertFalse(CheckResult.objects.exists())
+        self.assertEqual(target.latest.status, 'up')
+        self.assertEqual(sum(r.count for r in ResultRollup.objects.filter(granularity='1m')), 7)
+
+    def test_answers_match_results_mode(self):
+        raw = ServiceTarget.objects.create(name="Raw", url="https://a.com")
+        compact = ServiceTarget.objects.create(name="Compact", url="https://b.com")
+        self.record(raw, 'results')
+        self.record(compact, 'intervals', flush_every=2)
+        build_rollups(now=self.t0 + timedelta(hours=2))
+
+        fields = ['count', 'up_count', 'latency_count', 'latency_min', 'latency_max', 'latency_sum', 'p50', 'p99']
+        for granularity in ('1m', '1h'):
+            self.assertEqual(
+                list(raw.rollups.filter(granularity=granularity).order_by('bucket_start').values(*fields)),
+                list(compact.rollups.filter(granularity=granularity).order_by('bucket_start').values(*fields)),
+            )
+
+        answers = []
+        for target, mode in ((raw, 'results'), (compact, 'intervals')):
+            with self.settings(MONITOR_STORAGE_MODE=mode):
+                resp = self.client.get(
+                    f'/api/v1/services/{target.pk}/intervals/', {'since': self.t0.isoformat(), 'limit': 3},
+                )
+            self.assertEqual(resp.status_code, 200)
+            data = resp.json()
+            answers.append((data['truncated'], data['intervals']))
+        self.assertEqual(answers[0], answers[1])
+        self.assertTrue(answers[0][0])
+        self.assertEqual([i['count'] for i in answers[0][1]], [1, 2, 1])
+        self.assertEqual(answers[0][1][1]['error_message'], 'Timeout')
+
+    def test_history_and_export_are_served_from_intervals(self):
+        target = ServiceTarget.objects.create(name="Svc", url="https://a.com")
+        self.record(target, 'intervals')
+
+        with self.settings(MONITOR_STORAGE_MODE='intervals'):
+            history = self.client.get(f'/api/v1/services/{target.pk}/results/', {'status': 'down'}).json()
+            export = self.client.get('/api/v1/results/export/')
+            exported = [json.loads(line) for line in b''.join(export.streaming_content).splitlines()]
+
+        self.assertEqual([(r['status_code'], r['count']) for r in history['results']], [(None, 2), (500, 1)])
+        self.assertEqual(history['results'][1]['response_time_ms'], 5.0)
+        self.assertIsNone(history['results'][1]['ttfb_ms'])
+        self.assertEqual([(r['status'], r['count']) for r in exported], [
+            ('up', 3), ('down', 1), ('down', 2), ('up', 1),
+        ])
+        self.assertEqual(exported[0]['response_time_ms'], 20.0)
+        self.assertEqual(exported[0]['started_at'], self.t0.isoformat())
+        self.assertEqual(exported[0]['checked_at'], (self.t0 + timedelta(seconds=40)).isoformat())
+
+    def test_retention_keeps_open_intervals(self):
+        target = ServiceTarget.objects.create(name="Svc", url="https://a.com")
+        self.record(target, 'intervals')
+
+        with self.settings(MONITOR_RETENTION_DAYS=1):
+            stats = prune_results(now=self.t0 + timedelta(days=2), pause=0)
+
+        self.assertEqual(stats['intervals_deleted'], 3)
+        self.assertEqual(list(target.intervals.values_list('is_open', flat=True)), [True])
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.default = ServiceTarget.objects.create(name="Default", url="https://a.com")
+        self.keep_long = ServiceTarget.objects.create(name="Long", url="https://b.com", retention_days=365)
+
+    def add_result(self, target, days_ago):
+        return CheckResult.objects.create(
+            service=target, status='up', response_time_ms=1, checked_at=self.now - timedelta(days=days_ago)
+        )
+
+    def test_prunes_by_global_and_per_target_retention(self):
+        for days_ago in (1, 100, 400):
+            self.add_result(self.default, days_ago)
+            self.add_result(self.keep_long, days_ago)
+
+        with self.settings(MONITOR_RETENTION_DAYS=90):
+            stats = prune_results(now=self.now, pause=0)
+
+        self.assertEqual(stats['rows_deleted'], 3)
+        self.assertEqual(self.default.results.count(), 1)
+        self.assertEqual(self.keep_long.results.count(), 2)
+
+    def test_deletes_in_bounded_chunks(self):
+        for _ in range(7):
+            self.add_result(self.default, 200)
+
+        with self.settings(MONITOR_RETENTION_DAYS=90), CaptureQueriesContext(connection) as ctx:
+            stats = prune_results(now=self.now, chunk_size=3, pause=0)
+
+        deletes = [q for q in ctx.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(stats['rows_deleted'], 7)
+        self.assertEqual(len(deletes), 3)
+
+    def test_dry_run_deletes_nothing(self):
+        self.add_result(self.default, 200)
+        with self.settings(MONITOR_RETENTION_DAYS=90):
+            stats = prune_results(now=self.now, dry_run=True)
+        self.assertEqual(stats['rows_deleted'], 1)
+        self.assertEqual(CheckResult.objects.count(), 1)
+
+    def test_partition_naming(self):
+        start = datetime(2026, 12, 1, tzinfo=dt_timezone.utc)
+        name = partitions.partition_name(start)
+
+        self.assertEqual(name, 'monitor_checkresult_p202612')
+        self.assertEqual(partitions.partition_bounds(name), (start, datetime(2027, 1, 1, tzinfo=dt_timezone.utc)))
+        self.assertIsNone(partitions.partition_bounds('monitor_checkresult_legacy'))
+        self.assertFalse(partitions.is_partitioned())
+
 
 class HealthViewTest(TestCase):
     def test_health_endpoint(self):
@@ -144,9 +1151,77 @@ class HealthViewTest(TestCase):
         self.assertEqual(resp.status_code, 200)
 
 
+class FleetCollectorTest(TestCase):
+    def setUp(self):
+        self.targets = [
+            ServiceTarget.objects.create(name=f"Svc{i}", url=f"https://{i}.example.com") for i in range(4)
+        ]
+        sink = ResultSink(batch_size=100, flush_interval=60)
+        for target, status in zip(self.targets[:3], ['up', 'down', 'up']):
+            sink.add(CheckOutcome(target=target, status=status, response_time_ms=250.0, status_code=200))
+        sink.flush()
+        self.now = timezone.now() + timedelta(seconds=30)
+
+    def collect(self, limit):
+        families = FleetCollector(target_limit=limit, clock=lambda: self.now).collect()
+        return {f.name: {s.labels.get('service_name'): s.value for s in f.samples} for f in families}
+
+    def test_fleet_and_target_gauges(self):
+        metrics = self.collect(limit=100)
+
+        self.assertEqual(metrics['netops_services_up'][None], 2)
+        self.assertEqual(metrics['netops_services_down'][None], 1)
+        self.assertEqual(metrics['netops_services_unknown'][None], 1)
+        self.assertEqual(metrics['netops_target_up'], {'Svc0': 1, 'Svc1': 0, 'Svc2': 1})
+        self.assertEqual(metrics['netops_target_response_time_seconds']['Svc0'], 0.25)
+        self.assertAlmostEqual(metrics['netops_target_last_check_age_seconds']['Svc1'], 30, delta=5)
+        self.assertEqual(metrics['netops_target_series_omitted'][None], 0)
+
+    def test_target_series_are_capped_down_first(self):
+        with self.assertNumQueries(2):
+            metrics = self.collect(limit=1)
+
+        self.assertEqual(metrics['netops_target_up'], {'Svc1': 0})
+        self.assertEqual(metrics['netops_target_series_omitted'][None], 2)
+        self.assertEqual(metrics['netops_services_up'][None], 2)
+
+    def test_metrics_endpoint_includes_fleet_gauges(self):
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        body = resp.content.decode()
+        self.assertIn('netops_services_down 1.0', body)
+        self.assertIn('netops_target_up{service_id="%d",service_name="Svc1"} 0.0' % self.targets[1].pk, body)
+        self.assertIn('netops_service_checks_total', body)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_gunicorn_workers_write_multiprocess_metrics(self):
+        # A fresh interpreter: loads the config like the gunicorn master, then forks a worker.
+        script = '''
+import os, runpy
+conf = runpy.run_path('gunicorn.conf.py')
+conf['on_starting'](None)
+pid = os.fork()
+if pid == 0:
+    from prometheus_client import Counter
+    Counter('netops_fork_test_total', 'test').inc(3)
+    os._exit(0)
+os.waitpid(pid, 0)
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+registry = CollectorRegistry()
+multiprocess.MultiProcessCollector(registry)
+print(generate_latest(registry).decode())
+'''
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, 'TMPDIR': tmp}
+            env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+            out = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+        self.assertIn('netops_fork_test_total 3.0', out)
+
+
 class DashboardAPIViewTest(TestCase):
     def setUp(self):
-        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.user = User.objects.create_user(username='testuser', password='testpass', is_staff=True)
         self.client = APIClient()
         self.token = Token.objects.create(user=self.user)
         self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
@@ -174,10 +1249,475 @@ class DashboardAPIViewTest(TestCase):
         self.assertEqual(data['summary']['down'], 1)
         self.assertEqual(len(data['services']), 2)
 
+    def test_dashboard_includes_last_result(self):
+        target = ServiceTarget.objects.create(name="Svc1", url="https://a.com")
+        sink = ResultSink()
+        sink.add(CheckOutcome(target=target, status='up', response_time_ms=42.0, status_code=200))
+        sink.flush()
+
+        data = self.client.get('/api/v1/dashboard/').json()
+        self.assertEqual(data['services'][0]['last_result']['status_code'], 200)
+        self.assertEqual(data['services'][0]['last_result']['response_time_ms'], 42.0)
+
+    def test_dashboard_lists_open_circuits(self):
+        HostCircuit.objects.create(host='dead.example.com:443', state='open', consecutive_failures=5)
+        HostCircuit.objects.create(host='fine.example.com:443', state='closed')
+
+        data = self.client.get('/api/v1/dashboard/').json()
+        self.assertEqual([c['host'] for c in data['circuits']], ['dead.example.com:443'])
+
+    def test_dashboard_query_count_does_not_grow_with_fleet(self):
+        def queries_for(n):
+            ServiceTarget.objects.all().delete()
+            targets = [ServiceTarget.objects.create(name=f"S{i}", url="https://a.com") for i in range(n)]
+            sink = ResultSink()
+            for t in targets:
+                sink.add(CheckOutcome(target=t, status='up', response_time_ms=1.0))
+            sink.flush()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/api/v1/dashboard/')
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries_for(2), queries_for(20))
+
+    def test_conditional_get_and_cache(self):
+        target = ServiceTarget.objects.create(name="Svc1", url="https://a.com")
+        first = self.client.get('/api/v1/dashboard/')
+        etag = first['ETag']
+        self.assertTrue(first.has_header('Last-Modified'))
 
-class RunChecksViewTest(TestCase):
+        with self.assertNumQueries(2):  # token + fleet version
+            resp = self.client.get('/api/v1/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        with self.assertNumQueries(2):  # cached body: no dashboard queries, no serializer
+            resp = self.client.get('/api/v1/dashboard/')
+        self.assertEqual(resp.content, first.content)
+
+        sink = ResultSink()
+        sink.add(CheckOutcome(target=target, status='down', response_time_ms=1.0))
+        sink.flush()
+        resp = self.client.get('/api/v1/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['summary']['down'], 1)
+
+        etag = resp['ETag']
+        target.is_active = False
+        target.save()
+        resp = self.client.get('/api/v1/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.json()['services'][0]['is_active'])
+
+
+class CustomerTenancyTest(TestCase):
     def setUp(self):
-        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.acme = Customer.objects.create(name="Acme")
+        self.globex = Customer.objects.create(name="Globex", check_budget=1)
+        self.mine = ServiceTarget.objects.create(name="Acme API", url="https://acme.com", customer=self.acme)
+        self.theirs = ServiceTarget.objects.create(name="Globex API", url="https://globex.com", customer=self.globex)
+        ServiceTarget.objects.create(name="Globex Web", url="https://www.globex.com", customer=self.globex)
+        sink = ResultSink()
+        sink.add(CheckOutcome(target=self.mine, status='up', response_time_ms=10.0))
+        sink.add(CheckOutcome(target=self.theirs, status='down', response_time_ms=None, error='Timeout'))
+        sink.flush()
+        self.user = User.objects.create_user(username='acme', password='p')
+        self.acme.users.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_dashboard_is_scoped_with_per_customer_summaries(self):
+        data = self.client.get('/api/v1/dashboard/').json()
+        self.assertEqual([s['name'] for s in data['services']], ["Acme API"])
+        self.assertEqual(data['summary'], {'total': 1, 'up': 1, 'down': 0, 'unreachable': 0})
+        self.assertEqual([c['name'] for c in data['customers']], ["Acme"])
+
+        operator = APIClient()
+        operator.force_authenticate(User.objects.create_user(username='ops', password='p', is_staff=True))
+        data = operator.get('/api/v1/dashboard/').json()
+        self.assertEqual(data['summary'], {'total': 3, 'up': 1, 'down': 1, 'unreachable': 0})
+        self.assertEqual(data['customers'][1], {
+            'id': self.globex.pk, 'name': "Globex", 'total': 2, 'up': 0, 'down': 1, 'unreachable': 0,
+        })
+
+    def test_cached_dashboards_are_kept_apart_per_tenant(self):
+        mine = self.client.get('/api/v1/dashboard/')
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='globex', password='p'))
+        self.globex.users.add(User.objects.get(username='globex'))
+
+        resp = other.get('/api/v1/dashboard/', HTTP_IF_NONE_MATCH=mine['ETag'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], mine['ETag'])
+        self.assertEqual([s['name'] for s in resp.json()['services']], ["Globex API", "Globex Web"])
+
+    def test_other_customers_data_is_hidden(self):
+        self.assertEqual(self.client.get(f'/api/v1/services/{self.theirs.pk}/results/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/v1/services/{self.mine.pk}/results/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/v1/latency/?service={self.theirs.pk}').status_code, 404)
+        self.assertEqual(self.client.post('/api/v1/check/').status_code, 403)
+        self.assertEqual(self.client.post('/api/v1/services/bulk/', '', content_type='text/csv').status_code, 403)
+        self.assertEqual(CheckResult.objects.for_user(self.user).count(), 1)
+
+        broadcaster = FleetBroadcaster(start_thread=False)
+        snapshot, _ = broadcaster.subscribe(customer_ids=[self.acme.pk])
+        self.assertEqual([s['name'] for s in snapshot['services']], ["Acme API"])
+
+    def test_users_without_customers_see_nothing(self):
+        self.acme.users.remove(self.user)
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+
+        data = self.client.get('/api/v1/dashboard/').json()
+        self.assertEqual((data['services'], data['customers']), ([], []))
+        self.assertEqual(data['summary'], {'total': 0, 'up': 0, 'down': 0, 'unreachable': 0})
+        self.assertEqual(self.client.get('/api/v1/latency/').json()['count'], 0)
+        self.assertEqual(self.client.post('/api/v1/check/').status_code, 403)
+
+    def test_customer_budget_caps_concurrent_checks(self):
+        target = ServiceTarget.objects.with_budgets().get(pk=self.theirs.pk)
+        budgets = CustomerBudgets(concurrency=10)
+        running = peak = 0
+
+        async def check():
+            nonlocal running, peak
+            async with budgets.slot(target):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        async def main():
+            await asyncio.gather(*(check() for _ in range(4)))
+
+        asyncio.run(main())
+        self.assertEqual(peak, 1)
+        self.assertEqual(budgets.default, 5)
+
+
+class ResultHistoryViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='u', password='p', is_staff=True))
+        self.target = ServiceTarget.objects.create(name="API", url="https://a.com")
+        self.url = f'/api/v1/services/{self.target.pk}/results/'
+        self.t0 = timezone.now().replace(microsecond=0)
+        CheckResult.objects.bulk_create([
+            CheckResult(
+                service=self.target, status='down' if i % 3 == 0 else 'up',
+                response_time_ms=i, checked_at=self.t0 - timedelta(minutes=i),
+            )
+            for i in range(10)
+        ])
+
+    def test_pages_newest_first_without_count(self):
+        seen = []
+        url = self.url + '?limit=4'
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                data = self.client.get(url).json()
+                seen += [r['response_time_ms'] for r in data['results']]
+                url = data['next']
+
+        self.assertEqual(seen, list(range(10)))
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+        self.assertFalse(any('OFFSET' in q['sql'].upper() for q in ctx.captured_queries))
+
+    def test_filters(self):
+        resp = self.client.get(self.url, {
+            'since': (self.t0 - timedelta(minutes=6)).isoformat(),
+            'until': (self.t0 - timedelta(minutes=1)).isoformat(),
+            'status': 'down',
+        })
+        self.assertEqual([r['response_time_ms'] for r in resp.json()['results']], [3, 6])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get(self.url, {'status': 'sideways'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/services/999/results/').status_code, 404)
+
+
+class ResultExportTest(TestCase):
+    url = '/api/v1/results/export/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='u', password='p', is_staff=True))
+        self.a = ServiceTarget.objects.create(name="A", url="https://a.com")
+        self.b = ServiceTarget.objects.create(name="B", url="https://b.com")
+        self.t0 = timezone.now().replace(microsecond=0)
+        for i, target in enumerate([self.a, self.b, self.a]):
+            CheckResult.objects.create(
+                service=target, status='up', response_time_ms=i, status_code=200,
+                checked_at=self.t0 + timedelta(minutes=i),
+            )
+
+    def body(self, resp):
+        return b''.join(resp.streaming_content)
+
+    def test_ndjson_stream(self):
+        resp = self.client.get(self.url)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.body(resp).splitlines()]
+        self.assertEqual([r['response_time_ms'] for r in rows], [0, 1, 2])
+        self.assertEqual(rows[1]['service'], 'B')
+        self.assertEqual(rows[0]['checked_at'], self.t0.isoformat())
+
+    def test_csv_gzip_with_filters(self):
+        resp = self.client.get(self.url, {
+            'fmt': 'csv', 'gzip': '1', 'service': self.a.pk,
+            'since': (self.t0 + timedelta(seconds=30)).isoformat(),
+        })
+        self.assertEqual(resp['Content-Type'], 'application/gzip')
+        self.assertIn('check-results.csv.gz', resp['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(self.body(resp)).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['service'], 'A')
+        self.assertEqual(rows[0]['response_time_ms'], '2.0')
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get(self.url, {'fmt': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'service': 'x'}).status_code, 400)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.ndjson.gz')
+            call_command('export_results', '--gzip', '--service', str(self.b.pk), '-o', path)
+            with gzip.open(path, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual([r['service'] for r in rows], ['B'])
+
+
+class TargetSyncTest(TestCase):
+    url = '/api/v1/services/bulk/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='u', password='p', is_staff=True))
+        self.acme = Customer.objects.create(name="Acme")
+        self.manual = ServiceTarget.objects.create(name="Manual", url="https://manual.com")
+
+    def sync_csv(self, rows, *args):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'targets.csv')
+            with open(path, 'w', newline='') as f:
+                f.write('external_id,name,url,customer,check_interval,head_first\n')
+                f.writelines(f'{row}\n' for row in rows)
+            out = io.StringIO()
+            with CaptureQueriesContext(connection) as ctx:
+                call_command('sync_targets', path, '--batch-size', '100', *args, stdout=out)
+        return json.loads(out.getvalue()), len(ctx.captured_queries)
+
+    def test_command_diffs_and_applies_in_batches(self):
+        rows = [f'cmdb-{i},Host {i},https://h{i}.example.com,Acme,30,yes' for i in range(500)]
+        summary, queries = self.sync_csv(rows)
+        self.assertEqual(summary, {'created': 500, 'updated': 0, 'deactivated': 0, 'unchanged': 0})
+        self.assertLess(queries, 20)
+        target = ServiceTarget.objects.get(external_id='cmdb-7')
+        self.assertEqual((target.customer, target.check_interval, target.head_first), (self.acme, 30, True))
+
+        rows = rows[:400]
+        rows[0] = 'cmdb-0,Renamed,https://h0.example.com,,60,'
+        summary, queries = self.sync_csv(rows)
+        self.assertEqual(summary, {'created': 0, 'updated': 1, 'deactivated': 100, 'unchanged': 399})
+        self.assertLess(queries, 20)
+        target = ServiceTarget.objects.get(external_id='cmdb-0')
+        self.assertEqual((target.name, target.customer, target.check_interval), ("Renamed", None, 60))
+        self.assertFalse(ServiceTarget.objects.get(external_id='cmdb-450').is_active)
+        self.assertTrue(ServiceTarget.objects.get(pk=self.manual.pk).is_active)
+
+        summary, _ = self.sync_csv(['cmdb-450,Host 450,https://h450.example.com,Acme,30,yes'], '--partial')
+        self.assertEqual(summary, {'created': 0, 'updated': 1, 'deactivated': 0, 'unchanged': 0})
+        self.assertTrue(ServiceTarget.objects.get(external_id='cmdb-450').is_active)
+
+    def test_rows_are_validated_against_the_stored_target(self):
+        ServiceTarget.objects.create(
+            name="Shop", url="https://shop.example.com", external_id='shop', body_pattern='price (USD',
+        )
+        body = json.dumps({'external_id': 'shop', 'name': "Shop", 'url': 'https://shop.example.com',
+                           'body_pattern_is_regex': True})
+
+        resp = self.client.post(self.url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("body_pattern: Invalid regular expression", resp.json()['errors'][0])
+        self.assertFalse(ServiceTarget.objects.get(external_id='shop').body_pattern_is_regex)
+
+    def test_empty_full_sync_needs_confirmation(self):
+        ServiceTarget.objects.create(name="Shop", url="https://shop.example.com", external_id='shop')
+
+        resp = self.client.post(self.url, '', content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("no rows", resp.json()['errors'][0])
+        self.assertTrue(ServiceTarget.objects.get(external_id='shop').is_active)
+        self.assertEqual(self.client.post(f'{self.url}?partial=1', '', content_type='text/csv').status_code, 200)
+
+        resp = self.client.post(f'{self.url}?allow_empty=1', '', content_type='application/x-ndjson')
+        self.assertEqual(resp.json()['deactivated'], 1)
+        self.assertFalse(ServiceTarget.objects.get(external_id='shop').is_active)
+
+    def test_api_rejects_invalid_documents_without_writing(self):
+        body = '\n'.join([
+            json.dumps({'external_id': 'a', 'name': "A", 'url': 'https://a.com', 'timeout': 5}),
+            json.dumps({'external_id': 'b', 'name': "B", 'url': 'not a url'}),
+            json.dumps({'external_id': 'a', 'name': "A again", 'url': 'https://a.com'}),
+            json.dumps({'external_id': 'c', 'name': "C", 'url': 'https://c.com', 'customer': "Nobody"}),
+        ])
+        resp = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual([e.split(':')[0] for e in resp.json()['errors']], ['line 2', 'line 3', 'line 4'])
+        self.assertFalse(ServiceTarget.objects.filter(external_id__isnull=False).exists())
+
+        body = json.dumps({'external_id': 'a', 'name': "A", 'url': 'https://a.com', 'customer': "Acme"})
+        resp = self.client.post(f'{self.url}?dry_run=1', body, content_type='application/x-ndjson')
+        self.assertEqual(resp.json()['created'], 1)
+        self.assertFalse(ServiceTarget.objects.filter(external_id='a').exists())
+        resp = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(resp.json()['created'], 1)
+        self.assertEqual(ServiceTarget.objects.get(external_id='a').customer, self.acme)
+
+        tenant = User.objects.create_user(username='acme', password='p')
+        self.acme.users.add(tenant)
+        self.client.force_authenticate(tenant)
+        self.assertEqual(self.client.post(self.url, body, content_type='application/x-ndjson').status_code, 403)
+
+
+class FleetStreamTest(TestCase):
+    def setUp(self):
+        self.a = ServiceTarget.objects.create(name="A", url="https://a.com")
+        self.b = ServiceTarget.objects.create(name="B", url="https://b.com")
+        self.broadcaster = FleetBroadcaster(start_thread=False)
+
+    def write(self, target, status):
+        sink = ResultSink()
+        sink.add(CheckOutcome(target=target, status=status, response_time_ms=5.0))
+        sink.flush()
+
+    def test_flush_stamps_latest_with_new_version(self):
+        before = FleetState.current()
+        self.write(self.a, 'up')
+        self.write(self.b, 'up')
+        self.assertEqual(FleetState.current(), before + 2)
+        self.assertEqual(LatestResult.objects.get(service=self.b).version, before + 2)
+
+    def test_publishes_transitions_and_results(self):
+        snapshot, subscription = self.broadcaster.subscribe()
+        self.assertEqual([s['status'] for s in snapshot['services']], ['unknown', 'unknown'])
+
+        self.write(self.a, 'down')
+        self.assertEqual(self.broadcaster.poll(), 2)
+        status_event = subscription.get_nowait()
+        self.assertEqual(status_event[0], 'status')
+        self.assertEqual(status_event[2]['previous'], 'unknown')
+        self.assertEqual(subscription.get_nowait()[0], 'result')
+
+        self.write(self.a, 'down')
+        self.assertEqual(self.broadcaster.poll(), 1)  # no transition, only the new result
+        self.assertEqual(self.broadcaster.poll(), 0)
+        self.assertEqual(self.broadcaster.snapshot()['summary'], {'total': 2, 'up': 0, 'down': 1, 'unreachable': 0})
+
+    def test_overflowing_subscriber_is_resynced(self):
+        broadcaster = FleetBroadcaster(queue_size=1, start_thread=False)
+        _, subscription = broadcaster.subscribe()
+        self.write(self.a, 'up')
+        broadcaster.poll()
+        self.assertIs(subscription.get_nowait(), RESYNC)
+
+    def test_target_edits_resync_streams(self):
+        acme = Customer.objects.create(name="Acme")
+        _, subscription = self.broadcaster.subscribe(customer_ids={acme.pk})
+        self.b.delete()
+        self.a.customer = acme
+        self.a.save()
+
+        self.assertEqual(self.broadcaster.poll(), 0)
+        self.assertIs(subscription.get_nowait(), RESYNC)
+        snapshot = self.broadcaster.snapshot(customer_ids={acme.pk})
+        self.assertEqual([s['name'] for s in snapshot['services']], ["A"])
+        self.assertEqual(self.broadcaster.snapshot()['summary']['total'], 1)
+
+        FleetState.bump()  # e.g. a circuit change: nothing to resync
+        self.broadcaster.poll()
+        self.assertTrue(subscription.empty())
+
+    def test_sse_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='u', password='p', is_staff=True))
+        with patch('monitor.stream.broadcaster', self.broadcaster):
+            resp = client.get('/api/v1/stream/', HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(resp['Content-Type'], 'text/event-stream')
+            body = iter(resp.streaming_content)
+            self.assertIn(b'event: snapshot', next(body))
+
+            self.write(self.b, 'up')
+            self.broadcaster.poll()
+            chunk = next(body).decode()
+            self.assertIn('event: status', chunk)
+            self.assertIn(f'id: {FleetState.current()}', chunk)
+            resp.close()
+            self.assertEqual(len(self.broadcaster._subscribers), 0)
+
+            since = FleetState.current()
+            self.write(self.a, 'up')
+            self.broadcaster.poll()
+            resp = client.get('/api/v1/stream/', HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID=str(since))
+            data = json.loads(next(iter(resp.streaming_content)).decode().split('data: ')[1])
+            resp.close()
+        self.assertEqual([s['name'] for s in data['services']], ['A'])
+
+    def test_streams_are_capped_per_process(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='u', password='p', is_staff=True))
+        broadcaster = FleetBroadcaster(start_thread=False, max_clients=1)
+        with patch('monitor.stream.broadcaster', broadcaster):
+            first = client.get('/api/v1/stream/', HTTP_ACCEPT='text/event-stream')
+            second = client.get('/api/v1/stream/', HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(second.status_code, 503)
+            self.assertEqual(second['Retry-After'], '30')
+            first.close()  # never iterated: the slot is still released
+            third = client.get('/api/v1/stream/', HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(third.status_code, 200)
+            third.close()
+
+    def test_stream_requires_authentication(self):
+        resp = APIClient().get('/api/v1/stream/', HTTP_ACCEPT='text/event-stream')
+        self.assertIn(resp.status_code, [401, 403])
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_writes_json_report_and_cleans_up(self):
+        # Named like a seeded target, but not in the benchmark namespace.
+        own = ServiceTarget.objects.create(name='bench-api', url='http://127.0.0.1:1/')
+        CheckResult.objects.create(service=own, status='up', response_time_ms=5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.json')
+            call_command(
+                'benchmark', '--targets', '6', '--results', '40', '--requests', '3', '--hosts', '2',
+                '--latency', '1', '--jitter', '0', '--error-rate', '0.5', '-o', path, stderr=io.StringIO(),
+            )
+            with open(path) as f:
+                report = json.load(f)
+
+        self.assertEqual(report['seed']['results'], 40)
+        [check_pass] = report['check_passes']
+        self.assertEqual(check_pass['checked'], 6)
+        self.assertGreater(check_pass['down'], 0)
+        self.assertEqual(report['dashboard']['cached']['count'], 3)
+        self.assertLessEqual(report['dashboard']['cached']['p50_ms'], report['dashboard']['cached']['max_ms'])
+        self.assertEqual(list(ServiceTarget.objects.all()), [own])
+        self.assertEqual(CheckResult.objects.count(), 1)
+
+    def test_keep_leaves_the_seeded_targets(self):
+        args = ['benchmark', '--targets', '3', '--results', '0', '--requests', '1', '--hosts', '1',
+                '--latency', '1', '--jitter', '0', '--keep', '-o', os.devnull]
+        call_command(*args, stderr=io.StringIO())
+        kept = set(ServiceTarget.objects.values_list('external_id', flat=True))
+        self.assertEqual(kept, {'benchmark:0000000', 'benchmark:0000001', 'benchmark:0000002'})
+        call_command(*args, stderr=io.StringIO())
+        self.assertEqual(ServiceTarget.objects.count(), 3)
+
+
+class RunChecksViewTest(StubServerMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass', is_staff=True)
         self.client = APIClient()
         self.token = Token.objects.create(user=self.user)
         self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
@@ -187,16 +1727,60 @@ class RunChecksViewTest(TestCase):
         resp = client.post('/api/v1/check/')
         self.assertIn(resp.status_code, [401, 403])
 
-    @patch('monitor.services.requests.get')
-    def test_run_checks(self, mock_get):
-        mock_resp = MagicMock()
-        mock_resp.status_code = 200
-        mock_get.return_value = mock_resp
+    def post_and_run(self):
+        with patch('monitor.jobs._executor.submit', side_effect=lambda fn, job_id: run_check_job(job_id)):
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post('/api/v1/check/')
+
+    def test_run_checks(self):
+        ServiceTarget.objects.create(name="Test", url=f"{self.base_url}/status/200")
 
-        ServiceTarget.objects.create(name="Test", url="https://example.com")
+        resp = self.post_and_run()
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()['job_id']
 
-        resp = self.client.post('/api/v1/check/')
+        resp = self.client.get(f'/api/v1/check/{job_id}/')
         self.assertEqual(resp.status_code, 200)
         data = resp.json()
-        self.assertEqual(data['checked'], 1)
+        self.assertEqual(data['state'], 'done')
+        self.assertEqual(data['completed'], 1)
         self.assertEqual(len(data['results']), 1)
+        self.assertEqual(data['results'][0]['service'], "Test")
+
+    def test_post_returns_before_checks_run(self):
+        ServiceTarget.objects.create(name="Test", url=f"{self.base_url}/status/200")
+
+        with patch('monitor.jobs._executor.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post('/api/v1/check/')
+
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()['state'], 'queued')
+        submit.assert_called_once()
+        self.assertEqual(CheckResult.objects.count(), 0)
+
+    def test_concurrent_triggers_are_coalesced(self):
+        with patch('monitor.jobs._executor.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.client.post('/api/v1/check/').json()
+                second = self.client.post('/api/v1/check/').json()
+
+        self.assertEqual(first['job_id'], second['job_id'])
+        self.assertTrue(second['coalesced'])
+        self.assertEqual(submit.call_count, 1)
+        self.assertEqual(CheckJob.objects.count(), 1)
+
+    def test_stale_job_does_not_block_new_runs(self):
+        stale = CheckJob.objects.create(state=CheckJob.State.RUNNING)
+        CheckJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with patch('monitor.jobs._executor.submit'):
+            resp = self.client.post('/api/v1/check/')
+
+        self.assertNotEqual(resp.json()['job_id'], str(stale.pk))
+        stale.refresh_from_db()
+        self.assertEqual(stale.state, 'failed')
+
+    def test_unknown_job_returns_404(self):
+        resp = self.client.get('/api/v1/check/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(resp.status_code, 404)
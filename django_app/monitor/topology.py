@@ -0,0 +1,205 @@
+"""
+Upstream dependencies between targets (ServiceTarget.depends_on).
+
+When a core router or a shared load balancer goes down, every target behind
+it would otherwise time out on its own and write its own DOWN row. Instead, a
+target whose upstreams are all down or unreachable is not probed. The engine
+returns an 'unreachable' outcome for it, and ResultSink records that on the
+target and its LatestResult without writing a CheckResult row.
+
+attach_upstreams() annotates targets loaded for checking, using one query
+(DependencyGraph.load(); lease workers keep the graph between claims):
+  - target.upstreams: its active upstreams with their status at load time.
+  - target.depth: 0 for targets without upstreams.
+  - target.component: the smallest id in its dependency tree, so that
+    run_checks --processes keeps each tree in one worker.
+
+The scheduler dispatches due targets shallowest first. Each CheckEngine keeps
+a Topology in memory: a check waits for its upstreams' in-flight checks, and
+the newest status of every target the engine has seen is remembered. A parent
+found down therefore suppresses its children within the same pass.
+
+Cycles are rejected when dependencies are saved (check_dependencies()). Any
+cycle that reaches the database anyway is broken when the graph is loaded.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import NamedTuple
+
+from django.core.exceptions import ValidationError
+
+from .models import ServiceTarget
+
+logger = logging.getLogger('monitor')
+
+# Upstream statuses that suppress the checks of their dependents.
+BLOCKING = {ServiceTarget.Status.DOWN, ServiceTarget.Status.UNREACHABLE}
+
+
+class Upstream(NamedTuple):
+    name: str
+    status: str
+    updated_at: datetime
+
+
+def _edges():
+    """(target id, upstream id) pairs in the order they were added."""
+    return ServiceTarget.depends_on.through.objects.order_by('id').values_list(
+        'from_servicetarget_id', 'to_servicetarget_id',
+    )
+
+
+def _reaches(parents: dict[int, set], start: int, goal: int) -> bool:
+    seen, stack = set(), [start]
+    while stack:
+        node = stack.pop()
+        if node == goal:
+            return True
+        if node not in seen:
+            seen.add(node)
+            stack.extend(parents.get(node, ()))
+    return False
+
+
+def acyclic(edges) -> dict[int, set]:
+    """{target id: upstream ids} from edges in the order they were added, skipping any that closes a cycle."""
+    parents = defaultdict(set)
+    for child, parent in edges:
+        if _reaches(parents, parent, child):
+            logger.warning("Ignoring dependency of target %s on %s: it closes a cycle", child, parent)
+            continue
+        parents[child].add(parent)
+    return parents
+
+
+def check_dependencies(target_id: int | None, upstream_ids):
+    """Raise ValidationError if target_id depending on upstream_ids would form a cycle."""
+    if target_id is None:
+        return  # a new target has no dependents yet
+    if target_id in upstream_ids:
+        raise ValidationError({'depends_on': "A target cannot depend on itself."})
+    parents = defaultdict(set)
+    for child, parent in _edges():
+        parents[child].add(parent)
+    if any(_reaches(parents, upstream, target_id) for upstream in upstream_ids):
+        raise ValidationError({'depends_on': "This dependency would create a cycle."})
+
+
+def depths(parents: dict[int, set]) -> dict[int, int]:
+    """Depth of every target with upstreams in an acyclic {target id: upstream ids}."""
+    depth = {}
+    for start in parents:
+        stack = [start]
+        while stack:
+            node = stack[-1]
+            ups = parents.get(node, ())
+            missing = [p for p in ups if p not in depth]
+            if node in depth:
+                stack.pop()
+            elif missing:
+                stack.extend(missing)
+            else:
+                depth[node] = 1 + max((depth[p] for p in ups), default=-1)
+                stack.pop()
+    return depth
+
+
+def _components(parents: dict[int, set]) -> dict[int, int]:
+    """Smallest node id of every node's weakly connected component."""
+    root = {}
+
+    def find(node):
+        while root.setdefault(node, node) != node:
+            root[node] = root[root[node]]
+            node = root[node]
+        return node
+
+    for node, ups in parents.items():
+        for parent in ups:
+            a, b = find(node), find(parent)
+            root[max(a, b)] = min(a, b)
+    return {node: find(node) for node in root}
+
+
+class DependencyGraph:
+    """The dependencies between active targets, with the upstreams' status at load time."""
+
+    def __init__(self, rows=()):
+        self.upstreams = {parent: Upstream(name, status, updated_at) for _, parent, name, status, updated_at in rows}
+        self.parents = acyclic((child, parent) for child, parent, *_ in rows)
+        self.depth = depths(self.parents)
+        self.component = _components(self.parents)
+
+    @classmethod
+    def load(cls) -> 'DependencyGraph':
+        return cls(list(
+            ServiceTarget.depends_on.through.objects
+            .filter(from_servicetarget__is_active=True, to_servicetarget__is_active=True)
+            .order_by('id')
+            .values_list(
+                'from_servicetarget_id', 'to_servicetarget_id',
+                'to_servicetarget__name', 'to_servicetarget__status', 'to_servicetarget__updated_at',
+            )
+        ))
+
+    def attach(self, targets) -> list[ServiceTarget]:
+        """Annotate targets with upstreams, depth and component; returns them shallowest first."""
+        targets = list(targets)
+        for target in targets:
+            target.upstreams = {pk: self.upstreams[pk] for pk in self.parents.get(target.pk, ())}
+            target.depth = self.depth.get(target.pk, 0)
+            target.component = self.component.get(target.pk, target.pk)
+        targets.sort(key=lambda t: t.depth)
+        return targets
+
+
+def attach_upstreams(targets) -> list[ServiceTarget]:
+    """Annotate targets with upstreams, depth and component; returns them shallowest first."""
+    return DependencyGraph.load().attach(targets)
+
+
+def depth_of(target) -> int:
+    return getattr(target, 'depth', 0)
+
+
+class Topology:
+    """Newest status of every target a CheckEngine has seen, and its checks in flight."""
+
+    def __init__(self):
+        self._status: dict[int, tuple[datetime, str]] = {}
+        self._pending: dict[int, asyncio.Event] = {}
+
+    def begin(self, target):
+        self._pending[target.pk] = asyncio.Event()
+
+    def record(self, target, status, checked_at):
+        if status is not None:
+            self._status[target.pk] = (checked_at, status)
+        event = self._pending.pop(target.pk, None)
+        if event:
+            event.set()
+
+    async def blocked_by(self, target) -> Upstream | None:
+        """The upstream to blame, with its current status, if every upstream of target is down or unreachable."""
+        upstreams = getattr(target, 'upstreams', None)
+        if not upstreams:
+            return None
+        pending = [self._pending[pk].wait() for pk in upstreams if pk in self._pending]
+        if pending:
+            await asyncio.gather(*pending)
+        blame = None
+        for pk, upstream in upstreams.items():
+            status = self._status_of(pk, upstream)
+            if status not in BLOCKING:
+                return None
+            if blame is None or status == ServiceTarget.Status.DOWN:
+                blame = upstream._replace(status=status)
+        return blame
+
+    def _status_of(self, pk, upstream: Upstream) -> str:
+        known = self._status.get(pk)
+        if known and (upstream.updated_at is None or known[0] >= upstream.updated_at):
+            return known[1]
+        return upstream.status
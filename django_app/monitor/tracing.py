@@ -0,0 +1,142 @@
+"""
+Per-phase timing of HTTP checks, measured with time.perf_counter().
+
+    dns       resolving the host (0 on a DNS cache hit or reused connection)
+    connect   TCP connect, including happy-eyeballs fallbacks
+    tls       TLS handshake (0 for plain HTTP or a reused connection)
+    ttfb      request sent -> response headers received (server time + RTT)
+    transfer  reading the response body
+
+aiohttp trace hooks cover DNS and the request/response exchange. aiohttp
+reports TCP connect and TLS handshake as one step, so TimedConnector splits
+it: asyncio builds the protocol once the socket is connected, and
+create_connection() returns once the handshake is done. Phases are summed
+across redirect hops; a phase that was never reached stays None.
+"""
+import contextvars
+import time
+
+import aiohttp
+
+from .metrics import record_dns_cache, record_pool
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'transfer')
+
+current_timer = contextvars.ContextVar('current_timer', default=None)
+
+
+class PhaseTimer:
+    def __init__(self):
+        self._totals: dict[str, float] = {}
+        self._started: dict[str, float] = {}
+
+    def start(self, phase):
+        self._started[phase] = time.perf_counter()
+
+    def stop(self, phase):
+        started = self._started.pop(phase, None)
+        if started is not None:
+            self.add(phase, time.perf_counter() - started)
+
+    def add(self, phase, seconds):
+        self._totals[phase] = self._totals.get(phase, 0.0) + seconds
+
+    def skip(self, *phases):
+        """Record phases that did not apply to this hop (cached DNS, reused connection)."""
+        for phase in phases:
+            self.add(phase, 0.0)
+
+    def as_ms(self) -> dict:
+        """{'dns_ms': ..., ...}, the CheckResult field names."""
+        return {
+            f'{phase}_ms': round(self._totals[phase] * 1000, 2) if phase in self._totals else None
+            for phase in PHASES
+        }
+
+
+def phase_timings(result) -> dict:
+    """{phase: ms} of a CheckOutcome or CheckResult, for phases that were measured."""
+    return {
+        phase: value for phase in PHASES
+        if (value := getattr(result, f'{phase}_ms')) is not None
+    }
+
+
+def _timer(trace_config_ctx):
+    return trace_config_ctx.trace_request_ctx
+
+
+async def _on_dns_start(session, ctx, params):
+    _timer(ctx).start('dns')
+
+
+async def _on_dns_end(session, ctx, params):
+    _timer(ctx).stop('dns')
+
+
+async def _on_headers_sent(session, ctx, params):
+    _timer(ctx).start('ttfb')
+
+
+async def _on_response_headers(session, ctx, params):
+    _timer(ctx).stop('ttfb')
+
+
+def trace_config(pool='shared') -> aiohttp.TraceConfig:
+    """
+    Pass a PhaseTimer as trace_request_ctx to each request. Connection reuse
+    and DNS cache hits are counted under `pool`.
+    """
+    async def on_dns_cache_hit(session, ctx, params):
+        _timer(ctx).skip('dns')
+        record_dns_cache(pool, hit=True)
+
+    async def on_dns_cache_miss(session, ctx, params):
+        record_dns_cache(pool, hit=False)
+
+    async def on_connection_reused(session, ctx, params):
+        _timer(ctx).skip('dns', 'connect', 'tls')
+        record_pool(pool, hit=True)
+
+    async def on_connection_created(session, ctx, params):
+        record_pool(pool, hit=False)
+
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(_on_dns_start)
+    config.on_dns_resolvehost_end.append(_on_dns_end)
+    config.on_dns_cache_hit.append(on_dns_cache_hit)
+    config.on_dns_cache_miss.append(on_dns_cache_miss)
+    config.on_connection_reuseconn.append(on_connection_reused)
+    config.on_connection_create_end.append(on_connection_created)
+    config.on_request_headers_sent.append(_on_headers_sent)
+    config.on_request_redirect.append(_on_response_headers)
+    config.on_request_end.append(_on_response_headers)
+    return config
+
+
+class TimedConnector(aiohttp.TCPConnector):
+    """TCPConnector that records TCP connect and TLS handshake on the current PhaseTimer."""
+
+    async def _wrap_create_connection(self, protocol_factory, *args, **kwargs):
+        timer = current_timer.get()
+        if timer is None:
+            return await super()._wrap_create_connection(protocol_factory, *args, **kwargs)
+
+        started = time.perf_counter()
+        connected = None
+
+        def factory():
+            nonlocal connected
+            connected = time.perf_counter()
+            return protocol_factory()
+
+        result = await super()._wrap_create_connection(factory, *args, **kwargs)
+        done = time.perf_counter()
+        if kwargs.get('ssl') and connected is not None:
+            timer.add('connect', connected - started)
+            timer.add('tls', done - connected)
+        else:
+            timer.add('connect', done - started)
+            timer.skip('tls')
+        timer.skip('dns')  # IP literals never reach the resolver hooks
+        return result
@@ -1,19 +1,80 @@
+import codecs
+import hashlib
 import logging
+from datetime import timedelta
 
-from django.db.models import Prefetch
+from django.conf import settings
+from django.core import exceptions
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 from rest_framework import status
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import AllowAny, BasePermission, IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import ServiceTarget, CheckResult
-from .serializers import ServiceTargetSerializer, RunCheckResultSerializer
-from .services import ServiceChecker
-from .metrics import record_check, update_gauges
+from .export import CONTENT_TYPES, FORMATS, export_rows, filename, stream_export
+from .intervals import status_history
+from .jobs import submit_check_job
+from .breaker import host_key
+from .models import (
+    ServiceTarget, CheckResult, CheckJob, FleetState, HostCircuit, ResultRollup, StatusInterval, visible_customer_ids,
+)
+from .rollups import BUCKET_SIZES, RELATIVE_ACCURACY, Bucket, window_summary
+from . import stream, sync
+from .serializers import (
+    ServiceTargetSerializer, CheckResultSerializer, CheckJobSerializer, HostCircuitSerializer,
+    IntervalResultSerializer, ResultRollupSerializer, StatusIntervalSerializer,
+)
 
 logger = logging.getLogger('monitor')
 
 
+def parse_time_param(request, name, default=None):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError({name: 'Expected an ISO 8601 datetime.'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def query_flag(request, name) -> bool:
+    return request.query_params.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def visible_service_ids(request, service_ids) -> list[int] | None:
+    """
+    The requested services, checked against the user's customers: None means
+    the whole fleet. Customer users get all of their own services when they
+    ask for none, and a 404 for services of other customers.
+    """
+    if visible_customer_ids(request.user) is None:
+        return service_ids or None
+    visible = set(ServiceTarget.objects.for_user(request.user).values_list('id', flat=True))
+    if not visible.issuperset(service_ids):
+        raise NotFound('Unknown service.')
+    return service_ids or sorted(visible)
+
+
+class IsOperator(BasePermission):
+    """Fleet-wide actions are for operators: staff and superusers."""
+
+    def has_permission(self, request, view):
+        return visible_customer_ids(request.user) is None
+
+
 class HealthView(APIView):
     """Docker HEALTHCHECK + load balancer endpoint."""
     permission_classes = [AllowAny]
@@ -24,43 +85,367 @@ class HealthView(APIView):
 
 
 class DashboardAPIView(APIView):
-    """Dashboard data with service summary and details."""
+    """
+    Dashboard data with service summary and details.
+
+    The payload only changes when FleetState.version does, so the version is
+    the ETag (304 on If-None-Match) and the rendered JSON is cached per
+    version and set of visible customers: repeat requests cost one
+    primary-key lookup after the customer lookup.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        last_result_qs = CheckResult.objects.order_by('-checked_at')
-        services = ServiceTarget.objects.prefetch_related(
-            Prefetch('results', queryset=last_result_qs[:1], to_attr='_prefetched_last_result')
+        customer_ids = visible_customer_ids(request.user)
+        scope = 'all' if customer_ids is None else hashlib.sha256(repr(sorted(customer_ids)).encode()).hexdigest()
+        state = FleetState.objects.filter(pk=1).first() or FleetState()
+        # The bump timestamp keeps tags unique even if a restored database reuses version numbers.
+        tag = f'{state.version}-{state.updated_at.timestamp():.6f}-{scope}'
+        etag = f'"fleet-{tag}"'
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(state.updated_at.timestamp()),
         )
-        serializer = ServiceTargetSerializer(services, many=True)
-        summary = {
-            'total': services.count(),
-            'up': services.filter(status='up').count(),
-            'down': services.filter(status='down').count(),
+        if not_modified is not None:
+            return not_modified
+
+        key = f'monitor:dashboard:{tag}'
+        body = cache.get(key)
+        if body is None:
+            body = JSONRenderer().render(self.build_payload(customer_ids))
+            cache.set(key, body, settings.MONITOR_DASHBOARD_CACHE_TTL)
+
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(state.updated_at.timestamp())
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @staticmethod
+    def build_payload(customer_ids=None):
+        targets = ServiceTarget.objects.all()
+        if customer_ids is not None:
+            targets = targets.filter(customer_id__in=customer_ids)
+        services = list(targets.select_related('latest'))
+        # One grouped query gives every customer's summary; the fleet summary is their sum.
+        counts = ('total', 'up', 'down', 'unreachable')
+        customers = [
+            {'id': row['customer_id'], 'name': row['customer__name'], **{k: row[k] for k in counts}}
+            for row in targets.values('customer_id', 'customer__name').annotate(
+                total=Count('id'),
+                up=Count('id', filter=Q(status='up')),
+                down=Count('id', filter=Q(status='down')),
+                unreachable=Count('id', filter=Q(status='unreachable')),
+            ).order_by('customer__name')
+        ]
+        summary = {k: sum(c[k] for c in customers) for k in counts}
+        # Hosts whose checks are currently being skipped or probed at a reduced rate.
+        circuits = HostCircuit.objects.exclude(state=HostCircuit.State.CLOSED).order_by('host')
+        if customer_ids is not None:
+            hosts = {host_key(t.url) for t in services}
+            circuits = [c for c in circuits if c.host in hosts]
+        return {
+            'summary': summary,
+            'customers': customers,
+            'services': ServiceTargetSerializer(services, many=True).data,
+            'circuits': HostCircuitSerializer(circuits, many=True).data,
         }
-        return Response({'summary': summary, 'services': serializer.data})
 
 
 class RunChecksView(APIView):
-    """Trigger health checks for all active services."""
+    """Trigger health checks for all active services in the background."""
+    permission_classes = [IsAuthenticated, IsOperator]
+
+    def post(self, request):
+        job, created = submit_check_job()
+        return Response(
+            {
+                'job_id': str(job.id),
+                'state': job.state,
+                'coalesced': not created,
+                'status_url': request.build_absolute_uri(f'{request.path}{job.id}/'),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class CheckJobView(APIView):
+    """Progress and results of a background check job."""
+    permission_classes = [IsAuthenticated, IsOperator]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(CheckJob, pk=job_id)
+        return Response(CheckJobSerializer(job).data)
+
+
+class RollupView(APIView):
+    """
+    Bucketed uptime/latency for one service, plus a summary over the window.
+
+    GET /api/v1/services/<id>/rollups/?granularity=1h&since=...&until=...
+    At most MAX_BUCKETS buckets are returned. If there are more, `truncated` is
+    set and `next_since` is the start of the next bucket to request. The
+    summary always covers the whole window.
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_BUCKETS = 1000
+
+    def get(self, request, service_id):
+        service = get_object_or_404(ServiceTarget.objects.for_user(request.user), pk=service_id)
+        granularity = request.query_params.get('granularity', ResultRollup.Granularity.HOUR)
+        if granularity not in BUCKET_SIZES:
+            raise ValidationError({'granularity': f'One of: {", ".join(BUCKET_SIZES)}.'})
+
+        until = parse_time_param(request, 'until', timezone.now())
+        since = parse_time_param(request, 'since', until - BUCKET_SIZES[granularity] * 24)
+        rows = list(
+            ResultRollup.objects.filter(
+                service=service, granularity=granularity, bucket_start__gte=since, bucket_start__lt=until,
+            ).order_by('bucket_start')[:self.MAX_BUCKETS + 1]
+        )
+        truncated = len(rows) > self.MAX_BUCKETS
+        next_since = rows.pop().bucket_start if truncated else None
+
+        total = window_summary(since, until, [service.pk])
+        return Response({
+            'service': service.name,
+            'granularity': granularity,
+            'since': since,
+            'until': until,
+            'truncated': truncated,
+            'next_since': next_since,
+            'summary': {
+                'count': total.count,
+                'up_count': total.up_count,
+                'uptime': total.uptime,
+                'latency_min': total.latency_min,
+                'latency_max': total.latency_max,
+                'latency_mean': total.latency_mean,
+                'p50': total.quantile(0.50),
+                'p95': total.quantile(0.95),
+                'p99': total.quantile(0.99),
+            },
+            'buckets': ResultRollupSerializer(rows, many=True).data,
+        })
+
+
+class LatencyView(APIView):
+    """
+    Latency percentiles over any window and set of services, merged from rollup sketches.
+
+    GET /api/v1/latency/?service=1&service=2&since=...&until=...&q=0.5&q=0.999
+    Without `service` the whole fleet (or the user's customers) is summarised.
+    Defaults: the last 24h, q=0.5,0.95,0.99.
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_QUANTILES = ('0.5', '0.95', '0.99')
+
+    def get(self, request):
+        try:
+            service_ids = [int(value) for value in request.query_params.getlist('service')]
+        except ValueError:
+            raise ValidationError({'service': 'Expected service ids.'})
+        quantiles = request.query_params.getlist('q') or self.DEFAULT_QUANTILES
+        try:
+            parsed = [float(q) for q in quantiles]
+        except ValueError:
+            raise ValidationError({'q': 'Expected numbers between 0 and 1.'})
+        if not all(0 <= q <= 1 for q in parsed):
+            raise ValidationError({'q': 'Expected numbers between 0 and 1.'})
+        until = parse_time_param(request, 'until', timezone.now())
+        since = parse_time_param(request, 'since', until - timedelta(days=1))
+
+        scoped = visible_service_ids(request, service_ids)
+        total = window_summary(since, until, scoped) if scoped != [] else Bucket()
+        return Response({
+            'services': service_ids or None,
+            'since': since,
+            'until': until,
+            'count': total.count,
+            'uptime': total.uptime,
+            'latency_count': total.latency_count,
+            'latency_min': total.latency_min,
+            'latency_max': total.latency_max,
+            'latency_mean': total.latency_mean,
+            'quantiles': {label: total.quantile(q) for label, q in zip(quantiles, parsed)},
+            'relative_accuracy': RELATIVE_ACCURACY,
+        })
+
+
+class ResultHistoryPagination(CursorPagination):
+    """Keyset pagination on (service, -checked_at): no OFFSET, no COUNT(*)."""
+    ordering = ('-checked_at', '-id')
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 500
+
+
+class IntervalHistoryPagination(ResultHistoryPagination):
+    """By run start: the newest run keeps growing, so its end is no stable cursor."""
+    ordering = ('-started_at', '-id')
+
+
+class ResultHistoryView(APIView):
+    """
+    Check results for one service, newest first.
+
+    GET /api/v1/services/<id>/results/?since=...&until=...&status=down&limit=100
+    Follow `next` / `previous` to page; cursors stay stable while new results arrive.
+    In interval storage mode each row is a run of identical results that
+    overlaps the window, with its started_at and count.
+    """
     permission_classes = [IsAuthenticated]
+    pagination_class = ResultHistoryPagination
+
+    def get(self, request, service_id):
+        service = get_object_or_404(ServiceTarget.objects.for_user(request.user), pk=service_id)
+        since = parse_time_param(request, 'since')
+        until = parse_time_param(request, 'until')
+        if settings.MONITOR_STORAGE_MODE == 'intervals':
+            results = StatusInterval.objects.filter(service=service)
+            if since:
+                results = results.filter(ended_at__gte=since)
+            if until:
+                results = results.filter(started_at__lt=until)
+            paginator, serializer = IntervalHistoryPagination(), IntervalResultSerializer
+        else:
+            results = CheckResult.objects.filter(service=service)
+            if since:
+                results = results.filter(checked_at__gte=since)
+            if until:
+                results = results.filter(checked_at__lt=until)
+            paginator, serializer = self.pagination_class(), CheckResultSerializer
+        result_status = request.query_params.get('status')
+        if result_status:
+            if result_status not in ServiceTarget.Status.values:
+                raise ValidationError({'status': f'One of: {", ".join(ServiceTarget.Status.values)}.'})
+            results = results.filter(status=result_status)
+
+        page = paginator.paginate_queryset(results, request, view=self)
+        return paginator.get_paginated_response(serializer(page, many=True).data)
+
+
+class StatusIntervalView(APIView):
+    """
+    Status history of one service as runs of identical results, newest first.
+
+    GET /api/v1/services/<id>/intervals/?since=...&until=...&limit=100
+    Answered from StatusInterval rows in interval storage mode, otherwise
+    by run-length encoding the raw results.
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
+
+    def get(self, request, service_id):
+        service = get_object_or_404(ServiceTarget.objects.for_user(request.user), pk=service_id)
+        until = parse_time_param(request, 'until', timezone.now())
+        since = parse_time_param(request, 'since', until - timedelta(days=1))
+        try:
+            limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
+        if limit < 1:
+            raise ValidationError({'limit': 'Must be at least 1.'})
+
+        runs, truncated = status_history(service, since, until, limit)
+        return Response({
+            'service': service.name,
+            'since': since,
+            'until': until,
+            'truncated': truncated,
+            'intervals': StatusIntervalSerializer(runs, many=True).data,
+        })
+
+
+class ResultExportView(APIView):
+    """
+    Stream check results as NDJSON or CSV without loading them into memory.
+
+    GET /api/v1/results/export/?fmt=csv&service=1&service=2&since=...&until=...&gzip=1
+    (`fmt` rather than `format`, which DRF reserves for content negotiation.)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        fmt = request.query_params.get('fmt', 'ndjson')
+        if fmt not in FORMATS:
+            raise ValidationError({'fmt': f'One of: {", ".join(FORMATS)}.'})
+        try:
+            service_ids = [int(value) for value in request.query_params.getlist('service')]
+        except ValueError:
+            raise ValidationError({'service': 'Expected service ids.'})
+        compress = query_flag(request, 'gzip')
+
+        rows = export_rows(
+            service_ids=service_ids,
+            since=parse_time_param(request, 'since'),
+            until=parse_time_param(request, 'until'),
+            customer_ids=visible_customer_ids(request.user),
+        )
+        response = StreamingHttpResponse(
+            stream_export(rows, fmt, compress),
+            content_type='application/gzip' if compress else CONTENT_TYPES[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename(fmt, compress)}"'
+        return response
+
+
+class TargetSyncView(APIView):
+    """
+    Create, update and deactivate targets to match an inventory document (see monitor/sync.py).
+
+    POST /api/v1/services/bulk/?fmt=csv&partial=1&dry_run=1 with the NDJSON or
+    CSV document as the body (`fmt` defaults from the Content-Type). Returns
+    the created/updated/deactivated/unchanged counts, or 400 with `errors`.
+    An empty full sync is a 400 unless `allow_empty=1` confirms it.
+    """
+    permission_classes = [IsAuthenticated, IsOperator]
 
     def post(self, request):
+        fmt = request.query_params.get('fmt') or ('csv' if request.content_type.startswith('text/csv') else 'ndjson')
+        if fmt not in sync.FORMATS:
+            raise ValidationError({'fmt': f'One of: {", ".join(sync.FORMATS)}.'})
+        # The body is parsed line by line as it is read, not loaded whole.
+        lines = codecs.iterdecode(request.stream or [], 'utf-8')
+        try:
+            summary = sync.sync_targets(
+                lines, fmt, partial=query_flag(request, 'partial'), dry_run=query_flag(request, 'dry_run'),
+                allow_empty=query_flag(request, 'allow_empty'),
+            )
+        except exceptions.ValidationError as e:
+            return Response({'errors': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF negotiate `Accept: text/event-stream`; only used for error bodies."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return stream.format_event('error', data).encode()
+
+
+class StreamView(APIView):
+    """
+    Server-Sent Events: a fleet snapshot on connect, then status/result deltas.
+
+    GET /api/v1/stream/   (reconnects send Last-Event-ID and get only what changed)
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        since = request.headers.get('Last-Event-ID')
+        since = int(since) if since and since.isdigit() else None
         try:
-            checker = ServiceChecker()
-            results = checker.check_all_active()
-
-            up = sum(1 for r in results if r.status == 'up')
-            down = len(results) - up
-            update_gauges(up, down)
-            for r in results:
-                record_check(r.service.name, r.status, r.response_time_ms)
-
-            serializer = RunCheckResultSerializer(results, many=True)
-            return Response({'checked': len(results), 'results': serializer.data})
-        except Exception:
-            logger.exception("Error running service checks")
+            body = stream.EventStream(stream.broadcaster, since, visible_customer_ids(request.user))
+        except stream.StreamLimitReached:
             return Response(
-                {'error': 'Failed to run checks'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {'detail': 'Too many open streams; poll /api/v1/dashboard/ or retry later.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '30'},
             )
+        response = StreamingHttpResponse(body, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+        return response